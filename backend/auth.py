@@ -1,62 +1,228 @@
+import secrets
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from db import get_db
-from models import User
+from sqlalchemy.orm import Session, joinedload
+from db import Database, get_database
+from models import RefreshToken, User
+from cache import TTLCache
+from hashing import get_pwd_context
+from shared_state import state as shared_state
+import metrics
 
 # Security configuration
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 14
+
+# Verified access token -> (user id, token version), kept until the token expires
+TOKEN_CACHE_SIZE = 10000
+
+# Authenticated-user cache
+PRINCIPAL_CACHE_SIZE = 10000
+PRINCIPAL_CACHE_TTL_SECONDS = 300
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+@dataclass(frozen=True)
+class Principal:
+    """Snapshot of an authenticated user plus the id of their role profile
+    (Doctor/Patient/Pharmacist), safe to share across requests and threads."""
+    id: int
+    name: str
+    email: str
+    phone: str
+    role: str
+    profile_id: Optional[int] = None
+    token_version: int = 0
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    user = db.query(User).options(
+        joinedload(User.doctor),
+        joinedload(User.patient),
+        joinedload(User.pharmacist)
+    ).filter(User.id == user_id).first()
+    if user is None:
+        return None
+    
+    profile = {"doctor": user.doctor, "patient": user.patient, "pharmacist": user.pharmacist}.get(user.role)
+    return Principal(
+        id=user.id,
+        name=user.name,
+        email=user.email,
+        phone=user.phone,
+        role=user.role,
+        profile_id=profile.id if profile else None,
+        token_version=user.token_version
+    )
+
+def revoke_tokens(db: Session, user_id: int):
+    """Revoke all of a user's access and refresh tokens in the caller's
+    transaction; call invalidate_principal once it has committed."""
+    db.query(User).filter(User.id == user_id).update(
+        {"token_version": User.token_version + 1}, synchronize_session=False
+    )
+    db.query(RefreshToken).filter(RefreshToken.user_id == user_id).delete(synchronize_session=False)
+
+def invalidate_principal(user_id: int):
+    """Drop a cached principal, in every worker; call after deleting a user or changing their role."""
+    principal_cache.delete(user_id)
+    shared_state.broadcast("principals", user_id)
+
+shared_state.on("principals", principal_cache.delete)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    started = time.perf_counter()
+    valid = get_pwd_context().verify(plain_password, hashed_password)
+    metrics.record_password_hash("verify", time.perf_counter() - started)
+    return valid
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    started = time.perf_counter()
+    hashed = get_pwd_context().hash(password)
+    metrics.record_password_hash("hash", time.perf_counter() - started)
+    return hashed
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "type": "access"})
+    from jose import jwt  # python-jose (and cryptography) load on first use, not at startup
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
+def create_refresh_token(db: Session, user_id: int, token_version: int = 0) -> str:
+    """A new refresh token, stored by its id in the caller's transaction."""
+    now = datetime.utcnow()
+    expire = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    jti = secrets.token_urlsafe(16)
+    # The user's expired tokens are dropped as new ones are issued
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.expires_at <= now
+    ).delete(synchronize_session=False)
+    db.add(RefreshToken(jti=jti, user_id=user_id, expires_at=expire))
+    from jose import jwt
+    return jwt.encode(
+        {"sub": str(user_id), "ver": token_version, "jti": jti, "exp": expire, "type": "refresh"},
+        SECRET_KEY, algorithm=ALGORITHM
+    )
+
+def issue_tokens(db: Session, user_id: int, token_version: int = 0) -> dict:
+    """The token fields of a login response: a short-lived access token and a
+    refresh token that renews it without the password. Both carry the user's
+    token version, so bumping it revokes them. The caller commits."""
+    return {
+        "access_token": create_access_token(data={"sub": str(user_id), "ver": token_version}),
+        "refresh_token": create_refresh_token(db, user_id, token_version),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+def decode_token(token: str, token_type: str) -> dict:
+    """The verified payload of a `token_type` token; raises ValueError for any other token."""
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as error:
+        raise ValueError(str(error)) from error
+    # Tokens issued before refresh tokens existed carry no type and are access tokens
+    if payload.get("type", "access") != token_type:
+        raise ValueError(f"Not an {token_type} token")
+    return payload
+
+def verify_access_token(token: str) -> Tuple[int, int]:
+    """User id and token version of a valid access token. Verified tokens are cached
+    until they expire, so a session's later requests skip the signature check and parsing."""
+    claims = token_cache.get(token)
+    if claims is None:
+        payload = decode_token(token, "access")
+        claims = (int(payload["sub"]), int(payload.get("ver", 0)))
+        token_cache.set(token, claims, ttl=payload["exp"] - time.time())
+    return claims
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def authenticate_token(token: str, database: Database) -> Principal:
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        user_id, token_version = verify_access_token(token)
+    except (KeyError, TypeError, ValueError):
+        raise credentials_exception()
+    return await get_principal(user_id, token_version, database)
+
+def decode_refresh_token(token: str) -> Tuple[int, int, str]:
+    """User id, token version and token id of a valid refresh token."""
+    try:
+        payload = decode_token(token, "refresh")
+        return int(payload["sub"]), int(payload.get("ver", 0)), payload["jti"]
+    except (KeyError, TypeError, ValueError):
+        raise credentials_exception()
+
+async def rotate_refresh_token(token: str, database: Database) -> dict:
+    """Exchange a refresh token for a new token pair, plus the user.
+
+    Each refresh token works once: its row is deleted as it's exchanged. One
+    presented again (or after logout) means it, or the token that replaced
+    it, is in someone else's hands, so all of the user's tokens are revoked.
+    """
+    user_id, token_version, jti = decode_refresh_token(token)
+    principal = await get_principal(user_id, token_version, database)
     
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    def rotate(db: Session) -> Optional[dict]:
+        unused = db.query(RefreshToken).filter(
+            RefreshToken.jti == jti,
+            RefreshToken.user_id == user_id
+        ).delete(synchronize_session=False)
+        if not unused:
+            revoke_tokens(db, user_id)
+            db.commit()
+            return None
+        tokens = issue_tokens(db, user_id, token_version)
+        db.commit()
+        return tokens
+    
+    tokens = await database.run(rotate)
+    if tokens is None:
+        invalidate_principal(user_id)
+        raise credentials_exception()
+    return {**tokens, "user": principal}
+
+async def get_principal(user_id: int, token_version: int, database: Database) -> Principal:
+    """The user a token names, unless they were deleted or their tokens revoked since it was issued."""
+    # Entries are tagged with their database, for processes running apps on several
+    cached_url, principal = principal_cache.get(user_id, (None, None))
+    if cached_url != database.url:
+        principal = await database.run(load_principal, user_id)
+        if principal is None:
+            raise credentials_exception()
+        principal_cache.set(user_id, (database.url, principal))
+    if principal.token_version != token_version:
+        raise credentials_exception()
+    return principal
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    database: Database = Depends(get_database)
+) -> Principal:
+    return await authenticate_token(credentials.credentials, database)
 
 def require_role(allowed_roles: list):
-    def role_checker(current_user: User = Depends(get_current_user)):
+    async def role_checker(current_user: Principal = Depends(get_current_user)):
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,591 @@
+"""End-to-end API benchmark: every endpoint, realistic role mixes, saved baselines.
+
+Seeds a throwaway SQLite database with synthetic data (`seed.py --doctors
+...`), then for each transport -- in-process (httpx over ASGI in this event
+loop) and HTTP (uvicorn in a subprocess) -- runs two phases on its own copy:
+
+  sweep  every endpoint on its own, sequentially, with latency and the SQL
+         statements each request issued (SQL counts are in-process only)
+  mix    concurrent workers acting as patients, doctors, pharmacists and
+         admins in realistic proportions for a fixed time, with overall
+         requests/s and per-endpoint p50/p95/p99
+
+The live event streams are long-lived and measured by event_fanout.py.
+
+--save-baseline writes the results as JSON. --compare checks a run against
+a saved one and exits non-zero on regressions: a sweep median or the mix's
+requests/s worse than --tolerance, more SQL statements per request, or new
+errors. Tail latencies are reported but too noisy to gate on. Each phase
+first times a fixed CPU-bound workload, and latencies and throughput are
+compared in proportion to it, so a machine that is busier or slower than when
+the baseline was saved doesn't read as a regression; still, compare on the
+machine that saved the baseline. SQL counts compare anywhere. Requires httpx.
+
+Usage: python benchmarks/api_benchmark.py [--transport inprocess http] [--scale small]
+           [--seconds 10] [--concurrency 16] [--save-baseline [FILE]] [--compare [FILE]]
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from async_load import free_port, percentile, start_server
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+SCALES = {
+    "small": {"doctors": 50, "patients": 2000, "pharmacists": 10, "appointments": 20000, "prescriptions": 10000},
+    "medium": {"doctors": 200, "patients": 20000, "pharmacists": 20, "appointments": 100000, "prescriptions": 50000},
+    "large": {"doctors": 1000, "patients": 100000, "pharmacists": 50, "appointments": 1000000, "prescriptions": 500000},
+}
+
+# Logged-in accounts per role that the workers act as
+POOL_SIZES = {"patient": 50, "doctor": 20, "pharmacist": 10}
+SIGNUP_PASSWORD = "bench-password"
+# Fewer sweep samples than this are too few to judge a median by
+MIN_COMPARED_SAMPLES = 10
+
+# SQL statements issued on behalf of the request being timed (in-process)
+current_statements = contextvars.ContextVar("current_statements", default=None)
+
+# ==================== RECORDING ====================
+
+class Recorder:
+    def __init__(self, only: str = None):
+        self.only = only
+        self.latencies = defaultdict(list)
+        self.statements = defaultdict(int)
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, method: str, endpoint: str, url: str,
+                   expect=(200,), **kwargs) -> httpx.Response:
+        counter = [0]
+        token = current_statements.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        finally:
+            current_statements.reset(token)
+        elapsed = time.perf_counter() - started
+
+        if self.only is None or self.only == endpoint:
+            self.latencies[endpoint].append(elapsed)
+            self.statements[endpoint] += counter[0]
+            if response.status_code not in expect:
+                self.errors[endpoint] += 1
+        return response
+
+    def summary(self, seconds: float, count_sql: bool) -> dict:
+        results = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            results[endpoint] = {
+                "n": len(samples),
+                "rps": round(len(samples) / (seconds or sum(samples)), 1),
+                "p50": round(percentile(samples, 0.50) * 1000, 2),
+                "p95": round(percentile(samples, 0.95) * 1000, 2),
+                "p99": round(percentile(samples, 0.99) * 1000, 2),
+                "sql": round(self.statements[endpoint] / len(samples), 1) if count_sql else None,
+                "errors": self.errors[endpoint],
+            }
+        return results
+
+def calibrate() -> float:
+    """Milliseconds a fixed CPU-bound workload takes right now."""
+    payload = {"items": [{"id": n, "name": f"item {n}", "tags": ["a", "b"]} for n in range(200)]}
+    samples = []
+    for _ in range(25):
+        started = time.perf_counter()
+        for _ in range(10):
+            json.loads(json.dumps(payload))
+        samples.append(time.perf_counter() - started)
+    return round(percentile(samples, 0.5) * 1000, 3)
+
+def count_statement(*_):
+    counter = current_statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+# ==================== ACTORS ====================
+
+class Actor:
+    def __init__(self, role: str, email: str, password: str, token: str):
+        self.role = role
+        self.email = email
+        self.password = password
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.booked = []
+
+class Context:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, doctors: dict, seed: int):
+        self.client = client
+        self.recorder = recorder
+        self.doctors = list(doctors)
+        self.specializations = sorted(set(doctors.values()))
+        self.rng = random.Random(seed)
+        self.signups = 0
+
+    async def call(self, method: str, endpoint: str, url: str, actor: Actor = None, **kwargs) -> httpx.Response:
+        headers = actor.headers if actor else None
+        return await self.recorder.call(self.client, method, endpoint, url, headers=headers, **kwargs)
+
+    def unique(self, prefix: str) -> str:
+        self.signups += 1
+        return f"{prefix}{self.signups}.{os.getpid()}.{time.monotonic_ns()}@bench.hospify.com"
+
+# ---- Patient ----
+
+async def browse_doctors(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /doctors", "/doctors",
+                   params={"specialization": ctx.rng.choice(ctx.specializations), "limit": 20})
+
+async def view_slots(ctx: Context, actor: Actor):
+    doctor_id = ctx.rng.choice(ctx.doctors)
+    await ctx.call("GET", "GET /doctors/{id}/slots", f"/doctors/{doctor_id}/slots")
+
+async def first_available(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /doctors/first-available", "/doctors/first-available",
+                   params={"specialization": ctx.rng.choice(ctx.specializations)})
+
+async def book(ctx: Context, actor: Actor):
+    doctor_id = ctx.rng.choice(ctx.doctors)
+    tomorrow = date.today() + timedelta(days=1)
+    window = {"from": tomorrow.isoformat(), "to": (tomorrow + timedelta(days=13)).isoformat()}
+    days = (await ctx.call("GET", "GET /doctors/{id}/slots", f"/doctors/{doctor_id}/slots", params=window)).json()["days"]
+    if not days:
+        return
+    day = ctx.rng.choice(days)
+    response = await ctx.call("POST", "POST /patient/appointments", "/patient/appointments", actor,
+                              expect=(200, 409), json={
+                                  "doctor_id": doctor_id, "date": day["date"], "time": ctx.rng.choice(day["slots"])
+                              })
+    if response.status_code == 200:
+        actor.booked.append(response.json()["id"])
+
+async def my_appointments(ctx: Context, actor: Actor):
+    page = (await ctx.call("GET", "GET /patient/appointments", "/patient/appointments", actor,
+                           params={"limit": 20})).json()
+    if page["next_cursor"] and ctx.rng.random() < 0.3:
+        await ctx.call("GET", "GET /patient/appointments", "/patient/appointments", actor,
+                       params={"limit": 20, "cursor": page["next_cursor"]})
+
+async def cancel(ctx: Context, actor: Actor):
+    if not actor.booked:
+        await book(ctx, actor)
+    if actor.booked:
+        appointment_id = actor.booked.pop()
+        await ctx.call("DELETE", "DELETE /patient/appointments/{id}", f"/patient/appointments/{appointment_id}", actor)
+
+async def chatbot(ctx: Context, actor: Actor):
+    message = ctx.rng.choice(["I have chest pain", "skin rash", "knee joint hurts", "how do I book?"])
+    await ctx.call("POST", "POST /chatbot/message", "/chatbot/message", json={"message": message})
+
+async def me(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /auth/me", "/auth/me", actor)
+
+async def login(ctx: Context, actor: Actor):
+    await ctx.call("POST", "POST /auth/login", "/auth/login",
+                   json={"email": actor.email, "password": actor.password})
+
+async def signup(ctx: Context, actor: Actor, role: str = "patient") -> httpx.Response:
+    return await ctx.call("POST", "POST /auth/signup", "/auth/signup", json={
+        "email": ctx.unique(role), "password": SIGNUP_PASSWORD, "name": "Bench User",
+        "phone": "9000000000", "role": role
+    })
+
+async def home(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /", "/")
+
+# ---- Doctor ----
+
+async def queue(ctx: Context, actor: Actor) -> list:
+    return (await ctx.call("GET", "GET /doctor/appointments", "/doctor/appointments", actor)).json()["items"]
+
+async def consult(ctx: Context, actor: Actor):
+    waiting = await queue(ctx, actor)
+    if waiting:
+        # Another worker acting as the same doctor may get there first
+        await ctx.call("POST", "POST /doctor/prescriptions", "/doctor/prescriptions", actor,
+                       expect=(200, 400, 404), json={
+                           "appointment_id": waiting[0]["id"], "notes": "Rest and fluids",
+                           "items": [{"medicine_name": "Paracetamol", "dosage": "500mg",
+                                      "frequency": "Twice daily", "duration": "5 days"}] * ctx.rng.randint(1, 3)
+                       })
+
+async def complete(ctx: Context, actor: Actor):
+    waiting = await queue(ctx, actor)
+    if waiting:
+        appointment_id = waiting[-1]["id"]
+        await ctx.call("PUT", "PUT /doctor/appointments/{id}/complete",
+                       f"/doctor/appointments/{appointment_id}/complete", actor, expect=(200, 404))
+
+async def history(ctx: Context, actor: Actor):
+    today = date.today()
+    await ctx.call("GET", "GET /doctor/appointments", "/doctor/appointments", actor, params={
+        "date_from": (today - timedelta(days=30)).isoformat(), "date_to": today.isoformat(),
+        "status": "completed", "limit": 20
+    })
+
+async def schedule(ctx: Context, actor: Actor) -> list:
+    return (await ctx.call("GET", "GET /doctor/schedule", "/doctor/schedule", actor)).json()
+
+async def update_schedule(ctx: Context, actor: Actor):
+    entries = await schedule(ctx, actor)
+    await ctx.call("PUT", "PUT /doctor/schedule", "/doctor/schedule", actor, json=entries)
+
+# ---- Pharmacist ----
+
+async def pending(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /pharmacy/prescriptions", "/pharmacy/prescriptions", actor, params={"limit": 20})
+
+async def claim(ctx: Context, actor: Actor) -> list:
+    return (await ctx.call("POST", "POST /pharmacy/prescriptions/claim", "/pharmacy/prescriptions/claim",
+                           actor, params={"limit": 1})).json()
+
+# Claims are re-offered to the pharmacist holding them, so two workers acting
+# as the same pharmacist can both get one; the second finds it dispensed, or
+# released and taken by someone else
+async def dispense(ctx: Context, actor: Actor):
+    for prescription in await claim(ctx, actor):
+        await ctx.call("POST", "POST /pharmacy/dispense", "/pharmacy/dispense", actor, expect=(200, 400, 409), json={
+            "prescription_id": prescription["id"], "uncatalogued_amount": round(ctx.rng.uniform(50, 2000), 2),
+            "payment_status": "paid"
+        })
+
+async def release(ctx: Context, actor: Actor):
+    for prescription in await claim(ctx, actor):
+        await ctx.call("POST", "POST /pharmacy/prescriptions/{id}/release",
+                       f"/pharmacy/prescriptions/{prescription['id']}/release", actor, expect=(200, 404))
+
+# ---- Admin ----
+
+async def admin_stats(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /admin/stats", "/admin/stats", actor)
+
+async def admin_breakdown(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /admin/stats/breakdown", "/admin/stats/breakdown", actor)
+
+async def admin_doctors(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /admin/doctors", "/admin/doctors", actor, params={"limit": 50})
+
+async def admin_pharmacists(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /admin/pharmacists", "/admin/pharmacists", actor)
+
+async def cache_stats(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /admin/cache/stats", "/admin/cache/stats", actor)
+
+async def event_stats(ctx: Context, actor: Actor):
+    await ctx.call("GET", "GET /admin/events/stats", "/admin/events/stats", actor)
+
+async def delete_doctor(ctx: Context, actor: Actor):
+    # Removes a doctor who has just signed up rather than one with a calendar
+    user_id = (await signup(ctx, actor, role="doctor")).json()["user"]["id"]
+    doctor_id, cursor = None, None
+    while doctor_id is None:
+        page = (await ctx.call("GET", "GET /admin/doctors", "/admin/doctors", actor, params={
+            "specialization": "General", "limit": 200, **({"cursor": cursor} if cursor else {})
+        })).json()
+        doctor_id = next((doctor["id"] for doctor in page["items"] if doctor["user_id"] == user_id), None)
+        cursor = page["next_cursor"]
+    await ctx.call("DELETE", "DELETE /admin/doctors/{id}", f"/admin/doctors/{doctor_id}", actor)
+
+async def bulk_import(ctx: Context, actor: Actor):
+    body = "".join(
+        json.dumps({"email": ctx.unique("import"), "password": SIGNUP_PASSWORD, "name": "Imported", "phone": "1"}) + "\n"
+        for _ in range(100)
+    )
+    await ctx.call("POST", "POST /admin/import/{kind}", "/admin/import/patients", actor, content=body)
+
+async def bulk_export(ctx: Context, actor: Actor):
+    kind = ctx.rng.choice(["patients", "appointments", "prescriptions"])
+    await ctx.call("GET", "GET /admin/export/{kind}", f"/admin/export/{kind}", actor)
+
+# ==================== WORKLOADS ====================
+
+# Share of traffic per role, and each role's operations with their weights
+ROLE_MIX = {"patient": 70, "doctor": 15, "pharmacist": 10, "admin": 5}
+OPERATIONS = {
+    "patient": [(browse_doctors, 20), (view_slots, 20), (first_available, 8), (book, 12), (my_appointments, 20),
+                (cancel, 4), (chatbot, 6), (me, 5), (login, 3), (signup, 2)],
+    "doctor": [(queue, 45), (consult, 25), (complete, 5), (history, 10), (schedule, 10), (update_schedule, 5)],
+    "pharmacist": [(pending, 50), (dispense, 40), (release, 10)],
+    "admin": [(admin_stats, 35), (admin_breakdown, 20), (admin_doctors, 20), (admin_pharmacists, 15),
+              (cache_stats, 5), (event_stats, 5)],
+}
+
+# (endpoint, role, operation that reaches it, repetitions)
+SWEEP = [
+    ("GET /", "patient", home, 1),
+    ("POST /auth/signup", "patient", signup, 0.5),
+    ("POST /auth/login", "patient", login, 0.5),
+    ("GET /auth/me", "patient", me, 1),
+    ("GET /doctors", "patient", browse_doctors, 1),
+    ("GET /doctors/first-available", "patient", first_available, 1),
+    ("GET /doctors/{id}/slots", "patient", view_slots, 1),
+    ("POST /patient/appointments", "patient", book, 1),
+    ("GET /patient/appointments", "patient", my_appointments, 1),
+    ("DELETE /patient/appointments/{id}", "patient", cancel, 1),
+    ("POST /chatbot/message", "patient", chatbot, 1),
+    ("GET /doctor/appointments", "doctor", queue, 1),
+    ("POST /doctor/prescriptions", "doctor", consult, 1),
+    ("PUT /doctor/appointments/{id}/complete", "doctor", complete, 1),
+    ("GET /doctor/schedule", "doctor", schedule, 1),
+    ("PUT /doctor/schedule", "doctor", update_schedule, 1),
+    ("GET /pharmacy/prescriptions", "pharmacist", pending, 1),
+    ("POST /pharmacy/prescriptions/claim", "pharmacist", claim, 1),
+    ("POST /pharmacy/dispense", "pharmacist", dispense, 1),
+    ("POST /pharmacy/prescriptions/{id}/release", "pharmacist", release, 1),
+    ("GET /admin/stats", "admin", admin_stats, 1),
+    ("GET /admin/stats/breakdown", "admin", admin_breakdown, 1),
+    ("GET /admin/doctors", "admin", admin_doctors, 1),
+    ("GET /admin/pharmacists", "admin", admin_pharmacists, 1),
+    ("GET /admin/cache/stats", "admin", cache_stats, 1),
+    ("GET /admin/events/stats", "admin", event_stats, 1),
+    ("DELETE /admin/doctors/{id}", "admin", delete_doctor, 0.5),
+    ("POST /admin/import/{kind}", "admin", bulk_import, 0.2),
+    ("GET /admin/export/{kind}", "admin", bulk_export, 0.1),
+]
+
+def weighted(rng: random.Random, choices):
+    items = list(choices.items()) if isinstance(choices, dict) else choices
+    return rng.choices([item for item, _ in items], [weight for _, weight in items])[0]
+
+async def log_in(client: httpx.AsyncClient, sizes: dict) -> dict:
+    from synthetic import SYNTHETIC_PASSWORD, synthetic_email
+
+    accounts = {"admin": [("admin@hospify.com", "admin123")]}
+    for role, pool in POOL_SIZES.items():
+        accounts[role] = [(synthetic_email(role, n), SYNTHETIC_PASSWORD) for n in range(min(pool, sizes[role + "s"]))]
+
+    actors = {}
+    for role, credentials in accounts.items():
+        actors[role] = []
+        for email, password in credentials:
+            response = await client.post("/auth/login", json={"email": email, "password": password})
+            response.raise_for_status()
+            actors[role].append(Actor(role, email, password, response.json()["access_token"]))
+    return actors
+
+async def list_doctors(client: httpx.AsyncClient) -> dict:
+    specializations, cursor = {}, None
+    while True:
+        params = {"limit": 200, **({"cursor": cursor} if cursor else {})}
+        page = (await client.get("/doctors", params=params)).json()
+        specializations.update((doctor["id"], doctor["specialization"]) for doctor in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return specializations
+
+async def run_sweep(client: httpx.AsyncClient, actors: dict, doctors: dict, repetitions: int, count_sql: bool) -> dict:
+    results = {}
+    for endpoint, role, operation, share in SWEEP:
+        pool = actors[role]
+        # One unrecorded call first, so cold caches don't count
+        await operation(Context(client, Recorder(only="warm-up"), doctors, seed=0), pool[-1])
+        recorder = Recorder(only=endpoint)
+        ctx = Context(client, recorder, doctors, seed=len(results))
+        for n in range(max(3, int(repetitions * share))):
+            await operation(ctx, pool[n % len(pool)])
+        results.update(recorder.summary(0, count_sql))
+    return results
+
+async def run_mix(client: httpx.AsyncClient, actors: dict, doctors: dict, concurrency: int,
+                  seconds: float, count_sql: bool) -> dict:
+    recorder = Recorder()
+    stop = time.monotonic() + seconds
+
+    async def worker(n: int):
+        ctx = Context(client, recorder, doctors, seed=1000 + n)
+        while time.monotonic() < stop:
+            role = weighted(ctx.rng, ROLE_MIX)
+            await weighted(ctx.rng, OPERATIONS[role])(ctx, ctx.rng.choice(actors[role]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = recorder.summary(elapsed, count_sql)
+    requests = sum(result["n"] for result in results.values())
+    results["total"] = {
+        "n": requests, "rps": round(requests / elapsed, 1),
+        "errors": sum(result["errors"] for result in results.values()),
+    }
+    return results
+
+async def benchmark(client: httpx.AsyncClient, args, count_sql: bool) -> dict:
+    actors = await log_in(client, args.sizes)
+    doctors = await list_doctors(client)
+    calibration = {"sweep": calibrate()}
+    sweep = await run_sweep(client, actors, doctors, args.repetitions, count_sql)
+    calibration["mix"] = calibrate()
+    mix = await run_mix(client, actors, doctors, args.concurrency, args.seconds, count_sql)
+    return {"calibration_ms": calibration, "sweep": sweep, "mix": mix}
+
+# ==================== TRANSPORTS ====================
+
+def run_in_process(database_path: str, args) -> dict:
+    # main() pointed DATABASE_URL here before anything imported db.py
+    assert os.environ["DATABASE_URL"] == f"sqlite:///{database_path}"
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    import main as api
+
+    event.listen(Engine, "before_cursor_execute", count_statement)
+
+    async def run():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await benchmark(client, args, count_sql=True)
+
+    return asyncio.run(run())
+
+def run_over_http(database_path: str, args) -> dict:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database_path}")
+    port = free_port()
+    server = start_server(env, port)
+    try:
+        async def run():
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+                return await benchmark(client, args, count_sql=False)
+
+        return asyncio.run(run())
+    finally:
+        server.terminate()
+        server.wait()
+
+TRANSPORTS = {"inprocess": run_in_process, "http": run_over_http}
+PHASES = ("sweep", "mix")
+
+# ==================== REPORTING ====================
+
+def report(transport: str, phase: str, results: dict):
+    print(f"\n== {transport} / {phase}")
+    print(f"{'endpoint':<44} {'n':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'sql':>6} {'errors':>6}")
+    for endpoint, result in results.items():
+        if endpoint == "total":
+            continue
+        sql = "-" if result["sql"] is None else f"{result['sql']:.1f}"
+        print(
+            f"{endpoint:<44} {result['n']:>6} {result['rps']:>8.1f} {result['p50']:>6.2f}ms "
+            f"{result['p95']:>6.2f}ms {result['p99']:>6.2f}ms {sql:>6} {result['errors']:>6}"
+        )
+    if "total" in results:
+        total = results["total"]
+        print(f"{'total':<44} {total['n']:>6} {total['rps']:>8.1f}{'':>38} {total['errors']:>6}")
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """Regressions of `current` against `baseline`, as printable lines.
+
+    Per-endpoint latency is only judged in the sweep, where requests run one at
+    a time; in the mix it mostly reflects queueing, so only the total counts.
+    """
+    regressions = []
+    for key in ("scale", "concurrency", "bcrypt_rounds", "db_async"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"warning: baseline {key}={baseline['meta'].get(key)!r}, this run {current['meta'].get(key)!r}")
+
+    for transport, phases in current["results"].items():
+        base_phases = baseline["results"].get(transport, {})
+        for phase in PHASES:
+            results, base_results = phases[phase], base_phases.get(phase, {})
+            # How much slower this machine is now than when the baseline was saved
+            slowdown = phases["calibration_ms"][phase] / base_phases["calibration_ms"][phase] if base_results else 1
+            for endpoint, result in results.items():
+                base = base_results.get(endpoint)
+                if base is None:
+                    continue
+                label = f"{transport}/{phase} {endpoint}"
+                if endpoint == "total":
+                    if result["rps"] < base["rps"] / slowdown * (1 - tolerance):
+                        regressions.append(f"{label}: {result['rps']} req/s, baseline {base['rps']} (x{slowdown:.2f})")
+                    continue
+                if phase == "sweep":
+                    # Sub-millisecond differences are noise whatever the ratio
+                    if min(result["n"], base["n"]) >= MIN_COMPARED_SAMPLES \
+                            and result["p50"] > base["p50"] * slowdown * (1 + tolerance) \
+                            and result["p50"] - base["p50"] * slowdown > 1:
+                        regressions.append(f"{label}: p50 {result['p50']}ms, baseline {base['p50']}ms (x{slowdown:.2f})")
+                    if result["sql"] is not None and base["sql"] is not None and result["sql"] > base["sql"] + 0.5:
+                        regressions.append(f"{label}: {result['sql']} SQL/request, baseline {base['sql']}")
+                if result["errors"] and not base["errors"]:
+                    regressions.append(f"{label}: {result['errors']} errors, baseline none")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", nargs="+", choices=list(TRANSPORTS), default=list(TRANSPORTS))
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of the mixed workload")
+    parser.add_argument("--concurrency", type=int, default=16, help="workers in the mixed workload")
+    parser.add_argument("--repetitions", type=int, default=50, help="requests per endpoint in the sweep")
+    parser.add_argument("--bcrypt-rounds", default="4", help="cost of the synthetic accounts' hashes and signups")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="FILE")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="FILE")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    args.sizes = SCALES[args.scale]
+    os.environ["BCRYPT_ROUNDS"] = args.bcrypt_rounds
+    # A handful of accounts send all the load; the rate limiter would throttle them
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+    tmp = tempfile.mkdtemp()
+    template = os.path.join(tmp, "template.db")
+    # db.py reads DATABASE_URL once, on first import
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'inprocess.db')}"
+    started = time.perf_counter()
+    sizes = [f"--{name}={count}" for name, count in args.sizes.items()]
+    subprocess.run([sys.executable, "seed.py", *sizes], cwd=BACKEND_DIR, check=True, capture_output=True,
+                   env=dict(os.environ, DATABASE_URL=f"sqlite:///{template}"))
+    print(f"seeded {args.scale} dataset {args.sizes} in {time.perf_counter() - started:.1f}s")
+
+    current = {
+        "meta": {
+            "scale": args.scale, "sizes": args.sizes, "seconds": args.seconds, "concurrency": args.concurrency,
+            "repetitions": args.repetitions, "bcrypt_rounds": args.bcrypt_rounds,
+            "db_async": os.getenv("DB_ASYNC", "0"), "python": platform.python_version(),
+            "machine": f"{platform.machine()} {os.cpu_count()} cpu", "date": date.today().isoformat(),
+        },
+        "results": {},
+    }
+    # HTTP first: the in-process run imports the app into this process for good
+    for transport in sorted(args.transport):
+        database_path = os.path.join(tmp, f"{transport}.db")
+        shutil.copyfile(template, database_path)
+        current["results"][transport] = TRANSPORTS[transport](database_path, args)
+        for phase in PHASES:
+            report(transport, phase, current["results"][transport][phase])
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(current, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"\nbaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(json.load(baseline_file), current, args.tolerance)
+        print()
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""HTTP load test comparing the threaded (sync) and DB_ASYNC database paths.
+
+Starts the API under uvicorn once per mode against a freshly seeded SQLite
+database, then drives authenticated list endpoints at increasing concurrency
+and reports requests/s with p50/p99 latency. Requires httpx.
+
+Usage: python benchmarks/async_load.py [--seconds 5] [--concurrency 16 64 256]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ["/patient/appointments", "/doctors"]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(env: dict, port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("API server did not start")
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def drive(base_url: str, token: str, concurrency: int, seconds: float):
+    latencies = []
+    errors = 0
+    stop = time.monotonic() + seconds
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        async def worker(n: int):
+            nonlocal errors
+            i = n
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                response = await client.get(ENDPOINTS[i % len(ENDPOINTS)])
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+                i += 1
+
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+    return latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+
+    for mode in ("sync", "async"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+                DB_ASYNC="1" if mode == "async" else "0",
+                BCRYPT_ROUNDS="4",
+                RATE_LIMIT_ENABLED="false"
+            )
+            subprocess.run([sys.executable, "seed.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+            port = free_port()
+            server = start_server(env, port)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                login = httpx.post(f"{base_url}/auth/login",
+                                   json={"email": "patient@hospify.com", "password": "patient123"})
+                token = login.json()["access_token"]
+
+                for concurrency in args.concurrency:
+                    latencies, errors = asyncio.run(drive(base_url, token, concurrency, args.seconds))
+                    print(
+                        f"{mode:<6} c={concurrency:<4} rps={len(latencies) / args.seconds:>8.0f}  "
+                        f"p50={percentile(latencies, 0.50) * 1000:>7.1f}ms  "
+                        f"p99={percentile(latencies, 0.99) * 1000:>7.1f}ms  errors={errors}"
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Authentication overhead per request.
+
+Times access-token verification on its own (jose decode against the cached
+lookup), then GET /auth/me in-process (FastAPI TestClient) with the token
+cache cleared before every request and kept warm, next to the unauthenticated
+GET / so the difference is what auth adds. Finally compares renewing a session
+through POST /auth/refresh with logging in again, which pays for bcrypt.
+
+Usage: python benchmarks/auth_overhead.py [--requests 2000] [--bcrypt-rounds 12]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def report(label: str, latencies: list):
+    print(
+        f"{label:<34} p50={percentile(latencies, 0.50) * 1e6:>8.1f}us  "
+        f"p99={percentile(latencies, 0.99) * 1e6:>8.1f}us"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per measurement")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="cost factor for the login comparison")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS=str(args.bcrypt_rounds),
+                      RATE_LIMIT_ENABLED="false")
+    subprocess.run([sys.executable, "seed.py"], cwd=BACKEND_DIR, check=True, capture_output=True)
+
+    from fastapi.testclient import TestClient
+    import auth
+    import main as api
+
+    def measure(fn, before=None, count: int = args.requests) -> list:
+        latencies = []
+        for _ in range(count):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    with TestClient(api.app) as client:
+        response = client.post("/auth/login", json={"email": "patient@hospify.com", "password": "patient123"})
+        tokens = response.json()
+        access_token, refresh_token = tokens["access_token"], tokens["refresh_token"]
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        print("-- token verification")
+        report("jose decode", measure(lambda: auth.decode_token(access_token, "access")))
+        report("verify_access_token, cache cold", measure(
+            lambda: auth.verify_access_token(access_token), before=auth.token_cache.clear
+        ))
+        report("verify_access_token, cache warm", measure(lambda: auth.verify_access_token(access_token)))
+
+        print("-- per request, in-process")
+        for _ in range(100):
+            client.get("/auth/me", headers=headers)
+        report("GET / (no auth)", measure(lambda: client.get("/")))
+        report("GET /auth/me, token cache cold", measure(
+            lambda: client.get("/auth/me", headers=headers), before=auth.token_cache.clear
+        ))
+        report("GET /auth/me, token cache warm", measure(lambda: client.get("/auth/me", headers=headers)))
+
+        print(f"-- renewing a session (bcrypt rounds={args.bcrypt_rounds})")
+        logins = max(5, args.requests // 100)
+
+        def refresh():
+            nonlocal refresh_token
+            response = client.post("/auth/refresh", json={"refresh_token": refresh_token})
+            assert response.status_code == 200, response.text
+            refresh_token = response.json()["refresh_token"]
+
+        def login():
+            response = client.post("/auth/login", json={"email": "patient@hospify.com", "password": "patient123"})
+            assert response.status_code == 200, response.text
+
+        report("POST /auth/refresh", measure(refresh, count=logins))
+        report("POST /auth/login", measure(login, count=logins))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Chatbot intent matching latency with thousands of keywords.
+
+Builds the intent engine from the shipped synonym file plus generated
+specializations, each with its own keywords, and hundreds of doctors. It
+then times index construction, matching fresh messages (reply cache cleared
+every time), cached replies, and a linear substring scan over every keyword
+for comparison. Runs without a database.
+
+Usage: python benchmarks/chatbot_intents.py [--intents 300] [--keywords 10] [--doctors 500] [--messages 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FILLER = "i have had a bad feeling for two days and would like to see someone about my".split()
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def report(label: str, latencies: list):
+    print(
+        f"{label:<30} p50={percentile(latencies, 0.50) * 1e6:>8.1f}us  "
+        f"p99={percentile(latencies, 0.99) * 1e6:>8.1f}us"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--intents", type=int, default=300, help="generated specializations")
+    parser.add_argument("--keywords", type=int, default=10, help="keywords per generated specialization")
+    parser.add_argument("--doctors", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    import chatbot
+
+    rng = random.Random(42)
+    synonyms = chatbot.load_synonyms()
+    for n in range(args.intents):
+        synonyms[f"Specialty {n}"] = [f"symptom{n}x{k}" for k in range(args.keywords)]
+    intents = list(synonyms)
+    doctors = [(f"Dr. Bench {n}", intents[n % len(intents)], intents[n % len(intents)]) for n in range(args.doctors)]
+    keywords = [(keyword, intent) for intent, words in synonyms.items() for keyword in words]
+
+    started = time.perf_counter()
+    engine = chatbot.IntentEngine(synonyms, cache_size=args.messages)
+    engine.update(doctors)
+    print(f"intents={len(intents)} keywords={len(keywords)} doctors={len(doctors)} "
+          f"index build={(time.perf_counter() - started) * 1000:.1f}ms")
+
+    messages = []
+    for _ in range(args.messages):
+        words = rng.sample(FILLER, 8)
+        words.insert(rng.randrange(len(words)), rng.choice(keywords)[0])
+        messages.append(" ".join(words))
+
+    def measure(fn, before=None) -> list:
+        latencies = []
+        for message in messages:
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            fn(message)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    def linear_scan(message: str):
+        text = message.lower()
+        return [intent for keyword, intent in keywords if keyword in text]
+
+    report("reply, cache cold", measure(engine.reply, before=engine.reply_cache.clear))
+    for message in messages:
+        engine.reply(message)
+    report("reply, cache warm", measure(engine.reply))
+    report("linear substring scan", measure(linear_scan))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Cold-start cost: time from a fresh process to its first responses.
+
+Seeds a throwaway SQLite database, then starts fresh Python processes that
+each import main, run the app's startup (engine, migration check, background
+tasks) and send a first GET /doctors and a first login in-process, reporting
+how long each step took and whether python-jose and passlib were loaded yet.
+Last, it starts `uvicorn main:app` repeatedly and times it until the first
+HTTP response, which is what a restarted or newly scaled-out worker costs.
+
+Usage: python benchmarks/cold_start.py [--runs 10]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The test client (httpx) is imported first; it isn't part of the app's own cold start
+CHILD = """
+import json, sys, time
+from fastapi.testclient import TestClient
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+lazy = {name: name in sys.modules for name in ("jose", "passlib")}
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    assert client.get("/doctors").status_code == 200
+    first_request = time.perf_counter()
+    assert client.post("/auth/login", json={"email": "doctor@hospify.com", "password": "doctor123"}).status_code == 200
+    first_login = time.perf_counter()
+print(json.dumps({
+    "import main": imported - started, "startup": ready - imported,
+    "first GET /doctors": first_request - ready, "first login": first_login - first_request,
+    "lazy": lazy,
+}))
+"""
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_first_response(env: dict) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                    return time.perf_counter() - started
+            except OSError:
+                if server.poll() is not None:
+                    raise SystemExit("uvicorn exited before serving")
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS="4")
+    subprocess.run([sys.executable, "seed.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+    steps = {}
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        lazy = result.pop("lazy")
+        for step, seconds in result.items():
+            steps.setdefault(step, []).append(seconds)
+    print(f"runs={args.runs}  loaded at import: "
+          + ", ".join(f"{name}={'yes' if loaded else 'no'}" for name, loaded in lazy.items()))
+    for step, samples in steps.items():
+        print(f"{step:<22} median={statistics.median(samples) * 1000:>7.1f}ms  max={max(samples) * 1000:>7.1f}ms")
+
+    samples = [time_to_first_response(env) for _ in range(args.runs)]
+    print(f"{'uvicorn to first 200':<22} median={statistics.median(samples) * 1000:>7.1f}ms  "
+          f"max={max(samples) * 1000:>7.1f}ms")
+
+if __name__ == "__main__":
+    main()
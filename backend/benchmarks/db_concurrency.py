@@ -0,0 +1,107 @@
+"""Concurrent read/write throughput: SQLite defaults vs the tuned engine in db.py.
+
+Usage: python benchmarks/db_concurrency.py [--seconds 5] [--readers 8] [--writers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, time as time_of_day
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from db import Base, build_engine, SQLITE_PRAGMAS
+from models import User, Doctor, Appointment
+
+DOCTORS = 20
+
+def prepare(session_factory):
+    Base.metadata.create_all(bind=session_factory.kw["bind"])
+    db = session_factory()
+    users = [
+        User(name=f"Doctor {i}", email=f"doctor{i}@bench.local", phone="0", password_hash="x", role="doctor")
+        for i in range(DOCTORS)
+    ]
+    db.add_all(users)
+    db.flush()
+    db.add_all([Doctor(user_id=u.id, specialization="General", department="General") for u in users])
+    db.commit()
+    db.close()
+
+def run(label: str, engine, seconds: float, readers: int, writers: int):
+    session_factory = sessionmaker(bind=engine)
+    prepare(session_factory)
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+    today = date.today()
+
+    def reader(worker: int):
+        db = session_factory()
+        done = 0
+        while time.monotonic() < stop:
+            db.query(Appointment).filter(
+                Appointment.doctor_id == worker % DOCTORS + 1,
+                Appointment.date == today
+            ).order_by(Appointment.token_number).limit(50).all()
+            db.rollback()
+            done += 1
+        db.close()
+        with lock:
+            counts["reads"] += done
+
+    def writer(worker: int):
+        db = session_factory()
+        done = errors = 0
+        token = worker * 10_000_000
+        while time.monotonic() < stop:
+            token += 1
+            try:
+                db.add(Appointment(
+                    patient_id=1, doctor_id=token % DOCTORS + 1, date=today,
+                    time=time_of_day(9, 0), token_number=token, status="scheduled"
+                ))
+                db.commit()
+                done += 1
+            except OperationalError:
+                db.rollback()
+                errors += 1
+        db.close()
+        with lock:
+            counts["writes"] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    print(
+        f"{label:<10} reads/s={counts['reads'] / seconds:>9.0f}  "
+        f"writes/s={counts['writes'] / seconds:>8.0f}  lock errors={counts['errors']}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        default_engine = build_engine(f"sqlite:///{tmp}/default.db", sqlite_pragmas={})
+        run("default", default_engine, args.seconds, args.readers, args.writers)
+
+        tuned_engine = build_engine(f"sqlite:///{tmp}/tuned.db", sqlite_pragmas=SQLITE_PRAGMAS)
+        run("tuned", tuned_engine, args.seconds, args.readers, args.writers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Live event fan-out: connection count and backpressure.
+
+In-process mode drives the event bus directly: N subscribers on one topic, a
+fraction of them deliberately slow, events published at a fixed rate. It
+reports the publish cost per event, delivery latency for the healthy
+subscribers and how many slow ones were cut off with a resync.
+
+With --http it starts the API under uvicorn, holds N real SSE connections
+open as a doctor and books appointments as a patient, reporting how many
+streams saw each booking and the delivery latency. Requires httpx.
+
+Usage: python benchmarks/event_fanout.py [--subscribers 100 1000 10000] [--http]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from itertools import count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import events
+from events import EventBus, RESYNC
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+# ==================== IN-PROCESS ====================
+
+async def run_in_process(subscribers: int, count: int, rate: float, slow_fraction: float,
+                         slow_delay: float, queue_size: int):
+    events.bus = EventBus(queue_size)
+    latencies = []
+    resyncs = 0
+
+    async def consume(subscription, delay: float):
+        nonlocal resyncs
+        async for message in events.messages(subscription, keepalive=60):
+            if message is RESYNC:
+                resyncs += 1
+                return
+            event = json.loads(message)
+            if event["type"] == "done":
+                return
+            if delay:
+                await asyncio.sleep(delay)
+            else:
+                latencies.append(time.perf_counter() - event["data"]["sent"])
+
+    slow = int(subscribers * slow_fraction)
+    consumers = [
+        asyncio.create_task(consume(events.bus.subscribe(["doctor.1"]), slow_delay if n < slow else 0))
+        for n in range(subscribers)
+    ]
+    await asyncio.sleep(0)
+
+    publish_time = 0.0
+    for n in range(count):
+        started = time.perf_counter()
+        events.bus.publish("doctor.1", "appointment.booked", {"id": n, "sent": started})
+        publish_time += time.perf_counter() - started
+        await asyncio.sleep(1 / rate)
+    events.bus.publish("doctor.1", "done", {})
+    await asyncio.gather(*consumers)
+
+    print(
+        f"subscribers={subscribers:<6} slow={slow:<5} "
+        f"publish={publish_time / count * 1e6:>8.1f}us/event  "
+        f"p50={percentile(latencies, 0.50) * 1000:>7.2f}ms  "
+        f"p99={percentile(latencies, 0.99) * 1000:>7.2f}ms  "
+        f"delivered={len(latencies)}/{(subscribers - slow) * count}  resynced={resyncs}"
+    )
+
+# ==================== HTTP ====================
+
+async def run_http(base_url: str, doctor_token: str, patient_token: str, doctor_id: int,
+                   subscribers: int, bookings: int, slots):
+    import httpx
+
+    received = {}
+    connected = 0
+    all_connected = asyncio.Event()
+    limits = httpx.Limits(max_connections=subscribers + 1, max_keepalive_connections=subscribers + 1)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        async def listen():
+            nonlocal connected
+            async with client.stream("GET", "/events/stream", params={"token": doctor_token}) as response:
+                connected += 1
+                if connected == subscribers:
+                    all_connected.set()
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        event = json.loads(line[6:])
+                        if event["type"] == "appointment.booked":
+                            received.setdefault(event["data"]["id"], []).append(time.perf_counter())
+
+        listeners = [asyncio.create_task(listen()) for _ in range(subscribers)]
+        connect_started = time.perf_counter()
+        await asyncio.wait_for(all_connected.wait(), 120)
+        connect_time = time.perf_counter() - connect_started
+
+        latencies = []
+        for _ in range(bookings):
+            slot = next(slots)
+            sent = time.perf_counter()
+            response = await client.post(
+                "/patient/appointments",
+                json={"doctor_id": doctor_id, "date": slot.date().isoformat(), "time": slot.strftime("%H:%M")},
+                headers={"Authorization": f"Bearer {patient_token}"}
+            )
+            appointment_id = response.json()["id"]
+            deadline = time.monotonic() + 10
+            while len(received.get(appointment_id, [])) < subscribers and time.monotonic() < deadline:
+                await asyncio.sleep(0.005)
+            latencies.extend(arrived - sent for arrived in received.get(appointment_id, []))
+
+        for listener in listeners:
+            listener.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+
+    print(
+        f"connections={subscribers:<6} connect={connect_time:>6.2f}s  "
+        f"p50={percentile(latencies, 0.50) * 1000:>7.1f}ms  "
+        f"p99={percentile(latencies, 0.99) * 1000:>7.1f}ms  "
+        f"delivered={len(latencies)}/{subscribers * bookings}"
+    )
+
+def http_benchmark(args):
+    import httpx
+    from async_load import BACKEND_DIR, free_port, start_server
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS="4", RATE_LIMIT_ENABLED="false")
+        subprocess.run([sys.executable, "seed.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+        port = free_port()
+        server = start_server(env, port)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+
+            def login(email: str, password: str) -> dict:
+                return httpx.post(f"{base_url}/auth/login", json={"email": email, "password": password}).json()
+
+            doctor = login("doctor@hospify.com", "doctor123")
+            patient = login("patient@hospify.com", "patient123")
+            doctors = httpx.get(f"{base_url}/doctors").json()["items"]
+            doctor_id = next(d["id"] for d in doctors if d["user_id"] == doctor["user"]["id"])
+            # Without a schedule the doctor takes any time; each booking gets its own minute
+            httpx.put(f"{base_url}/doctor/schedule", json=[],
+                      headers={"Authorization": f"Bearer {doctor['access_token']}"}).raise_for_status()
+            start = datetime.combine(date.today(), datetime.min.time())
+            slots = (start + timedelta(minutes=n) for n in count())
+
+            for subscribers in args.subscribers:
+                asyncio.run(run_http(
+                    base_url, doctor["access_token"], patient["access_token"], doctor_id,
+                    subscribers, args.bookings, slots
+                ))
+        finally:
+            server.terminate()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=None)
+    parser.add_argument("--events", type=int, default=200, help="events published per run (in-process)")
+    parser.add_argument("--rate", type=float, default=500, help="events per second (in-process)")
+    parser.add_argument("--slow-fraction", type=float, default=0.1)
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="seconds a slow subscriber spends per event")
+    parser.add_argument("--queue-size", type=int, default=events.EVENT_QUEUE_SIZE)
+    parser.add_argument("--http", action="store_true", help="hold real SSE connections against uvicorn")
+    parser.add_argument("--bookings", type=int, default=20, help="appointments booked per run (--http)")
+    args = parser.parse_args()
+
+    if args.http:
+        args.subscribers = args.subscribers or [10, 100, 500]
+        http_benchmark(args)
+        return
+
+    for subscribers in args.subscribers or [100, 1000, 10000]:
+        asyncio.run(run_in_process(
+            subscribers, args.events, args.rate, args.slow_fraction, args.slow_delay, args.queue_size
+        ))
+
+if __name__ == "__main__":
+    main()
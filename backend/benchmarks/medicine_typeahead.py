@@ -0,0 +1,95 @@
+"""Medicine typeahead latency over a large catalog.
+
+Seeds a throwaway SQLite database with N generated SKUs (`seed.py
+--medicines N`), then times building the in-memory prefix index, looking up
+prefixes of 1-6 characters in it, the equivalent `name LIKE 'q%'` query in
+SQLite, and GET /medicines/search end to end in-process (FastAPI
+TestClient), which adds reading price and stock for the hits.
+
+Usage: python benchmarks/medicine_typeahead.py [--medicines 100000] [--queries 2000] [--limit 10]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def report(label: str, latencies: list):
+    print(
+        f"{label:<34} p50={percentile(latencies, 0.50) * 1e6:>8.1f}us  "
+        f"p99={percentile(latencies, 0.99) * 1e6:>8.1f}us"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--medicines", type=int, default=100000, help="catalog SKUs")
+    parser.add_argument("--queries", type=int, default=2000, help="lookups per measurement")
+    parser.add_argument("--limit", type=int, default=10, help="suggestions per lookup")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS="4", RATE_LIMIT_ENABLED="false")
+    subprocess.run([sys.executable, "seed.py", "--medicines", str(args.medicines)],
+                   cwd=BACKEND_DIR, check=True, capture_output=True)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import select
+    from db import SessionLocal
+    from models import Medicine
+    import main as api
+    import medicines
+
+    with SessionLocal() as db:
+        rows = medicines.load_names(db)
+    started = time.perf_counter()
+    index = medicines.PrefixIndex(rows)
+    print(f"medicines={len(index)} word keys={len(index.words)} "
+          f"index build={(time.perf_counter() - started) * 1000:.0f}ms")
+
+    # What a doctor has typed so far: the start of a name, or of its strength
+    rng = random.Random(7)
+    queries = []
+    for _ in range(args.queries):
+        words = rng.choice(rows)[1].split()
+        word = words[0] if rng.random() < 0.8 else words[1]
+        queries.append(word[:rng.randint(1, min(6, len(word)))])
+
+    def measure(fn) -> list:
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            fn(query)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    report("prefix index", measure(lambda query: index.search(query, args.limit)))
+    with SessionLocal() as db:
+        report("SQL name LIKE 'q%'", measure(lambda query: db.scalars(
+            select(Medicine.id).where(Medicine.name.like(f"{query}%")).order_by(Medicine.name).limit(args.limit)
+        ).all()))
+
+    with TestClient(api.app) as client:
+        token = client.post("/auth/login", json={
+            "email": "doctor@hospify.com", "password": "doctor123"
+        }).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        # The first search builds the app's own index
+        client.get("/medicines/search", params={"q": "a"}, headers=headers)
+
+        def request(query: str):
+            response = client.get("/medicines/search", params={"q": query, "limit": args.limit}, headers=headers)
+            assert response.status_code == 200, response.text
+
+        report("GET /medicines/search", measure(request))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Prescription write throughput for varying item counts.
+
+Runs POST /doctor/prescriptions in-process (FastAPI TestClient) against a
+freshly seeded SQLite database, one new appointment per prescription, and
+reports prescriptions/s, p50 latency and SQL statements per request.
+
+Usage: python benchmarks/prescription_writes.py [--seconds 3] [--items 1 5 10 20]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, time as time_of_day
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 5, 10, 20])
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS="4", RATE_LIMIT_ENABLED="false")
+    subprocess.run([sys.executable, "seed.py"], cwd=BACKEND_DIR, check=True, capture_output=True)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, insert
+    from db import SessionLocal
+    from models import Appointment, Doctor, Patient, User
+    import main as api
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(api.app.state.database.engine, "before_cursor_execute", count_statement)
+
+    with TestClient(api.app) as client:
+        login = client.post("/auth/login", json={"email": "doctor@hospify.com", "password": "doctor123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        with SessionLocal() as db:
+            doctor_id = db.query(Doctor.id).join(User).filter(User.email == "doctor@hospify.com").scalar()
+            patient_id = db.query(Patient.id).first()[0]
+
+        def new_appointments(count: int, first_token: int) -> list:
+            with SessionLocal() as db:
+                ids = db.scalars(insert(Appointment).returning(Appointment.id, sort_by_parameter_order=True), [
+                    {"patient_id": patient_id, "doctor_id": doctor_id, "date": date(2000, 1, 1),
+                     "time": time_of_day(9), "token_number": first_token + n, "status": "scheduled"}
+                    for n in range(count)
+                ]).all()
+                db.commit()
+            return ids
+
+        next_token = 1
+        for item_count in args.items:
+            items = [
+                {"medicine_name": f"Medicine {n}", "dosage": "500mg", "frequency": "Twice daily", "duration": "5 days"}
+                for n in range(item_count)
+            ]
+            appointment_ids = new_appointments(20_000, next_token)
+            next_token += len(appointment_ids)
+
+            latencies = []
+            statements = 0
+            stop = time.monotonic() + args.seconds
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                response = client.post("/doctor/prescriptions", headers=headers, json={
+                    "appointment_id": appointment_ids[len(latencies)], "notes": "benchmark", "items": items
+                })
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+
+            print(
+                f"items={item_count:<3} rx/s={len(latencies) / args.seconds:>7.0f}  "
+                f"p50={percentile(latencies, 0.50) * 1000:>6.2f}ms  "
+                f"p99={percentile(latencies, 0.99) * 1000:>6.2f}ms  "
+                f"sql/request={statements / len(latencies):>5.1f}"
+            )
+
+if __name__ == "__main__":
+    main()
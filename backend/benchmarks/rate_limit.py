@@ -0,0 +1,120 @@
+"""Normal traffic latency while one client floods the API, with and without rate limiting.
+
+Seeds a throwaway SQLite database, then runs apps built by create_app in
+this process (httpx over ASGI), with the rate limiter on and off. Patients
+browse at a steady pace (their appointments, the doctor list, a doctor
+search) while a single flooding client, from its own IP, sends
+--flood-rate requests a second over --flood-concurrency connections:
+logins (bcrypt) or, as a logged-in pharmacist, the pending prescription
+list. The flood's rate is fixed rather than as fast as responses come back,
+since the load generator shares this process (and CPU) with the app, and
+cheap rejections would otherwise just let it send more. For every scenario
+it reports the patients' p50/p99 and how the flood's requests were
+answered (200 served, 429 rate limited, 503 shed).
+
+Usage: python benchmarks/rate_limit.py [--seconds 8] [--patients 20] [--interval-ms 100]
+           [--flood-rate 300] [--flood-concurrency 32] [--bcrypt-rounds 10]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FLOOD_IP = "10.0.0.99"
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+async def patient(client: httpx.AsyncClient, headers: dict, interval: float, deadline: float, latencies: list):
+    paths = ["/patient/appointments", "/doctors", "/search?q=car"]
+    n = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get(paths[n % len(paths)], headers=headers)
+        assert response.status_code == 200, response.text
+        latencies.append(time.perf_counter() - started)
+        n += 1
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+async def flooder(client: httpx.AsyncClient, send, interval: float, deadline: float, statuses: Counter):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        statuses[(await send(client)).status_code] += 1
+        # Also yields when behind: in-process requests that don't wait on anything never give up the loop
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+async def scenario(app, args, patient_headers: list, flood) -> tuple:
+    latencies, statuses = [], Counter()
+    normal = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+    flooding = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(FLOOD_IP, 4000)),
+                                 base_url="http://bench", timeout=60)
+    async with normal, flooding:
+        deadline = time.perf_counter() + args.seconds
+        tasks = [patient(normal, headers, args.interval_ms / 1000, deadline, latencies) for headers in patient_headers]
+        if flood is not None:
+            interval = args.flood_concurrency / args.flood_rate
+            tasks += [flooder(flooding, flood, interval, deadline, statuses) for _ in range(args.flood_concurrency)]
+        await asyncio.gather(*tasks)
+    return latencies, statuses
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=8, help="per scenario")
+    parser.add_argument("--patients", type=int, default=20, help="patients browsing")
+    parser.add_argument("--interval-ms", type=float, default=100, help="pause between a patient's requests")
+    parser.add_argument("--flood-rate", type=float, default=300, help="flood requests per second")
+    parser.add_argument("--flood-concurrency", type=int, default=32)
+    parser.add_argument("--bcrypt-rounds", default="10")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS=args.bcrypt_rounds)
+    subprocess.run([sys.executable, "seed.py", "--doctors", "50", "--patients", str(args.patients),
+                    "--pharmacists", "2", "--appointments", "2000", "--prescriptions", "1000"],
+                   cwd=BACKEND_DIR, check=True, capture_output=True)
+
+    from db import SessionLocal
+    from models import User
+    from auth import create_access_token
+    from main import Settings, create_app
+
+    # Patients browse with ready-made tokens; logging them in is the flood's job
+    with SessionLocal() as db:
+        patient_ids = [user_id for user_id, in db.query(User.id).filter(User.role == "patient").limit(args.patients)]
+        pharmacist_id = db.query(User.id).filter(User.role == "pharmacist").first()[0]
+    patient_headers = [{"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"} for user_id in patient_ids]
+    pharmacist_headers = {"Authorization": f"Bearer {create_access_token({'sub': str(pharmacist_id)})}"}
+
+    floods = {
+        "no flood": None,
+        "login flood": lambda client: client.post(
+            "/auth/login", json={"email": "pharma@hospify.com", "password": "pharma123"}
+        ),
+        "prescriptions flood": lambda client: client.get(
+            "/pharmacy/prescriptions", params={"limit": 100}, headers=pharmacist_headers
+        ),
+    }
+    print(f"patients={len(patient_headers)} every {args.interval_ms:.0f}ms, flood={args.flood_rate:.0f}/s "
+          f"over {args.flood_concurrency} connections, bcrypt rounds={args.bcrypt_rounds}")
+    for label, flood in floods.items():
+        for rate_limit in (False, True):
+            app = create_app(Settings(rate_limit=rate_limit))
+            latencies, statuses = asyncio.run(scenario(app, args, patient_headers, flood))
+            answered = "  ".join(f"{status}={count}" for status, count in sorted(statuses.items()))
+            print(
+                f"{label:<20} limiter={'on ' if rate_limit else 'off'}  patients p50={percentile(latencies, 0.50) * 1000:>7.1f}ms "
+                f"p99={percentile(latencies, 0.99) * 1000:>7.1f}ms  requests={len(latencies):<5} flood: {answered or '-'}"
+            )
+
+if __name__ == "__main__":
+    main()
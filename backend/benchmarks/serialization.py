@@ -0,0 +1,112 @@
+"""Per-row cost of loading and serializing a large appointment list.
+
+Seeds a throwaway SQLite database with N synthetic appointments, then times
+a 10k-row Page[AppointmentResponse] both ways it can be built: ORM objects
+with their doctor and user (queries.appointments_query), or plain column
+rows (queries.appointment_rows). Then it times each way of rendering it:
+
+- FastAPI's own path for a `response_model` (validate, dump to primitives,
+  `json.dumps` in JSONResponse), as the list endpoints did before;
+- the same with the orjson response class (serialization.DefaultResponse);
+- serialization.render, one pass through a cached TypeAdapter;
+- rows rendered with render (validated) or render_rows (encoded as is).
+
+Each figure is the median of --repeats runs divided by the row count, with
+the garbage collector paused while timing, as timeit does.
+
+Usage: python benchmarks/serialization.py [--appointments 10000] [--repeats 7]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=10000, help="rows per response")
+    parser.add_argument("--repeats", type=int, default=7)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS="4")
+    subprocess.run([sys.executable, "seed.py", "--doctors", "50", "--patients", "1000",
+                    "--appointments", str(args.appointments)],
+                   cwd=BACKEND_DIR, check=True, capture_output=True)
+
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from db import SessionLocal
+    from models import Appointment
+    from queries import appointment_from_row, appointment_rows, appointments_query
+    from schemas import AppointmentResponse, Page
+    import serialization
+
+    schema = Page[AppointmentResponse]
+    field = create_response_field(name="Response_appointments", type_=schema)
+
+    def median(fn) -> float:
+        durations = []
+        for _ in range(args.repeats):
+            gc.collect()
+            gc.disable()
+            started = time.perf_counter()
+            result = fn()
+            durations.append(time.perf_counter() - started)
+            gc.enable()
+        return statistics.median(durations), result
+
+    def load_orm() -> dict:
+        with SessionLocal() as db:
+            items = appointments_query(db).order_by(Appointment.id).limit(args.appointments).all()
+            return {"items": items, "next_cursor": None}
+
+    def load_rows() -> dict:
+        with SessionLocal() as db:
+            rows = appointment_rows(db).order_by(Appointment.id).limit(args.appointments).all()
+            return {"items": [appointment_from_row(row) for row in rows], "next_cursor": None}
+
+    def fastapi_path(response_class):
+        def render(page: dict) -> bytes:
+            content = asyncio.run(serialize_response(field=field, response_content=page))
+            return response_class(content).body
+        return render
+
+    def render(page: dict) -> bytes:
+        return serialization.render(schema, page).body
+
+    def render_rows(page: dict) -> bytes:
+        return serialization.render_rows(schema, page).body
+
+    orm_load, orm_page = median(load_orm)
+    rows_load, rows_page = median(load_rows)
+    rows = len(orm_page["items"])
+    assert rows == len(rows_page["items"])
+    print(f"rows={rows} orjson={'yes' if serialization.orjson else 'no'}")
+
+    baseline = None
+    for label, load, page, fn in (
+        ("ORM, FastAPI + json", orm_load, orm_page, fastapi_path(JSONResponse)),
+        ("ORM, FastAPI + orjson", orm_load, orm_page, fastapi_path(serialization.DefaultResponse)),
+        ("ORM, render", orm_load, orm_page, render),
+        ("rows, render", rows_load, rows_page, render),
+        ("rows, render_rows", rows_load, rows_page, render_rows),
+    ):
+        serialize, body = median(lambda: fn(page))
+        total = (load + serialize) / rows * 1e6
+        baseline = baseline or total
+        print(
+            f"{label:<24} load={load / rows * 1e6:>6.1f}us/row  serialize={serialize / rows * 1e6:>6.1f}us/row  "
+            f"total={total:>6.1f}us/row  ({baseline / total:.1f}x)  body={len(body) / 2 ** 20:.1f}MB"
+        )
+
+if __name__ == "__main__":
+    main()
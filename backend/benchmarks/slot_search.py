@@ -0,0 +1,145 @@
+"""Slot search latency across many scheduled doctors.
+
+Seeds a throwaway SQLite database with N doctors on weekday schedules and
+books a fraction of their slots over the coming months, with one
+specialization fully booked for the first weeks so "first available" has to
+search ahead. Then times GET /doctors/{id}/slots for months-ahead windows and
+GET /doctors/first-available per specialization in-process (FastAPI
+TestClient), with the schedule cache cold and warm.
+
+Usage: python benchmarks/slot_search.py [--doctors 300] [--days 120] [--fill 0.6] [--requests 200]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, time as time_of_day, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SPECIALIZATIONS = ["Cardiology", "Dermatology", "Neurology", "Orthopedics", "Pediatrics", "Oncology"]
+# Nobody in this specialization has a free slot for the first weeks
+BUSY_SPECIALIZATION, BUSY_DAYS = "Oncology", 45
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def populate(doctors: int, days: int, fill: float) -> tuple:
+    from sqlalchemy import insert
+    from db import SessionLocal
+    from models import BookedSlot, Doctor, DoctorSchedule, User
+    from scheduling import ScheduleRow, WeeklyTemplate
+
+    rng = random.Random(42)
+    blocks = [(time_of_day(9), time_of_day(13)), (time_of_day(14), time_of_day(17))]
+    booked = 0
+    with SessionLocal() as db:
+        user_ids = db.scalars(insert(User).returning(User.id), [
+            {"name": f"Dr. Bench {n}", "email": f"bench{n}@hospify.com", "phone": "0",
+             "password_hash": "x", "role": "doctor"}
+            for n in range(doctors)
+        ]).all()
+        db.execute(insert(Doctor), [
+            {"user_id": user_id, "specialization": SPECIALIZATIONS[n % len(SPECIALIZATIONS)],
+             "department": SPECIALIZATIONS[n % len(SPECIALIZATIONS)]}
+            for n, user_id in enumerate(user_ids)
+        ])
+        specialization = dict(db.query(Doctor.id, Doctor.specialization).filter(Doctor.user_id.in_(user_ids)))
+        doctor_ids = sorted(specialization)
+
+        schedule = [
+            {"weekday": weekday, "start_time": start, "end_time": end, "slot_minutes": 15}
+            for weekday in range(5) for start, end in blocks
+        ]
+        db.execute(insert(DoctorSchedule), [
+            dict(entry, doctor_id=doctor_id) for doctor_id in doctor_ids for entry in schedule
+        ])
+
+        template = WeeklyTemplate(ScheduleRow(**entry) for entry in schedule)
+        today = date.today()
+        for doctor_id in doctor_ids:
+            rows = []
+            for offset in range(days):
+                day = today + timedelta(days=offset)
+                busy = specialization[doctor_id] == BUSY_SPECIALIZATION and offset < BUSY_DAYS
+                for slot in template.slots.get(day.weekday(), ()):
+                    if busy or rng.random() < fill:
+                        rows.append({"doctor_id": doctor_id, "date": day, "time": slot})
+            db.execute(insert(BookedSlot), rows)
+            booked += len(rows)
+        db.commit()
+    return doctor_ids, booked
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--doctors", type=int, default=300)
+    parser.add_argument("--days", type=int, default=120, help="days of bookings to generate")
+    parser.add_argument("--fill", type=float, default=0.6, help="fraction of slots already booked")
+    parser.add_argument("--requests", type=int, default=200, help="requests per measurement")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS="4", RATE_LIMIT_ENABLED="false")
+    subprocess.run([sys.executable, "seed.py"], cwd=BACKEND_DIR, check=True, capture_output=True)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    import main as api
+    import scheduling
+
+    started = time.perf_counter()
+    doctor_ids, booked = populate(args.doctors, args.days, args.fill)
+    print(f"doctors={args.doctors} booked slots={booked} setup={time.perf_counter() - started:.1f}s")
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(api.app.state.database.engine, "before_cursor_execute", count_statement)
+    rng = random.Random(7)
+
+    def measure(label: str, requests: list, cold: bool):
+        nonlocal statements
+        latencies = []
+        statements = 0
+        for path, params in requests:
+            if cold:
+                scheduling.schedule_cache.clear()
+            sent = time.perf_counter()
+            response = client.get(path, params=params)
+            latencies.append(time.perf_counter() - sent)
+            assert response.status_code == 200, response.text
+        print(
+            f"{label:<34} {'cold' if cold else 'warm'}  "
+            f"p50={percentile(latencies, 0.50) * 1000:>6.2f}ms  "
+            f"p99={percentile(latencies, 0.99) * 1000:>6.2f}ms  "
+            f"sql/request={statements / len(latencies):>4.1f}"
+        )
+
+    today = date.today()
+    with TestClient(api.app) as client:
+        for label, start, length in [("slots, next 2 weeks", 0, 14), ("slots, 30 days from +60", 60, 30),
+                                     ("slots, 90 days from +30", 30, 90)]:
+            window = {"from": (today + timedelta(days=start)).isoformat(),
+                      "to": (today + timedelta(days=start + length - 1)).isoformat()}
+            requests = [(f"/doctors/{rng.choice(doctor_ids)}/slots", window) for _ in range(args.requests)]
+            for cold in (True, False):
+                measure(label, requests, cold)
+
+        for specialization in ("Cardiology", BUSY_SPECIALIZATION):
+            requests = [("/doctors/first-available", {"specialization": specialization, "limit": 10})] * args.requests
+            for cold in (True, False):
+                measure(f"first-available {specialization}", requests, cold)
+        requests = [("/doctors/first-available", {"limit": 10})] * args.requests
+        for cold in (True, False):
+            measure("first-available, all doctors", requests, cold)
+
+if __name__ == "__main__":
+    main()
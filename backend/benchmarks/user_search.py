@@ -0,0 +1,105 @@
+"""Full-text user search latency on a large user base.
+
+Seeds a throwaway SQLite database with N synthetic patients and some doctors
+(`seed.py --patients N --doctors M`, which fills the FTS5 index through its
+triggers as rows are inserted), then times search.search_users for the
+kinds of queries the front desk types: part of a first name, a full name,
+a phone number prefix, an email, and a specialization. Paging through a
+broad query (following cursors) is timed too, and for comparison an email
+lookup with `LIKE '%x%'`, which is what searching without the index costs.
+
+Usage: python benchmarks/user_search.py [--patients 1000000] [--doctors 1000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ALL_ROLES = ("admin", "doctor", "patient", "pharmacist")
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=1000000)
+    parser.add_argument("--doctors", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per measurement")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS="4")
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "seed.py", "--patients", str(args.patients), "--doctors", str(args.doctors)],
+                   cwd=BACKEND_DIR, check=True, capture_output=True)
+    seeded = time.perf_counter() - started
+
+    from sqlalchemy import or_, select
+    from db import SessionLocal
+    from models import User
+    from pagination import PageParams
+    from synthetic import FIRST_NAMES, LAST_NAMES, SPECIALIZATIONS, synthetic_email
+    import search
+
+    with SessionLocal() as db:
+        users = db.query(User).count()
+    size = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+    print(f"users={users} seed={seeded:.0f}s database={size / 2 ** 20:.0f}MB")
+
+    rng = random.Random(7)
+    queries = {
+        "first name prefix": lambda: rng.choice(FIRST_NAMES)[:rng.randint(2, 4)],
+        "full name": lambda: f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "phone prefix": lambda: f"9{rng.randrange(1, users):09d}"[:7],
+        "email": lambda: synthetic_email("patient", rng.randrange(args.patients)),
+        "specialization": lambda: rng.choice(SPECIALIZATIONS)[:5],
+    }
+
+    def report(label: str, latencies: list, results: int):
+        print(
+            f"{label:<26} p50={percentile(latencies, 0.50) * 1000:>8.2f}ms  "
+            f"p99={percentile(latencies, 0.99) * 1000:>8.2f}ms  avg results={results / len(latencies):.1f}"
+        )
+
+    with SessionLocal() as db:
+        for label, make_query in queries.items():
+            latencies, results = [], 0
+            for _ in range(args.queries):
+                query = make_query()
+                started = time.perf_counter()
+                page = search.search_users(db, query, ALL_ROLES, PageParams(limit=20, cursor=None))
+                latencies.append(time.perf_counter() - started)
+                results += len(page["items"])
+            report(label, latencies, results)
+
+        # A last name matches tens of thousands of users; walk a few pages
+        for pages in (1, 5):
+            latencies = []
+            for _ in range(max(1, args.queries // 10)):
+                query, cursor = rng.choice(LAST_NAMES), None
+                started = time.perf_counter()
+                for _ in range(pages):
+                    cursor = search.search_users(db, query, ALL_ROLES, PageParams(limit=20, cursor=cursor))["next_cursor"]
+                latencies.append((time.perf_counter() - started) / pages)
+            report(f"last name, {pages} page(s)", latencies, 20 * len(latencies))
+
+        # Without the index, looking up one email reads the whole table
+        latencies = []
+        for _ in range(max(1, args.queries // 20)):
+            term = f"%{queries['email']()}%"
+            started = time.perf_counter()
+            db.execute(select(User.id).where(
+                or_(User.name.like(term), User.email.like(term), User.phone.like(term))
+            ).order_by(User.id).limit(20)).all()
+            latencies.append(time.perf_counter() - started)
+        report("email, LIKE '%x%' scan", latencies, len(latencies))
+
+if __name__ == "__main__":
+    main()
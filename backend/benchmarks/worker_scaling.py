@@ -0,0 +1,126 @@
+"""Throughput as the number of API worker processes grows.
+
+Starts `serve.py --workers N` for each N against the same freshly seeded
+SQLite database and drives read endpoints (GET /doctors, free slots and a
+patient's appointments) from several load-generating processes, then reports
+requests/s, p50/p99 latency and the speedup over one worker. The load
+generators share the machine with the server, so leave some cores for them:
+scaling is only near-linear while workers plus clients fit on the cores.
+Requires httpx.
+
+Usage: python benchmarks/worker_scaling.py [--workers 1 2 4] [--clients 4] [--concurrency 32] [--seconds 10]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from async_load import BACKEND_DIR, free_port, percentile
+
+def start_workers(env: dict, port: int, workers: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1",
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            # uvicorn answers once the first worker is up; give the rest a moment
+            time.sleep(1 + workers * 0.5)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("API server did not start")
+
+async def drive(base_url: str, token: str, doctor_ids: list, concurrency: int, seconds: float):
+    latencies, errors = [], 0
+    stop = time.monotonic() + seconds
+    paths = ["/doctors", "/patient/appointments"] + [f"/doctors/{doctor_id}/slots" for doctor_id in doctor_ids]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        async def worker(n: int):
+            nonlocal errors
+            i = n
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                response = await client.get(paths[i % len(paths)])
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+                i += 1
+
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return latencies, errors
+
+def client_process(base_url: str, token: str, doctor_ids: list, concurrency: int, seconds: float, results):
+    results.put(asyncio.run(drive(base_url, token, doctor_ids, concurrency, seconds)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cores = os.cpu_count() or 1
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, max(1, cores // 2)}))
+    parser.add_argument("--clients", type=int, default=max(1, cores // 2), help="load-generating processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per client process")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", BCRYPT_ROUNDS="4",
+               SHARED_STATE_FILE=os.path.join(tmp, "shared.db"), RATE_LIMIT_ENABLED="false")
+    subprocess.run([sys.executable, "seed.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+    print(f"cores={cores} clients={args.clients} x {args.concurrency} connections, {args.seconds:.0f}s per run")
+
+    single_rps = None
+    for workers in args.workers:
+        port = free_port()
+        server = start_workers(env, port, workers)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            token = httpx.post(f"{base_url}/auth/login", json={
+                "email": "patient@hospify.com", "password": "patient123"
+            }).json()["access_token"]
+            doctor_ids = [doctor["id"] for doctor in httpx.get(f"{base_url}/doctors").json()["items"]]
+
+            results = multiprocessing.Queue()
+            clients = [
+                multiprocessing.Process(target=client_process, args=(
+                    base_url, token, doctor_ids, args.concurrency, args.seconds, results
+                ))
+                for _ in range(args.clients)
+            ]
+            for client in clients:
+                client.start()
+            latencies, errors = [], 0
+            for _ in clients:
+                client_latencies, client_errors = results.get()
+                latencies.extend(client_latencies)
+                errors += client_errors
+            for client in clients:
+                client.join()
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+        rps = len(latencies) / args.seconds
+        single_rps = single_rps or rps
+        speedup = rps / single_rps
+        print(
+            f"workers={workers:<3} {rps:>8.0f} req/s  p50={percentile(latencies, 0.50) * 1000:>7.2f}ms  "
+            f"p99={percentile(latencies, 0.99) * 1000:>7.2f}ms  errors={errors}  "
+            f"speedup={speedup:.2f}x  efficiency={speedup / workers:.0%}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+"""Bulk import and export of patients, appointments and prescriptions.
+
+Imports read NDJSON (one object per line) or CSV (a header line, then one
+record per line, or more where a quoted field holds line breaks) from a
+byte stream. Records are validated one by one and
+written in batches of BULK_BATCH_SIZE: each batch is checked against the
+database with a few set-based queries, inserted with multi-row INSERTs and
+committed as one transaction. If a batch still hits a constraint (say a
+concurrent signup took an email), it is retried one row per transaction so
+only the offending rows fail. Every rejected record is reported by line.
+
+Exports page through the table by primary key, so only one page is ever
+held in memory, and yield NDJSON or CSV text as they go. Appointments are
+exported with patient/doctor emails, so an export can be imported again.
+
+Run with `python bulk.py import <kind> <file>` or
+`python bulk.py export <kind> [--format csv]`, or use the admin endpoints.
+"""
+import csv
+import io
+import json
+import os
+from collections import Counter, defaultdict, deque
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from db import Database, dialect_insert
+from models import User, Doctor, Patient, Appointment, Prescription, PrescriptionItem, BookedSlot
+from schemas import PatientImport, AppointmentImport, PrescriptionImport
+from hashing import hash_passwords_async, get_pwd_context
+from tokens import allocate_token_numbers
+from medicines import check_medicines
+import stats
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+BULK_EXPORT_PAGE_SIZE = int(os.getenv("BULK_EXPORT_PAGE_SIZE", "1000"))
+# Further errors are counted but not listed
+BULK_MAX_REPORTED_ERRORS = int(os.getenv("BULK_MAX_REPORTED_ERRORS", "1000"))
+
+FORMATS = ("ndjson", "csv")
+
+# (line number, validated record)
+Row = Tuple[int, BaseModel]
+
+# ==================== PARSING ====================
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+class NeedMoreLines(Exception):
+    """The CSV reader got to the end of the lines received so far."""
+
+class PendingLines:
+    """Decoded lines waiting for the parser's CSV reader. Running out of them
+    before the stream has ended stops the reader with NeedMoreLines; the
+    lines it took for the record it was reading are kept in `taken`."""
+
+    def __init__(self):
+        self.lines = deque()  # (line number, text)
+        self.taken = []
+        self.ended = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            if self.ended:
+                raise StopIteration
+            raise NeedMoreLines
+        line = self.lines.popleft()
+        self.taken.append(line)
+        return line[1]
+
+class RecordParser:
+    """Turns an import's lines into (first line number, record) pairs and
+    reports the ones it can't read to `fail`.
+
+    NDJSON has a record per line. CSV goes through one csv.reader for the
+    whole stream, which decides where each record ends, so quoted fields may
+    hold line breaks and quotes anywhere else are just characters. When the
+    lines received so far end inside a record, its lines are put back and
+    read again once at least as many more have arrived, which keeps a long
+    record (or a quote that is never closed) from being re-read per line.
+    """
+
+    def __init__(self, fmt: str, fail: Callable[[int, str], None]):
+        self.fmt = fmt
+        self.fail = fail
+        self.header: Optional[List[str]] = None
+        self._pending = PendingLines()
+        self._reader = csv.reader(self._pending)
+        self._wanted = 1  # pending lines needed before the reader runs again
+
+    def feed(self, line_number: int, raw: bytes) -> Iterator[Tuple[int, dict]]:
+        """The records completed by the line `raw`."""
+        try:
+            text = raw.decode("utf-8").removeprefix("\ufeff")
+        except UnicodeDecodeError as exc:
+            self.fail(line_number, str(exc))
+            return
+        if self.fmt == "ndjson":
+            if text.strip():
+                try:
+                    record = json.loads(text)
+                    if not isinstance(record, dict):
+                        raise ValueError("Expected a JSON object")
+                except ValueError as exc:
+                    self.fail(line_number, str(exc))
+                    return
+                yield line_number, record
+            return
+
+        self._pending.lines.append((line_number, text + "\n"))
+        if len(self._pending.lines) >= self._wanted:
+            yield from self._read()
+
+    def finish(self) -> Iterator[Tuple[int, dict]]:
+        """The records left once the stream has ended."""
+        self._pending.ended = True
+        if self.fmt == "csv":
+            yield from self._read()
+
+    def _read(self) -> Iterator[Tuple[int, dict]]:
+        while True:
+            self._pending.taken = []
+            try:
+                values = next(self._reader)
+            except NeedMoreLines:
+                taken = self._pending.taken
+                self._pending.lines.extendleft(reversed(taken))
+                self._wanted = max(1, 2 * len(taken))
+                return
+            except StopIteration:
+                return
+            except csv.Error as exc:
+                self.fail(self._pending.taken[0][0], str(exc))
+                continue
+            self._wanted = 1
+            line_number = self._pending.taken[0][0]
+            if len(values) <= 1 and not "".join(values).strip():
+                continue
+            if self.header is None:
+                self.header = [name.strip() for name in values]
+                continue
+            if len(values) != len(self.header):
+                self.fail(line_number, f"Expected {len(self.header)} columns, got {len(values)}")
+                continue
+            # Empty cells fall back to the schema defaults
+            yield line_number, {name: value for name, value in zip(self.header, values) if value != ""}
+
+async def iter_records(chunks: AsyncIterator[bytes], parser: RecordParser) -> AsyncIterator[Tuple[int, dict]]:
+    """(first line number, record) pairs, as their lines arrive."""
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        for record in parser.feed(line_number, line):
+            yield record
+    for record in parser.finish():
+        yield record
+
+def describe(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'record'}: {error['msg']}"
+            for error in exc.errors()
+        )
+    return str(exc)
+
+# ==================== IMPORT ====================
+
+async def prepare_patients(rows: List[Row]) -> List[Row]:
+    # Hash plain passwords in the hashing pool, a few at a time, before the batch is written
+    to_hash = [row for _, row in rows if row.password_hash is None and row.password is not None]
+    hashes = await hash_passwords_async([row.password for row in to_hash])
+    for row, password_hash in zip(to_hash, hashes):
+        row.password_hash = password_hash
+    return rows
+
+def insert_patients(db: Session, rows: List[Row]):
+    emails = {row.email for _, row in rows}
+    taken = set(db.scalars(select(User.email).where(User.email.in_(emails))))
+
+    accepted, errors = [], []
+    for line, row in rows:
+        if row.password_hash is None:
+            errors.append((line, "password or password_hash is required"))
+        elif not get_pwd_context().identify(row.password_hash):
+            errors.append((line, "password_hash is not a recognized hash"))
+        elif row.email in taken:
+            errors.append((line, f"Email already registered: {row.email}"))
+        else:
+            taken.add(row.email)
+            accepted.append(row)
+
+    if accepted:
+        # Unordered RETURNING keeps this one statement on SQLite; match ids back by email
+        user_ids = dict(db.execute(
+            insert(User).returning(User.email, User.id),
+            [
+                {"name": row.name, "email": row.email, "phone": row.phone,
+                 "password_hash": row.password_hash, "role": "patient"}
+                for row in accepted
+            ]
+        ).all())
+        db.execute(insert(Patient), [
+            {"user_id": user_ids[row.email], "age": row.age, "gender": row.gender}
+            for row in accepted
+        ])
+        stats.bump(db, "patients", len(accepted))
+    db.commit()
+    return len(accepted), errors
+
+def insert_appointments(db: Session, rows: List[Row]):
+    patient_emails = {row.patient_email for _, row in rows}
+    doctor_emails = {row.doctor_email for _, row in rows}
+    patients = dict(db.execute(
+        select(User.email, Patient.id).join(Patient, Patient.user_id == User.id).where(User.email.in_(patient_emails))
+    ).all())
+    doctors = {
+        email: (doctor_id, department)
+        for email, doctor_id, department in db.execute(
+            select(User.email, Doctor.id, Doctor.department)
+            .join(Doctor, Doctor.user_id == User.id)
+            .where(User.email.in_(doctor_emails))
+        )
+    }
+
+    # Group by doctor and day so each group reserves its tokens in one upsert
+    groups, errors = defaultdict(list), []
+    for line, row in rows:
+        if row.patient_email not in patients:
+            errors.append((line, f"Unknown patient: {row.patient_email}"))
+        elif row.doctor_email not in doctors:
+            errors.append((line, f"Unknown doctor: {row.doctor_email}"))
+        else:
+            groups[(doctors[row.doctor_email][0], row.date)].append(row)
+
+    values, counters = [], Counter()
+    for (doctor_id, day), group in groups.items():
+        tokens = allocate_token_numbers(db, doctor_id, day, len(group))
+        department = doctors[group[0].doctor_email][1]
+        for token_number, row in zip(tokens, group):
+            values.append({
+                "patient_id": patients[row.patient_email], "doctor_id": doctor_id,
+                "date": row.date, "time": row.time, "token_number": token_number, "status": row.status
+            })
+            counters[stats.stat_key("appointments", "date", day.isoformat())] += 1
+            counters[stats.stat_key("appointments", "date", day.isoformat(), "department", department)] += 1
+            if row.status == "completed":
+                counters["appointments.completed"] += 1
+                counters[stats.stat_key("appointments", "completed", "department", department)] += 1
+
+    if values:
+        db.execute(insert(Appointment), values)
+        # Imported bookings take their slots; clashes with existing bookings are kept as-is
+        taken = {
+            (value["doctor_id"], value["date"], value["time"]) for value in values if value["status"] != "cancelled"
+        }
+        if taken:
+            db.execute(dialect_insert(db)(BookedSlot).on_conflict_do_nothing(), [
+                {"doctor_id": doctor_id, "date": day, "time": at} for doctor_id, day, at in taken
+            ])
+        stats.bump_many(db, counters)
+    db.commit()
+    return len(values), errors
+
+def insert_prescriptions(db: Session, rows: List[Row]):
+    appointment_ids = {row.appointment_id for _, row in rows}
+    appointments = {
+        appointment_id: (doctor_id, patient_id)
+        for appointment_id, doctor_id, patient_id in db.execute(
+            select(Appointment.id, Appointment.doctor_id, Appointment.patient_id)
+            .where(Appointment.id.in_(appointment_ids))
+        )
+    }
+
+    # An appointment has at most one prescription
+    prescribed = set(db.scalars(
+        select(Prescription.appointment_id).where(Prescription.appointment_id.in_(appointment_ids))
+    ))
+
+    unknown_medicines = check_medicines(db, (item.medicine_id for _, row in rows for item in row.items))
+
+    accepted, errors = [], []
+    for line, row in rows:
+        missing = sorted({item.medicine_id for item in row.items} & unknown_medicines)
+        if row.appointment_id not in appointments:
+            errors.append((line, f"Unknown appointment: {row.appointment_id}"))
+        elif row.appointment_id in prescribed:
+            errors.append((line, f"Appointment already has a prescription: {row.appointment_id}"))
+        elif missing:
+            errors.append((line, f"Unknown medicine: {', '.join(map(str, missing))}"))
+        else:
+            prescribed.add(row.appointment_id)
+            accepted.append(row)
+
+    if accepted:
+        prescription_ids = dict(db.execute(
+            insert(Prescription).returning(Prescription.appointment_id, Prescription.id),
+            [
+                {"appointment_id": row.appointment_id, "doctor_id": appointments[row.appointment_id][0],
+                 "patient_id": appointments[row.appointment_id][1], "notes": row.notes,
+                 "dispense_status": row.dispense_status}
+                for row in accepted
+            ]
+        ).all())
+        items = [
+            {"prescription_id": prescription_ids[row.appointment_id], **item.model_dump()}
+            for row in accepted
+            for item in row.items
+        ]
+        if items:
+            db.execute(insert(PrescriptionItem), items)
+        pending = sum(1 for row in accepted if row.dispense_status == "pending")
+        if pending:
+            stats.bump(db, "prescriptions.pending", pending)
+    db.commit()
+    return len(accepted), errors
+
+def write_batch(db: Session, insert_fn: Callable, rows: List[Row]):
+    try:
+        return insert_fn(db, rows)
+    except IntegrityError:
+        db.rollback()
+
+    # Isolate the rows that conflict with concurrent writes
+    inserted, errors = 0, []
+    for line, row in rows:
+        try:
+            row_inserted, row_errors = insert_fn(db, [(line, row)])
+        except IntegrityError as exc:
+            db.rollback()
+            row_inserted, row_errors = 0, [(line, f"Conflicts with existing data: {exc.orig}")]
+        inserted += row_inserted
+        errors += row_errors
+    return inserted, errors
+
+async def _no_prepare(rows: List[Row]) -> List[Row]:
+    return rows
+
+# kind -> (record schema, async preparation, batch insert)
+IMPORTS = {
+    "patients": (PatientImport, prepare_patients, insert_patients),
+    "appointments": (AppointmentImport, _no_prepare, insert_appointments),
+    "prescriptions": (PrescriptionImport, _no_prepare, insert_prescriptions),
+}
+
+async def import_stream(database: Database, kind: str, fmt: str, chunks: AsyncIterator[bytes]) -> dict:
+    schema, prepare, insert_fn = IMPORTS[kind]
+    summary = {"received": 0, "inserted": 0, "failed": 0, "errors": []}
+
+    def fail(line: int, error: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < BULK_MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line, "error": error})
+
+    async def flush(batch: List[Row]):
+        batch = await prepare(batch)
+        inserted, errors = await database.run(write_batch, insert_fn, batch)
+        summary["inserted"] += inserted
+        for line, error in errors:
+            fail(line, error)
+
+    batch = []
+    async for line_number, record in iter_records(chunks, RecordParser(fmt, fail)):
+        summary["received"] += 1
+        try:
+            batch.append((line_number, schema.model_validate(record)))
+        except ValidationError as exc:
+            fail(line_number, describe(exc))
+            continue
+
+        if len(batch) >= BULK_BATCH_SIZE:
+            await flush(batch)
+            batch = []
+
+    if batch:
+        await flush(batch)
+    summary["errors"].sort(key=lambda error: error["line"])
+    return summary
+
+# ==================== EXPORT ====================
+
+def patient_page(db: Session, after_id: int, limit: int) -> List[dict]:
+    rows = db.execute(
+        select(Patient.id, User.name, User.email, User.phone, Patient.age, Patient.gender)
+        .join(User, Patient.user_id == User.id)
+        .where(Patient.id > after_id).order_by(Patient.id).limit(limit)
+    )
+    return [row._asdict() for row in rows]
+
+def appointment_page(db: Session, after_id: int, limit: int) -> List[dict]:
+    patient_user = aliased(User)
+    doctor_user = aliased(User)
+    rows = db.execute(
+        select(
+            Appointment.id, patient_user.email.label("patient_email"), doctor_user.email.label("doctor_email"),
+            Appointment.date, Appointment.time, Appointment.token_number, Appointment.status
+        )
+        .join(Patient, Appointment.patient_id == Patient.id)
+        .join(patient_user, Patient.user_id == patient_user.id)
+        .join(Doctor, Appointment.doctor_id == Doctor.id)
+        .join(doctor_user, Doctor.user_id == doctor_user.id)
+        .where(Appointment.id > after_id).order_by(Appointment.id).limit(limit)
+    )
+    return [row._asdict() for row in rows]
+
+def prescription_page(db: Session, after_id: int, limit: int) -> List[dict]:
+    prescriptions = [
+        dict(row._asdict(), items=[])
+        for row in db.execute(
+            select(Prescription.id, Prescription.appointment_id, Prescription.notes, Prescription.dispense_status)
+            .where(Prescription.id > after_id).order_by(Prescription.id).limit(limit)
+        )
+    ]
+    if prescriptions:
+        by_id = {prescription["id"]: prescription for prescription in prescriptions}
+        items = db.execute(
+            select(
+                PrescriptionItem.prescription_id, PrescriptionItem.medicine_name,
+                PrescriptionItem.dosage, PrescriptionItem.frequency, PrescriptionItem.duration,
+                PrescriptionItem.medicine_id, PrescriptionItem.quantity
+            ).where(PrescriptionItem.prescription_id.in_(by_id)).order_by(PrescriptionItem.id)
+        )
+        for prescription_id, *item in items:
+            by_id[prescription_id]["items"].append(
+                dict(zip(("medicine_name", "dosage", "frequency", "duration", "medicine_id", "quantity"), item))
+            )
+    return prescriptions
+
+# kind -> (columns, page loader)
+EXPORTS = {
+    "patients": (["id", "name", "email", "phone", "age", "gender"], patient_page),
+    "appointments": (
+        ["id", "patient_email", "doctor_email", "date", "time", "token_number", "status"], appointment_page
+    ),
+    "prescriptions": (["id", "appointment_id", "notes", "dispense_status", "items"], prescription_page),
+}
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return json.dumps(value)
+    return value
+
+def render(records: List[dict], columns: List[str], fmt: str) -> str:
+    if fmt == "ndjson":
+        return "".join(json.dumps(record, default=str) + "\n" for record in records)
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerows([_csv_value(record[column]) for column in columns] for record in records)
+    return out.getvalue()
+
+async def export_stream(database: Database, kind: str, fmt: str) -> AsyncIterator[str]:
+    columns, load_page = EXPORTS[kind]
+    if fmt == "csv":
+        yield ",".join(columns) + "\n"
+
+    after_id = 0
+    while True:
+        records = await database.run(load_page, after_id, BULK_EXPORT_PAGE_SIZE)
+        if not records:
+            return
+        yield render(records, columns, fmt)
+        after_id = records[-1]["id"]
+
+# ==================== CLI ====================
+
+async def _file_chunks(path: str, size: int = 1 << 16) -> AsyncIterator[bytes]:
+    with open(path, "rb") as source:
+        while chunk := source.read(size):
+            yield chunk
+
+async def _main(args):
+    from db import database
+    from hashing import shutdown_executor
+
+    try:
+        if args.command == "import":
+            fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+            summary = await import_stream(database, args.kind, fmt, _file_chunks(args.path))
+            for error in summary["errors"]:
+                print(f"line {error['line']}: {error['error']}")
+            print(
+                f"✅ Imported {summary['inserted']} of {summary['received']} {args.kind} "
+                f"({summary['failed']} failed)"
+            )
+        else:
+            async for text in export_stream(database, args.kind, args.format or "ndjson"):
+                print(text, end="")
+    finally:
+        shutdown_executor()
+        await database.dispose()
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Bulk import/export of hospital records")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("kind", choices=sorted(IMPORTS))
+    parser.add_argument("path", nargs="?", help="file to import")
+    parser.add_argument("--format", choices=FORMATS)
+    args = parser.parse_args()
+    if args.command == "import" and not args.path:
+        parser.error("import needs a file")
+
+    migrate()
+    asyncio.run(_main(args))
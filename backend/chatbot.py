@@ -0,0 +1,177 @@
+"""Intent matching for the booking chatbot.
+
+An intent is a specialization or department. Its keywords are its own name
+plus the synonyms listed for it in CHATBOT_SYNONYMS_FILE (JSON: intent ->
+keywords). All keywords are compiled into one Aho-Corasick automaton, which
+finds every keyword in a single pass over the message, however many there
+are. Keywords match whole words, so "ear" matches neither "heart" nor
+"early"; a keyword ending in `*` is a stem that matches the start of a word,
+so "cardio*" matches "cardiologist". The intent whose matched
+keywords are longest in total wins, and the reply names doctors who practise
+it.
+
+The engine follows the doctors table version in response_cache: after a
+doctor is added or removed it reloads the doctor list on the next message.
+The automaton is only rebuilt when the set of specializations changes.
+Replies are cached per normalized message until then.
+"""
+import json
+import os
+import re
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from cache import TTLCache
+from db import Database
+from models import Doctor, User
+from response_cache import table_versions
+
+CHATBOT_SYNONYMS_FILE = os.getenv(
+    "CHATBOT_SYNONYMS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "chatbot_synonyms.json")
+)
+CHATBOT_CACHE_SIZE = int(os.getenv("CHATBOT_CACHE_SIZE", "4096"))
+# Doctors named in a reply
+DOCTORS_PER_REPLY = 3
+
+WORD = re.compile(r"[a-z0-9]+")
+_MISSING = object()
+
+def normalize(text: str) -> str:
+    """Lowercase words separated by single spaces, with a leading and trailing space."""
+    return " " + " ".join(WORD.findall(text.lower())) + " "
+
+def keyword_pattern(keyword: str) -> str:
+    """What the matcher looks for in a normalized message: the keyword's words
+    between spaces, or for a `*` stem without the trailing space."""
+    pattern = normalize(keyword)
+    return pattern.rstrip() if keyword.rstrip().endswith("*") else pattern
+
+def load_synonyms(path: str = CHATBOT_SYNONYMS_FILE) -> Dict[str, List[str]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over `keywords` (keyword -> intent)."""
+
+    def __init__(self, keywords: Dict[str, str]):
+        # Per state: transitions, failure link and the (keyword, intent) pairs ending there
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for keyword, intent in keywords.items():
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state].append((keyword, intent))
+
+        # Breadth-first, so every failure link points at a state that is already complete
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> List[Tuple[str, str]]:
+        goto, fail, output = self._goto, self._fail, self._output
+        state, found = 0, []
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.extend(output[state])
+        return found
+
+class IntentEngine:
+    def __init__(self, synonyms: Dict[str, List[str]], cache_size: int = CHATBOT_CACHE_SIZE):
+        self.synonyms = synonyms
+        self.version = None
+        self.intents = set()
+        self.doctors = {}
+        self.labels = {}
+        self.matcher = KeywordMatcher({})
+        self.reply_cache = TTLCache(maxsize=cache_size, ttl=float("inf"))
+
+    def update(self, doctors: Iterable[Tuple[str, str, str]], version=None):
+        """Load (name, specialization, department) rows for every doctor."""
+        labels = {intent.casefold(): intent for intent in self.synonyms}
+        by_intent = defaultdict(list)
+        for name, specialization, department in doctors:
+            for intent, label in {specialization.casefold(): specialization, department.casefold(): department}.items():
+                labels.setdefault(intent, label)
+                by_intent[intent].append(name)
+
+        self.doctors = dict(by_intent)
+        self.labels = labels
+        if set(labels) != self.intents:
+            self.matcher = self._build_matcher()
+            self.intents = set(labels)
+        self.version = version
+        self.reply_cache.clear()
+
+    def _build_matcher(self) -> KeywordMatcher:
+        keywords = {normalize(label): intent for intent, label in self.labels.items()}
+        for intent, synonyms in self.synonyms.items():
+            for keyword in synonyms:
+                keywords[keyword_pattern(keyword)] = intent.casefold()
+        return KeywordMatcher(keywords)
+
+    def intent(self, normalized: str) -> Optional[str]:
+        scores = defaultdict(int)
+        for keyword, intent in self.matcher.find(normalized):
+            scores[intent] += len(keyword)
+        return max(scores, key=lambda intent: (scores[intent], intent)) if scores else None
+
+    def reply(self, message: str) -> str:
+        normalized = normalize(message)
+        reply = self.reply_cache.get(normalized, _MISSING)
+        if reply is _MISSING:
+            reply = self._compose(self.intent(normalized))
+            self.reply_cache.set(normalized, reply)
+        if reply is None:
+            return (f"I understood: '{message}'. Please select a doctor and available slot from the booking form "
+                    "to schedule your appointment.")
+        return reply
+
+    def _compose(self, intent: Optional[str]) -> Optional[str]:
+        if intent is None:
+            return None
+        label = self.labels[intent]
+        doctors = self.doctors.get(intent, [])
+        if not doctors:
+            return (f"We don't have any {label} specialists at the moment. Please select a doctor from the "
+                    "booking form and they can refer you.")
+        names = ", ".join(doctors[:DOCTORS_PER_REPLY])
+        if len(doctors) > DOCTORS_PER_REPLY:
+            names += f" and {len(doctors) - DOCTORS_PER_REPLY} more"
+        specialists = "specialist" if len(doctors) == 1 else "specialists"
+        return (f"I can help you book an appointment with our {label} {specialists}: {names}. "
+                "Would you like to schedule a consultation?")
+
+engine = IntentEngine(load_synonyms())
+
+def load_doctors(db: Session) -> list:
+    return db.query(User.name, Doctor.specialization, Doctor.department).join(
+        User, Doctor.user_id == User.id
+    ).order_by(Doctor.id).all()
+
+async def replies(messages: List[str], database: Database) -> List[str]:
+    # The version is read before loading, so a concurrent change triggers another reload
+    version = (database.url, table_versions["doctors"])
+    if engine.version != version:
+        engine.update(await database.run(load_doctors), version)
+    return [engine.reply(message) for message in messages]
@@ -0,0 +1,144 @@
+"""In-process publish/subscribe for the live dashboard streams.
+
+Handlers publish a small delta event after their transaction commits, and
+each connected dashboard holds a `Subscription` with a bounded queue. An
+event is encoded once and the same string is handed to every subscriber of
+its topic. Publishing never waits: a subscriber whose queue is full is
+dropped and sent a single `resync` event, telling the client to re-fetch its
+list and reconnect, so one slow connection cannot hold up the others.
+
+Each API process has its own bus; every publish and subscribe must happen on
+the event loop thread. With several workers, published events are also
+broadcast through shared_state and delivered to the other workers'
+subscribers.
+"""
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Optional
+from shared_state import state as shared_state
+
+# Events buffered per connection before it is considered too slow and dropped
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+# Idle streams send a keepalive so proxies don't close them
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+
+PHARMACY_TOPIC = "pharmacy"
+RESYNC = json.dumps({"type": "resync", "data": {}})
+
+def doctor_topic(doctor_id: int) -> str:
+    return f"doctor.{doctor_id}"
+
+def topics_for(role: str, profile_id: Optional[int]) -> list:
+    if role == "doctor" and profile_id:
+        return [doctor_topic(profile_id)]
+    if role == "pharmacist":
+        return [PHARMACY_TOPIC]
+    return []
+
+class Subscription:
+    def __init__(self, topics: list, maxsize: int):
+        self.topics = topics
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+class EventBus:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, topics: list) -> Subscription:
+        subscription = Subscription(topics, self.queue_size)
+        for topic in topics:
+            self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[topic]
+
+    def publish(self, topic: str, event_type: str, data) -> int:
+        """Queue an event for every subscriber of `topic`; returns how many in this process got it."""
+        if topic not in self._subscribers and not shared_state.shared:
+            return 0
+
+        message = json.dumps({"type": event_type, "data": data}, default=str)
+        self.published += 1
+        if shared_state.shared:
+            shared_state.broadcast("events", {"topic": topic, "message": message})
+        return self.deliver(topic, message)
+
+    def deliver(self, topic: str, message: str) -> int:
+        subscribers = self._subscribers.get(topic)
+        if not subscribers:
+            return 0
+
+        delivered = 0
+        for subscription in list(subscribers):
+            try:
+                subscription.queue.put_nowait(message)
+                delivered += 1
+            except asyncio.QueueFull:
+                self._overflow(subscription)
+        self.delivered += delivered
+        return delivered
+
+    def _overflow(self, subscription: Subscription):
+        # Replace the backlog with a resync marker; the stream ends after sending it
+        self.unsubscribe(subscription)
+        subscription.overflowed = True
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(RESYNC)
+        self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+bus = EventBus()
+shared_state.on("events", lambda payload: bus.deliver(payload["topic"], payload["message"]))
+
+async def messages(subscription: Subscription, keepalive: float = EVENT_KEEPALIVE_SECONDS) -> AsyncIterator[Optional[str]]:
+    """Yield queued messages for a subscription, or None after `keepalive`
+    idle seconds. Stops after a resync and always unsubscribes."""
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield message
+            if message is RESYNC:
+                return
+    finally:
+        bus.unsubscribe(subscription)
+
+async def sse_stream(topics: list) -> AsyncIterator[str]:
+    """Server-sent events for `topics`. Subscribes once the response body
+    starts, so a client that leaves before then leaves no queue behind."""
+    subscription = bus.subscribe(topics)
+    try:
+        async for message in messages(subscription):
+            if message is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {message}\n\n"
+    finally:
+        # Closing this generator doesn't close messages(), which would unsubscribe only when collected
+        bus.unsubscribe(subscription)
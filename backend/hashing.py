@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, status
+import metrics
+
+# Password hashing configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 4)))
+# Pool jobs bulk imports keep in flight at once, so logins queue behind a few of them at most
+PASSWORD_HASH_BULK_CONCURRENCY = int(os.getenv(
+    "PASSWORD_HASH_BULK_CONCURRENCY", str(max(1, PASSWORD_HASH_WORKERS // 2))
+))
+
+_pwd_context = None
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+_bulk_slots: Optional[asyncio.Semaphore] = None
+
+def get_pwd_context():
+    """The bcrypt CryptContext. passlib is imported on first use, which keeps
+    it out of startup for processes (and pool workers) that never hash."""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        # Hashes made with a different cost factor are flagged by needs_update/verify_and_update
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _pwd_context
+
+# Worker-side functions; these run in the pool's processes.
+def _hash(password: str) -> str:
+    return get_pwd_context().hash(password)
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return get_pwd_context().verify_and_update(password, hashed_password)
+
+def _timed(fn, *args):
+    # Timed in the worker, so time spent queued for one isn't counted as bcrypt time
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+async def _run(operation: str, fn, *args):
+    loop = asyncio.get_running_loop()
+    result, seconds = await loop.run_in_executor(get_executor(), _timed, fn, *args)
+    metrics.record_password_hash(operation, seconds)
+    return result
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Load passlib first, so forked workers inherit it instead of each importing it
+        get_pwd_context()
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _executor
+
+def shutdown_executor():
+    global _executor, _bulk_slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    # Bound to the event loop that used it
+    _bulk_slots = None
+
+async def _submit(operation: str, fn, *args):
+    """Run `fn` in the hashing pool, shedding load once the queue is full."""
+    global _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending += 1
+    try:
+        return await _run(operation, fn, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _submit("hash", _hash, password)
+
+async def hash_passwords_async(passwords: List[str]) -> List[str]:
+    """Hash a batch for bulk imports. Waits its turn instead of shedding
+    load, but keeps at most PASSWORD_HASH_BULK_CONCURRENCY jobs in the pool
+    (counted against PASSWORD_HASH_MAX_PENDING), so logins and signups are
+    still admitted while an import runs."""
+    global _bulk_slots
+    if _bulk_slots is None:
+        _bulk_slots = asyncio.Semaphore(PASSWORD_HASH_BULK_CONCURRENCY)
+    slots = _bulk_slots
+
+    async def hash_one(password: str) -> str:
+        global _pending
+        async with slots:
+            _pending += 1
+            try:
+                return await _run("hash", _hash, password)
+            finally:
+                _pending -= 1
+
+    return list(await asyncio.gather(*(hash_one(password) for password in passwords)))
+
+async def verify_password_async(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Return (valid, new_hash); `new_hash` is set when the stored hash should be
+    replaced because the configured cost factor changed."""
+    return await _submit("verify", _verify_and_update, password, hashed_password)
@@ -1,390 +1,904 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime, date as date_type
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, Optional
+from datetime import datetime, timedelta, date as date_type
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import asyncio
 import random
+import time
 
-from db import get_db, Base, engine
-from models import User, Doctor, Patient, Pharmacist, Appointment, Prescription, PrescriptionItem, DispensaryRecord
+from db import DB_ASYNC, DB_MIGRATE_ON_STARTUP, SQLALCHEMY_DATABASE_URL, Database, get_database
+from models import (
+    User, Doctor, Patient, Pharmacist, Appointment, Prescription, PrescriptionItem, DispensaryRecord,
+    DoctorSchedule, BookedSlot, Medicine, RefreshToken
+)
 from schemas import (
-    UserCreate, UserLogin, UserResponse, Token,
-    DoctorCreate, DoctorResponse,
+    UserCreate, UserLogin, UserResponse, SearchResult, Token, RefreshRequest, Page,
+    DoctorCreate, DoctorResponse, PharmacistResponse,
     PatientCreate, PatientResponse,
     AppointmentCreate, AppointmentResponse,
+    ScheduleEntry, DoctorSlots, AvailableSlot,
     PrescriptionCreate, PrescriptionResponse,
-    DispensaryRecordCreate, DispensaryRecordResponse
+    DispensaryRecordCreate, DispensaryRecordResponse,
+    MedicineCreate, MedicineUpdate, MedicineResponse,
+    ChatbotMessage, ChatbotBatch
+)
+from migrations import migrate
+from queries import (
+    doctors_query, pharmacists_query, appointments_query,
+    prescriptions_query, dispensary_records_query, appointment_rows, appointment_from_row
 )
+from pagination import PageParams, paginate
+from response_cache import PRIVATE_CACHE_CONTROL, cached_response, invalidate_tables, response_cache
+from serialization import DefaultResponse, render, render_rows
+from tokens import allocate_token_number
+from scheduling import (
+    MAX_SLOT_WINDOW_DAYS, free_slots, first_available, reserve_slot, release_slot,
+    replace_schedule, invalidate_schedule
+)
+from pharmacy_queue import UNDISPENSED, claim_prescriptions, release_claim, mark_dispensed
+import stats
+import events
+import bulk
+import chatbot
+import medicines
+import search
+import metrics
+import ratelimit
+from shared_state import state as shared_state
+from events import PHARMACY_TOPIC, doctor_topic
+from hashing import hash_password_async, verify_password_async, shutdown_executor
 from auth import (
-    verify_password, get_password_hash, create_access_token,
-    get_current_user, require_role, ACCESS_TOKEN_EXPIRE_MINUTES
+    issue_tokens, authenticate_token, rotate_refresh_token, decode_refresh_token,
+    get_current_user, require_role, ACCESS_TOKEN_EXPIRE_MINUTES,
+    Principal, principal_cache, token_cache, invalidate_principal
 )
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Hospify API", version="1.0.0")
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+router = APIRouter()
 
 # ==================== AUTH ENDPOINTS ====================
 
-@app.post("/auth/signup", response_model=Token)
-def signup(user_data: UserCreate, db: Session = Depends(get_db)):
+@router.post("/auth/signup", response_model=Token)
+async def signup(user_data: UserCreate, database: Database = Depends(get_database)):
+    def email_taken(db: Session):
+        return db.query(User.id).filter(User.email == user_data.email).first() is not None
+    
     # Check if user exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
+    if await database.run(email_taken):
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    hashed_password = await hash_password_async(user_data.password)
+    
+    def create_user(db: Session):
+        user = User(
+            name=user_data.name,
+            email=user_data.email,
+            phone=user_data.phone,
+            password_hash=hashed_password,
+            role=user_data.role
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        
+        # Create role-specific record
+        if user.role == "patient":
+            patient = Patient(user_id=user.id)
+            db.add(patient)
+        elif user.role == "doctor":
+            doctor = Doctor(user_id=user.id, specialization="General", department="General")
+            db.add(doctor)
+        elif user.role == "pharmacist":
+            pharmacist = Pharmacist(user_id=user.id)
+            db.add(pharmacist)
+        
+        stats.record_signup(db, user.role, department="General")
+        
+        # Create tokens
+        tokens = issue_tokens(db, user.id, user.token_version)
+        db.commit()
+        return user, tokens
+    
     # Create user
-    hashed_password = get_password_hash(user_data.password)
-    user = User(
-        name=user_data.name,
-        email=user_data.email,
-        phone=user_data.phone,
-        password_hash=hashed_password,
-        role=user_data.role
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    
-    # Create role-specific record
-    if user.role == "patient":
-        patient = Patient(user_id=user.id)
-        db.add(patient)
-    elif user.role == "doctor":
-        doctor = Doctor(user_id=user.id, specialization="General", department="General")
-        db.add(doctor)
-    elif user.role == "pharmacist":
-        pharmacist = Pharmacist(user_id=user.id)
-        db.add(pharmacist)
-    
-    db.commit()
-    
-    # Create token
-    access_token = create_access_token(data={"sub": user.email})
+    user, tokens = await database.run(create_user)
+    if user.role in ("doctor", "pharmacist"):
+        invalidate_tables(user.role + "s")
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": user
-    }
+    return {**tokens, "user": user}
 
-@app.post("/auth/login", response_model=Token)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == credentials.email).first()
-    if not user or not verify_password(credentials.password, user.password_hash):
+@router.post("/auth/login", response_model=Token)
+async def login(credentials: UserLogin, database: Database = Depends(get_database)):
+    def find_user(db: Session):
+        return db.query(User).filter(User.email == credentials.email).first()
+    
+    user = await database.run(find_user)
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await verify_password_async(credentials.password, user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
-    access_token = create_access_token(data={"sub": user.email})
+    def start_session(db: Session):
+        # Transparently rehash when the configured cost factor changed
+        if new_hash:
+            db.query(User).filter(User.id == user.id).update({"password_hash": new_hash})
+        tokens = issue_tokens(db, user.id, user.token_version)
+        db.commit()
+        return tokens
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": user
-    }
+    return {**await database.run(start_session), "user": user}
+
+@router.post("/auth/refresh", response_model=Token)
+async def refresh_tokens(request: RefreshRequest, database: Database = Depends(get_database)):
+    # Renews the session without a password check; the refresh token is exchanged for a new one
+    return await rotate_refresh_token(request.refresh_token, database)
+
+@router.post("/auth/logout")
+async def logout(request: RefreshRequest, database: Database = Depends(get_database)):
+    # Ends this session: its refresh token stops working (its access token expires on its own)
+    user_id, _, jti = decode_refresh_token(request.refresh_token)
+    
+    def run(db: Session):
+        db.query(RefreshToken).filter(
+            RefreshToken.jti == jti,
+            RefreshToken.user_id == user_id
+        ).delete(synchronize_session=False)
+        db.commit()
+    
+    await database.run(run)
+    return {"message": "Logged out successfully"}
 
-@app.get("/auth/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_user)):
+@router.get("/auth/me", response_model=UserResponse)
+async def get_me(current_user: Principal = Depends(get_current_user)):
     return current_user
 
 # ==================== PATIENT ENDPOINTS ====================
 
-@app.post("/patient/appointments", response_model=AppointmentResponse)
-def book_appointment(
+@router.post("/patient/appointments", response_model=AppointmentResponse)
+async def book_appointment(
     appointment_data: AppointmentCreate,
-    current_user: User = Depends(require_role(["patient"])),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_role(["patient"])),
+    database: Database = Depends(get_database)
 ):
-    # Get patient record
-    patient = db.query(Patient).filter(Patient.user_id == current_user.id).first()
-    if not patient:
+    if not current_user.profile_id:
         raise HTTPException(status_code=404, detail="Patient record not found")
     
-    # Generate token number
-    existing_appointments = db.query(Appointment).filter(
-        Appointment.doctor_id == appointment_data.doctor_id,
-        Appointment.date == appointment_data.date
-    ).count()
-    token_number = existing_appointments + 1
-    
-    # Create appointment
-    appointment = Appointment(
-        patient_id=patient.id,
-        doctor_id=appointment_data.doctor_id,
-        date=appointment_data.date,
-        time=appointment_data.time,
-        token_number=token_number,
-        status="scheduled"
+    def run(db: Session):
+        department = db.query(Doctor.department).filter(Doctor.id == appointment_data.doctor_id).scalar()
+        if department is None:
+            raise HTTPException(status_code=404, detail="Doctor not found")
+        
+        # Fails the booking if the doctor is off or the slot is taken
+        reserve_slot(db, appointment_data.doctor_id, appointment_data.date, appointment_data.time, datetime.now())
+        
+        token_number = allocate_token_number(db, appointment_data.doctor_id, appointment_data.date)
+        
+        # Create appointment
+        appointment = Appointment(
+            patient_id=current_user.profile_id,
+            doctor_id=appointment_data.doctor_id,
+            date=appointment_data.date,
+            time=appointment_data.time,
+            token_number=token_number,
+            status="scheduled"
+        )
+        db.add(appointment)
+        stats.record_appointment_booked(db, appointment_data.date, department)
+        db.commit()
+        
+        return appointments_query(db).filter(Appointment.id == appointment.id).first()
+    
+    appointment = await database.run(run)
+    events.bus.publish(
+        doctor_topic(appointment.doctor_id), "appointment.booked",
+        AppointmentResponse.model_validate(appointment).model_dump(mode="json")
     )
-    db.add(appointment)
-    db.commit()
-    db.refresh(appointment)
-    
     return appointment
 
-@app.get("/patient/appointments", response_model=List[AppointmentResponse])
-def get_patient_appointments(
-    current_user: User = Depends(require_role(["patient"])),
-    db: Session = Depends(get_db)
+@router.get("/patient/appointments", response_model=Page[AppointmentResponse])
+async def get_patient_appointments(
+    date_from: Optional[date_type] = None,
+    date_to: Optional[date_type] = None,
+    status: Optional[str] = None,
+    page: PageParams = Depends(),
+    current_user: Principal = Depends(require_role(["patient"])),
+    database: Database = Depends(get_database)
 ):
-    patient = db.query(Patient).filter(Patient.user_id == current_user.id).first()
-    if not patient:
+    if not current_user.profile_id:
         raise HTTPException(status_code=404, detail="Patient record not found")
     
-    appointments = db.query(Appointment).filter(Appointment.patient_id == patient.id).all()
-    return appointments
+    def run(db: Session):
+        query = appointment_rows(db).filter(Appointment.patient_id == current_user.profile_id)
+        if date_from:
+            query = query.filter(Appointment.date >= date_from)
+        if date_to:
+            query = query.filter(Appointment.date <= date_to)
+        if status:
+            query = query.filter(Appointment.status == status)
+        
+        rows = paginate(query, (Appointment.date, Appointment.id), page)
+        return {"items": [appointment_from_row(row) for row in rows["items"]], "next_cursor": rows["next_cursor"]}
+    
+    return render_rows(Page[AppointmentResponse], await database.run(run))
 
-@app.delete("/patient/appointments/{appointment_id}")
-def cancel_appointment(
+@router.delete("/patient/appointments/{appointment_id}")
+async def cancel_appointment(
     appointment_id: int,
-    current_user: User = Depends(require_role(["patient"])),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_role(["patient"])),
+    database: Database = Depends(get_database)
 ):
-    patient = db.query(Patient).filter(Patient.user_id == current_user.id).first()
-    appointment = db.query(Appointment).filter(
-        Appointment.id == appointment_id,
-        Appointment.patient_id == patient.id
-    ).first()
-    
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-    
-    appointment.status = "cancelled"
-    db.commit()
+    def run(db: Session):
+        appointment = db.query(Appointment).filter(
+            Appointment.id == appointment_id,
+            Appointment.patient_id == current_user.profile_id
+        ).first()
+        
+        if not appointment:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        
+        # Only a booking still to come holds its slot; a repeated cancel must not release someone else's
+        if appointment.status == "scheduled":
+            release_slot(db, appointment.doctor_id, appointment.date, appointment.time)
+        appointment.status = "cancelled"
+        db.commit()
+        return appointment.doctor_id
+    
+    doctor_id = await database.run(run)
+    events.bus.publish(doctor_topic(doctor_id), "appointment.cancelled", {"id": appointment_id})
     
     return {"message": "Appointment cancelled successfully"}
 
 # ==================== DOCTOR ENDPOINTS ====================
 
-@app.get("/doctor/appointments", response_model=List[AppointmentResponse])
-def get_doctor_appointments(
-    current_user: User = Depends(require_role(["doctor"])),
-    db: Session = Depends(get_db)
+@router.get("/doctor/appointments", response_model=Page[AppointmentResponse])
+async def get_doctor_appointments(
+    date_from: Optional[date_type] = None,
+    date_to: Optional[date_type] = None,
+    status: Optional[str] = "scheduled",
+    page: PageParams = Depends(),
+    current_user: Principal = Depends(require_role(["doctor"])),
+    database: Database = Depends(get_database)
 ):
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
+    if not current_user.profile_id:
         raise HTTPException(status_code=404, detail="Doctor record not found")
     
-    today = date_type.today()
-    appointments = db.query(Appointment).filter(
-        Appointment.doctor_id == doctor.id,
-        Appointment.date == today,
-        Appointment.status == "scheduled"
-    ).order_by(Appointment.token_number).all()
+    def run(db: Session):
+        # Defaults to today's queue
+        today = date_type.today()
+        query = appointment_rows(db).filter(
+            Appointment.doctor_id == current_user.profile_id,
+            Appointment.date >= (date_from or today),
+            Appointment.date <= (date_to or date_from or today)
+        )
+        if status:
+            query = query.filter(Appointment.status == status)
+        
+        rows = paginate(query, (Appointment.date, Appointment.token_number, Appointment.id), page)
+        return {"items": [appointment_from_row(row) for row in rows["items"]], "next_cursor": rows["next_cursor"]}
     
-    return appointments
+    return render_rows(Page[AppointmentResponse], await database.run(run))
 
-@app.put("/doctor/appointments/{appointment_id}/complete")
-def complete_appointment(
-    appointment_id: int,
-    current_user: User = Depends(require_role(["doctor"])),
-    db: Session = Depends(get_db)
-):
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    appointment = db.query(Appointment).filter(
+def mark_completed(db: Session, appointment_id: int, doctor_id: int) -> int:
+    """Complete one of `doctor_id`'s appointments in the caller's transaction
+    and return its patient id. Raises 404 for anyone else's appointment."""
+    appointment = db.query(Appointment.patient_id, Doctor.department).join(
+        Doctor, Appointment.doctor_id == Doctor.id
+    ).filter(
         Appointment.id == appointment_id,
-        Appointment.doctor_id == doctor.id
+        Appointment.doctor_id == doctor_id
     ).first()
     
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
-    appointment.status = "completed"
-    db.commit()
+    # Conditional update, so concurrent completions count the appointment once
+    updated = db.query(Appointment).filter(
+        Appointment.id == appointment_id,
+        Appointment.status != "completed"
+    ).update({"status": "completed"}, synchronize_session=False)
+    if updated:
+        stats.record_appointment_completed(db, appointment.department)
+    return appointment.patient_id
+
+@router.put("/doctor/appointments/{appointment_id}/complete")
+async def complete_appointment(
+    appointment_id: int,
+    current_user: Principal = Depends(require_role(["doctor"])),
+    database: Database = Depends(get_database)
+):
+    def run(db: Session):
+        mark_completed(db, appointment_id, current_user.profile_id)
+        db.commit()
+    
+    await database.run(run)
+    events.bus.publish(doctor_topic(current_user.profile_id), "appointment.completed", {"id": appointment_id})
     
     return {"message": "Appointment marked as completed"}
 
-@app.post("/doctor/prescriptions", response_model=PrescriptionResponse)
-def create_prescription(
-    prescription_data: PrescriptionCreate,
-    current_user: User = Depends(require_role(["doctor"])),
-    db: Session = Depends(get_db)
+@router.get("/doctor/schedule", response_model=List[ScheduleEntry])
+async def get_doctor_schedule(
+    current_user: Principal = Depends(require_role(["doctor"])),
+    database: Database = Depends(get_database)
 ):
-    doctor = db.query(Doctor).filter(Doctor.user_id == current_user.id).first()
-    if not doctor:
+    def run(db: Session):
+        return db.query(DoctorSchedule).filter(DoctorSchedule.doctor_id == current_user.profile_id).order_by(
+            DoctorSchedule.weekday, DoctorSchedule.start_time
+        ).all()
+    
+    return await database.run(run)
+
+@router.put("/doctor/schedule", response_model=List[ScheduleEntry])
+async def update_doctor_schedule(
+    entries: List[ScheduleEntry],
+    current_user: Principal = Depends(require_role(["doctor"])),
+    database: Database = Depends(get_database)
+):
+    if not current_user.profile_id:
         raise HTTPException(status_code=404, detail="Doctor record not found")
     
-    # Get appointment
-    appointment = db.query(Appointment).filter(Appointment.id == prescription_data.appointment_id).first()
-    if not appointment:
-        raise HTTPException(status_code=404, detail="Appointment not found")
+    await database.run(replace_schedule, current_user.profile_id, entries)
+    return sorted(entries, key=lambda entry: (entry.weekday, entry.start_time))
+
+@router.post("/doctor/prescriptions", response_model=PrescriptionResponse)
+async def create_prescription(
+    prescription_data: PrescriptionCreate,
+    current_user: Principal = Depends(require_role(["doctor"])),
+    database: Database = Depends(get_database)
+):
+    if not current_user.profile_id:
+        raise HTTPException(status_code=404, detail="Doctor record not found")
     
-    # Create prescription
-    prescription = Prescription(
-        appointment_id=appointment.id,
-        doctor_id=doctor.id,
-        patient_id=appointment.patient_id,
-        notes=prescription_data.notes
-    )
-    db.add(prescription)
-    db.commit()
-    db.refresh(prescription)
-    
-    # Add prescription items
-    for item_data in prescription_data.items:
-        item = PrescriptionItem(
-            prescription_id=prescription.id,
-            medicine_name=item_data.medicine_name,
-            dosage=item_data.dosage,
-            frequency=item_data.frequency,
-            duration=item_data.duration
+    def run(db: Session):
+        unknown = medicines.check_medicines(db, (item.medicine_id for item in prescription_data.items))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown medicine: {', '.join(map(str, sorted(unknown)))}")
+        
+        # Checks the appointment is this doctor's and completes it
+        patient_id = mark_completed(db, prescription_data.appointment_id, current_user.profile_id)
+        
+        prescription = Prescription(
+            appointment_id=prescription_data.appointment_id,
+            doctor_id=current_user.profile_id,
+            patient_id=patient_id,
+            notes=prescription_data.notes
         )
-        db.add(item)
-    
-    db.commit()
-    db.refresh(prescription)
-    
-    # Mark appointment as completed
-    appointment.status = "completed"
-    db.commit()
-    
+        db.add(prescription)
+        try:
+            db.flush()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Prescription already exists for this appointment")
+        
+        # All items in one multi-row INSERT ... RETURNING (the ORM's flush would
+        # insert them one by one to keep their order)
+        items = []
+        if prescription_data.items:
+            items = db.scalars(insert(PrescriptionItem).returning(PrescriptionItem), [
+                {"prescription_id": prescription.id, **item_data.model_dump()}
+                for item_data in prescription_data.items
+            ]).all()
+        set_committed_value(prescription, "items", sorted(items, key=lambda item: item.id))
+        
+        stats.record_prescription_created(db)
+        db.commit()
+        return prescription
+    
+    prescription = await database.run(run)
+    events.bus.publish(doctor_topic(current_user.profile_id), "appointment.completed", {"id": prescription.appointment_id})
+    events.bus.publish(
+        PHARMACY_TOPIC, "prescription.created",
+        PrescriptionResponse.model_validate(prescription).model_dump(mode="json")
+    )
     return prescription
 
 # ==================== PHARMACY ENDPOINTS ====================
 
-@app.get("/pharmacy/prescriptions", response_model=List[PrescriptionResponse])
-def get_pending_prescriptions(
-    current_user: User = Depends(require_role(["pharmacist"])),
-    db: Session = Depends(get_db)
+@router.get("/pharmacy/prescriptions", response_model=Page[PrescriptionResponse])
+async def get_pending_prescriptions(
+    doctor_id: Optional[int] = None,
+    patient_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    current_user: Principal = Depends(require_role(["pharmacist"])),
+    database: Database = Depends(get_database)
 ):
-    # Get prescriptions without dispensary records
-    prescriptions = db.query(Prescription).filter(
-        ~Prescription.id.in_(db.query(DispensaryRecord.prescription_id))
-    ).all()
-    
-    return prescriptions
+    def run(db: Session):
+        # Oldest first; includes prescriptions currently claimed by a pharmacist
+        query = prescriptions_query(db).filter(Prescription.dispense_status.in_(UNDISPENSED))
+        if doctor_id:
+            query = query.filter(Prescription.doctor_id == doctor_id)
+        if patient_id:
+            query = query.filter(Prescription.patient_id == patient_id)
+        
+        return paginate(query, (Prescription.id,), page)
+    
+    return render(Page[PrescriptionResponse], await database.run(run))
 
-@app.post("/pharmacy/dispense", response_model=DispensaryRecordResponse)
-def dispense_prescription(
+@router.post("/pharmacy/dispense", response_model=DispensaryRecordResponse)
+async def dispense_prescription(
     record_data: DispensaryRecordCreate,
-    current_user: User = Depends(require_role(["pharmacist"])),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(require_role(["pharmacist"])),
+    database: Database = Depends(get_database)
 ):
-    pharmacist = db.query(Pharmacist).filter(Pharmacist.user_id == current_user.id).first()
-    if not pharmacist:
+    if not current_user.profile_id:
         raise HTTPException(status_code=404, detail="Pharmacist record not found")
     
-    # Check if prescription exists
-    prescription = db.query(Prescription).filter(Prescription.id == record_data.prescription_id).first()
-    if not prescription:
-        raise HTTPException(status_code=404, detail="Prescription not found")
+    def run(db: Session):
+        # Atomically take the prescription; fails if dispensed or claimed by someone else
+        mark_dispensed(db, record_data.prescription_id, current_user.profile_id)
+        # Prices the catalog medicines and takes them out of stock, or rolls it all back
+        catalog_amount = medicines.dispense_stock(db, record_data.prescription_id)
+        
+        # Create dispensary record
+        record = DispensaryRecord(
+            prescription_id=record_data.prescription_id,
+            pharmacist_id=current_user.profile_id,
+            total_amount=round(catalog_amount + record_data.uncatalogued_amount, 2),
+            payment_status=record_data.payment_status
+        )
+        db.add(record)
+        stats.record_prescription_dispensed(db)
+        db.commit()
+        
+        return dispensary_records_query(db).filter(DispensaryRecord.id == record.id).first()
+    
+    record = await database.run(run)
+    events.bus.publish(PHARMACY_TOPIC, "prescription.dispensed", {"id": record.prescription_id})
+    return record
+
+@router.post("/pharmacy/prescriptions/claim", response_model=List[PrescriptionResponse])
+async def claim_pending_prescriptions(
+    limit: int = Query(1, ge=1, le=50),
+    current_user: Principal = Depends(require_role(["pharmacist"])),
+    database: Database = Depends(get_database)
+):
+    if not current_user.profile_id:
+        raise HTTPException(status_code=404, detail="Pharmacist record not found")
     
-    # Check if already dispensed
-    existing_record = db.query(DispensaryRecord).filter(
-        DispensaryRecord.prescription_id == record_data.prescription_id
-    ).first()
-    if existing_record:
-        raise HTTPException(status_code=400, detail="Prescription already dispensed")
-    
-    # Create dispensary record
-    record = DispensaryRecord(
-        prescription_id=record_data.prescription_id,
-        pharmacist_id=pharmacist.id,
-        total_amount=record_data.total_amount,
-        payment_status=record_data.payment_status
-    )
-    db.add(record)
-    db.commit()
-    db.refresh(record)
+    def run(db: Session):
+        claimed_ids = claim_prescriptions(db, current_user.profile_id, limit)
+        if not claimed_ids:
+            return []
+        return prescriptions_query(db).filter(Prescription.id.in_(claimed_ids)).order_by(Prescription.id).all()
+    
+    claimed = await database.run(run)
+    if claimed:
+        events.bus.publish(PHARMACY_TOPIC, "prescription.claimed", {
+            "ids": [prescription.id for prescription in claimed],
+            "claimed_by": current_user.profile_id
+        })
+    return claimed
+
+@router.post("/pharmacy/prescriptions/{prescription_id}/release")
+async def release_prescription(
+    prescription_id: int,
+    current_user: Principal = Depends(require_role(["pharmacist"])),
+    database: Database = Depends(get_database)
+):
+    released = await database.run(release_claim, prescription_id, current_user.profile_id)
+    if not released:
+        raise HTTPException(status_code=404, detail="No claim held on this prescription")
+    events.bus.publish(PHARMACY_TOPIC, "prescription.released", {"id": prescription_id})
     
-    return record
+    return {"message": "Prescription released"}
+
+# ==================== SEARCH ENDPOINTS ====================
+
+@router.get("/search", response_model=Page[SearchResult])
+async def search_users(
+    q: str,
+    role: Optional[str] = None,
+    page: PageParams = Depends(),
+    current_user: Principal = Depends(require_role(list(search.SEARCHABLE_ROLES))),
+    database: Database = Depends(get_database)
+):
+    # Best matches first; results are limited to the roles the caller may look up
+    roles = search.SEARCHABLE_ROLES[current_user.role]
+    if role:
+        if role not in roles:
+            raise HTTPException(status_code=403, detail="Not authorized to search this role")
+        roles = (role,)
+    
+    return render_rows(Page[SearchResult], await database.run(search.search_users, q, roles, page))
+
+# ==================== MEDICINE CATALOG ENDPOINTS ====================
+
+@router.get("/medicines/search", response_model=List[MedicineResponse])
+async def search_medicines(
+    q: str = "",
+    limit: int = Query(10, ge=1, le=50),
+    current_user: Principal = Depends(require_role(["doctor", "pharmacist", "admin"])),
+    database: Database = Depends(get_database)
+):
+    # Typeahead for the prescription form: names, then other words, starting with `q`
+    return await medicines.search(q, limit, database)
+
+@router.post("/admin/medicines", response_model=MedicineResponse)
+async def create_medicine(
+    medicine_data: MedicineCreate,
+    current_user: Principal = Depends(require_role(["admin"])),
+    database: Database = Depends(get_database)
+):
+    def run(db: Session):
+        medicine = Medicine(**medicine_data.model_dump())
+        db.add(medicine)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="SKU already exists")
+        return medicine
+    
+    medicine = await database.run(run)
+    invalidate_tables("medicines")
+    return medicine
+
+@router.patch("/admin/medicines/{medicine_id}", response_model=MedicineResponse)
+async def update_medicine(
+    medicine_id: int,
+    medicine_data: MedicineUpdate,
+    current_user: Principal = Depends(require_role(["admin"])),
+    database: Database = Depends(get_database)
+):
+    def run(db: Session):
+        values = medicine_data.model_dump(exclude={"restock"}, exclude_none=True)
+        # Relative, so it can't undo a concurrent dispense
+        if medicine_data.restock:
+            values["stock"] = Medicine.stock + medicine_data.restock
+        if values:
+            try:
+                updated = db.query(Medicine).filter(Medicine.id == medicine_id).update(
+                    values, synchronize_session=False
+                )
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                raise HTTPException(status_code=400, detail="Stock can't go below zero")
+            if not updated:
+                raise HTTPException(status_code=404, detail="Medicine not found")
+        
+        medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
+        if not medicine:
+            raise HTTPException(status_code=404, detail="Medicine not found")
+        return medicine
+    
+    medicine = await database.run(run)
+    if medicine_data.name is not None:
+        invalidate_tables("medicines")
+    return medicine
+
+# ==================== LIVE EVENT ENDPOINTS ====================
+
+async def event_topics(token: str, database: Database) -> list:
+    # Browsers can't set headers on EventSource/WebSocket, so the token comes in the query string
+    principal = await authenticate_token(token, database)
+    topics = events.topics_for(principal.role, principal.profile_id)
+    if not topics:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this resource"
+        )
+    return topics
+
+@router.get("/events/stream")
+async def stream_events(token: str, database: Database = Depends(get_database)):
+    return StreamingResponse(
+        events.sse_stream(await event_topics(token, database)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/events/ws")
+async def events_websocket(websocket: WebSocket, token: str, database: Database = Depends(get_database)):
+    try:
+        topics = await event_topics(token, database)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    
+    async def forward():
+        try:
+            # Subscribed here, where messages() unsubscribes however the task ends
+            async for message in events.messages(events.bus.subscribe(topics)):
+                # The WebSocket protocol pings on its own; skip keepalives
+                if message is not None:
+                    await websocket.send_text(message)
+            await websocket.close()
+        except WebSocketDisconnect:
+            pass
+    
+    async def wait_for_disconnect():
+        # Clients only listen, so anything they send is ignored
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    
+    tasks = {asyncio.create_task(forward()), asyncio.create_task(wait_for_disconnect())}
+    _, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
 
 # ==================== ADMIN ENDPOINTS ====================
 
-@app.get("/admin/stats")
-def get_hospital_stats(
-    current_user: User = Depends(require_role(["admin"])),
-    db: Session = Depends(get_db)
+@router.get("/admin/stats")
+async def get_hospital_stats(
+    current_user: Principal = Depends(require_role(["admin"])),
+    database: Database = Depends(get_database)
+):
+    return await database.run(stats.read_summary, date_type.today())
+
+@router.get("/admin/stats/breakdown")
+async def get_hospital_stats_breakdown(
+    date_from: Optional[date_type] = None,
+    date_to: Optional[date_type] = None,
+    current_user: Principal = Depends(require_role(["admin"])),
+    database: Database = Depends(get_database)
 ):
-    total_doctors = db.query(Doctor).count()
-    total_patients = db.query(Patient).count()
-    total_pharmacists = db.query(Pharmacist).count()
+    # Defaults to the last seven days
+    date_to = date_to or date_type.today()
+    date_from = date_from or date_to - timedelta(days=6)
+    if date_from > date_to or (date_to - date_from).days > 366:
+        raise HTTPException(status_code=400, detail="Date range must be between 1 and 367 days")
     
-    today = date_type.today()
-    today_appointments = db.query(Appointment).filter(Appointment.date == today).count()
-    completed_appointments = db.query(Appointment).filter(Appointment.status == "completed").count()
+    return await database.run(stats.read_breakdown, date_from, date_to)
+
+def filter_doctors(query, specialization: Optional[str], department: Optional[str]):
+    if specialization:
+        query = query.filter(Doctor.specialization == specialization)
+    if department:
+        query = query.filter(Doctor.department == department)
+    return query
+
+@router.get("/admin/doctors", response_model=Page[DoctorResponse])
+async def get_all_doctors(
+    request: Request,
+    specialization: Optional[str] = None,
+    department: Optional[str] = None,
+    page: PageParams = Depends(),
+    current_user: Principal = Depends(require_role(["admin"])),
+    database: Database = Depends(get_database)
+):
+    def run(db: Session):
+        query = filter_doctors(doctors_query(db), specialization, department)
+        return paginate(query, (Doctor.id,), page)
     
-    pending_prescriptions = db.query(Prescription).filter(
-        ~Prescription.id.in_(db.query(DispensaryRecord.prescription_id))
-    ).count()
+    return await cached_response(
+        request, ("doctors",), Page[DoctorResponse], lambda: database.run(run), PRIVATE_CACHE_CONTROL
+    )
+
+@router.delete("/admin/doctors/{doctor_id}")
+async def delete_doctor(
+    doctor_id: int,
+    current_user: Principal = Depends(require_role(["admin"])),
+    database: Database = Depends(get_database)
+):
+    def run(db: Session):
+        doctor = db.query(Doctor).filter(Doctor.id == doctor_id).first()
+        if not doctor:
+            raise HTTPException(status_code=404, detail="Doctor not found")
+        
+        user = db.query(User).filter(User.id == doctor.user_id).first()
+        
+        db.query(DoctorSchedule).filter(DoctorSchedule.doctor_id == doctor_id).delete(synchronize_session=False)
+        db.query(BookedSlot).filter(BookedSlot.doctor_id == doctor_id).delete(synchronize_session=False)
+        db.query(RefreshToken).filter(RefreshToken.user_id == doctor.user_id).delete(synchronize_session=False)
+        db.delete(doctor)
+        if user:
+            db.delete(user)
+        stats.record_doctor_deleted(db, doctor.department)
+        db.commit()
+        invalidate_principal(doctor.user_id)
+    
+    await database.run(run)
+    invalidate_tables("doctors")
+    invalidate_schedule(doctor_id)
     
+    return {"message": "Doctor deleted successfully"}
+
+@router.post("/admin/import/{kind}")
+async def bulk_import(
+    kind: str,
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: Principal = Depends(require_role(["admin"])),
+    database: Database = Depends(get_database)
+):
+    if kind not in bulk.IMPORTS:
+        raise HTTPException(status_code=404, detail="Unknown import type")
+    
+    # The body is read and written batch by batch; it is never held whole in memory
+    return await bulk.import_stream(database, kind, format, request.stream())
+
+@router.get("/admin/export/{kind}")
+async def bulk_export(
+    kind: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: Principal = Depends(require_role(["admin"])),
+    database: Database = Depends(get_database)
+):
+    if kind not in bulk.EXPORTS:
+        raise HTTPException(status_code=404, detail="Unknown export type")
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        bulk.export_stream(database, kind, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{format}"'}
+    )
+
+@router.get("/admin/cache/stats")
+async def get_cache_stats(current_user: Principal = Depends(require_role(["admin"]))):
     return {
-        "total_doctors": total_doctors,
-        "total_patients": total_patients,
-        "total_pharmacists": total_pharmacists,
-        "today_appointments": today_appointments,
-        "completed_appointments": completed_appointments,
-        "pending_prescriptions": pending_prescriptions
+        "principals": principal_cache.stats(),
+        "tokens": token_cache.stats(),
+        "responses": response_cache.stats(),
+        "chatbot": chatbot.engine.reply_cache.stats()
     }
 
-@app.get("/admin/doctors", response_model=List[DoctorResponse])
-def get_all_doctors(
-    current_user: User = Depends(require_role(["admin"])),
-    db: Session = Depends(get_db)
-):
-    doctors = db.query(Doctor).all()
-    return doctors
+@router.get("/admin/events/stats")
+async def get_event_stats(current_user: Principal = Depends(require_role(["admin"]))):
+    return events.bus.stats()
 
-@app.delete("/admin/doctors/{doctor_id}")
-def delete_doctor(
-    doctor_id: int,
-    current_user: User = Depends(require_role(["admin"])),
-    db: Session = Depends(get_db)
+@router.get("/admin/pharmacists", response_model=Page[PharmacistResponse])
+async def get_all_pharmacists(
+    request: Request,
+    page: PageParams = Depends(),
+    current_user: Principal = Depends(require_role(["admin"])),
+    database: Database = Depends(get_database)
 ):
-    doctor = db.query(Doctor).filter(Doctor.id == doctor_id).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor not found")
+    def run(db: Session):
+        return paginate(pharmacists_query(db), (Pharmacist.id,), page)
     
-    user = db.query(User).filter(User.id == doctor.user_id).first()
+    return await cached_response(
+        request, ("pharmacists",), Page[PharmacistResponse], lambda: database.run(run), PRIVATE_CACHE_CONTROL
+    )
+
+# ==================== PUBLIC ENDPOINTS ====================
+
+@router.get("/doctors", response_model=Page[DoctorResponse])
+async def get_doctors(
+    request: Request,
+    specialization: Optional[str] = None,
+    department: Optional[str] = None,
+    page: PageParams = Depends(),
+    database: Database = Depends(get_database)
+):
+    def run(db: Session):
+        query = filter_doctors(doctors_query(db), specialization, department)
+        return paginate(query, (Doctor.id,), page)
     
-    db.delete(doctor)
-    if user:
-        db.delete(user)
-    db.commit()
+    # Served from memory until a doctor signs up or is deleted
+    return await cached_response(request, ("doctors",), Page[DoctorResponse], lambda: database.run(run))
+
+@router.get("/doctors/first-available", response_model=List[AvailableSlot])
+async def get_first_available_slots(
+    specialization: Optional[str] = None,
+    department: Optional[str] = None,
+    date_from: Optional[date_type] = Query(None, alias="from"),
+    limit: int = Query(5, ge=1, le=50),
+    database: Database = Depends(get_database)
+):
+    def run(db: Session):
+        doctor_ids = [doctor_id for (doctor_id,) in filter_doctors(db.query(Doctor.id), specialization, department)]
+        openings = first_available(db, doctor_ids, date_from or date_type.today(), datetime.now(), limit)
+        doctors = {doctor.id: doctor for doctor in doctors_query(db).filter(Doctor.id.in_([o[2] for o in openings]))}
+        return [{"date": day, "time": at, "doctor": doctors[doctor_id]} for day, at, doctor_id in openings]
     
-    return {"message": "Doctor deleted successfully"}
+    return await database.run(run)
 
-@app.get("/admin/pharmacists")
-def get_all_pharmacists(
-    current_user: User = Depends(require_role(["admin"])),
-    db: Session = Depends(get_db)
+@router.get("/doctors/{doctor_id}/slots", response_model=DoctorSlots)
+async def get_doctor_slots(
+    doctor_id: int,
+    date_from: Optional[date_type] = Query(None, alias="from"),
+    date_to: Optional[date_type] = Query(None, alias="to"),
+    database: Database = Depends(get_database)
 ):
-    pharmacists = db.query(Pharmacist).all()
-    return [{"id": p.id, "user": p.user} for p in pharmacists]
+    # Defaults to the next two weeks
+    date_from = date_from or date_type.today()
+    date_to = date_to or date_from + timedelta(days=13)
+    if date_from > date_to or (date_to - date_from).days >= MAX_SLOT_WINDOW_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must be between 1 and {MAX_SLOT_WINDOW_DAYS} days")
+    
+    def run(db: Session):
+        if db.query(Doctor.id).filter(Doctor.id == doctor_id).first() is None:
+            raise HTTPException(status_code=404, detail="Doctor not found")
+        return free_slots(db, doctor_id, date_from, date_to, datetime.now())
+    
+    return await database.run(run)
 
-# ==================== PUBLIC ENDPOINTS ====================
+@router.post("/chatbot/message")
+async def chatbot_message(request: ChatbotMessage, database: Database = Depends(get_database)):
+    # Matches the message against the specializations of the current doctors
+    replies = await chatbot.replies([request.message], database)
+    return {"reply": replies[0]}
+
+@router.post("/chatbot/messages")
+async def chatbot_messages(request: ChatbotBatch, database: Database = Depends(get_database)):
+    return {"replies": await chatbot.replies(request.messages, database)}
 
-@app.get("/doctors", response_model=List[DoctorResponse])
-def get_doctors(db: Session = Depends(get_db)):
-    doctors = db.query(Doctor).all()
-    return doctors
-
-@app.post("/chatbot/message")
-def chatbot_message(request: dict):
-    user_msg = request.get("message", "").lower()
-    
-    # Simple keyword-based responses
-    if "cardio" in user_msg or "heart" in user_msg:
-        return {"reply": "I can help you book an appointment with our Cardiologist, Dr. Sharma. Would you like to schedule a consultation?"}
-    elif "derma" in user_msg or "skin" in user_msg:
-        return {"reply": "Our Dermatologist, Dr. Patel, is available for skin consultations. Shall I help you book an appointment?"}
-    elif "ortho" in user_msg or "bone" in user_msg or "joint" in user_msg:
-        return {"reply": "Dr. Kumar, our Orthopedic specialist, can help with bone and joint issues. Would you like to book an appointment?"}
-    else:
-        return {"reply": f"I understood: '{request.get('message')}'. Please select a doctor and available slot from the booking form to schedule your appointment."}
-
-@app.get("/")
-def root():
+@router.get("/")
+async def root():
     return {"message": "Hospify API - Hospital Management System"}
+
+# ==================== MONITORING ENDPOINTS ====================
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# ==================== APP ====================
+
+@dataclass(frozen=True)
+class Settings:
+    """What create_app varies; the defaults come from the environment."""
+    database_url: str = SQLALCHEMY_DATABASE_URL
+    db_async: bool = DB_ASYNC
+    # Apply pending migrations on startup; serve.py sets DB_MIGRATE_ON_STARTUP=false for its workers
+    migrate: bool = DB_MIGRATE_ON_STARTUP
+    rate_limit: bool = ratelimit.RATE_LIMIT_ENABLED
+
+async def reconcile_stats_periodically(database: Database):
+    # Runs once at startup too, which backfills freshly migrated databases.
+    # With several workers, whichever takes the interval's lease first does it.
+    interval = stats.STATS_RECONCILE_INTERVAL_SECONDS
+    while True:
+        lease = f"stats-reconcile:{int(time.time() // interval)}"
+        if shared_state.incr(lease, ttl=interval * 2) == 1:
+            await database.run(stats.reconcile)
+        await asyncio.sleep(interval)
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """Build the API. Building it doesn't touch the database: startup creates
+    the app's own engine for `settings.database_url`, applies pending
+    migrations and starts background work, and shutdown closes the pools again."""
+    settings = settings or Settings()
+    
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        engine = app.state.database.engine
+        if settings.migrate:
+            migrate(engine)
+        shared_state.start(asyncio.get_running_loop())
+        stats_reconciler = asyncio.create_task(reconcile_stats_periodically(app.state.database))
+        try:
+            yield
+        finally:
+            stats_reconciler.cancel()
+            shared_state.stop()
+            shutdown_executor()
+            await app.state.database.dispose()
+    
+    app = FastAPI(title="Hospify API", version="1.0.0", default_response_class=DefaultResponse, lifespan=lifespan)
+    app.state.database = Database(settings.database_url, use_async=settings.db_async)
+    
+    # Per-client token buckets and per-route concurrency caps; inside CORS, so browsers can read a 429
+    if settings.rate_limit:
+        app.add_middleware(ratelimit.RateLimitMiddleware, routes=router.routes)
+    
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Server-Timing"],
+    )
+    
+    # Per-request timings, SQL and pool metrics; event streams stay open, so they're only counted
+    app.add_middleware(metrics.MetricsMiddleware, untimed_routes=("/events/stream",))
+    
+    app.include_router(router)
+    return app
+
+# For `uvicorn main:app`; tests and tools can build their own with create_app
+app = create_app()
@@ -0,0 +1,134 @@
+"""Medicine catalog: typeahead search, pricing and stock.
+
+Typeahead answers from an in-memory prefix index: the catalog's normalized
+names in one sorted list, and the rest of each name from every later word
+start in another, so a binary search finds the range of names (or words)
+beginning with what the doctor has typed. "amox" finds "Amoxicillin 250mg",
+"250" finds it too, after the names that start with it. The index only
+holds names; price and stock are read from the database for the handful of
+ids returned, so dispensing, which changes stock constantly, never rebuilds
+it. Catalog edits bump the medicines table version (response_cache), and the
+index is rebuilt on the next search in every worker.
+
+Dispensing prices the prescription's catalog items server-side and takes
+them out of stock with a single UPDATE; see `dispense_stock`.
+"""
+import asyncio
+import re
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from db import Database
+from models import Medicine, PrescriptionItem
+from response_cache import table_versions
+
+WORD = re.compile(r"[a-z0-9]+")
+SPACE = re.compile(" ")
+
+def normalize(text: str) -> str:
+    return " ".join(WORD.findall(text.lower()))
+
+class PrefixIndex:
+    """Sorted (key, id) lists over `rows` of (id, name)."""
+
+    def __init__(self, rows: Iterable[Tuple[int, str]]):
+        names, words = [], []
+        for medicine_id, name in rows:
+            key = normalize(name)
+            names.append((key, medicine_id))
+            # Every later word start; the first one is the whole name
+            words.extend((key[match.end():], medicine_id) for match in SPACE.finditer(key))
+        names.sort()
+        words.sort()
+        self.names = [key for key, _ in names]
+        self.name_ids = [medicine_id for _, medicine_id in names]
+        self.words = [key for key, _ in words]
+        self.word_ids = [medicine_id for _, medicine_id in words]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def search(self, query: str, limit: int) -> List[int]:
+        """Ids of up to `limit` medicines with a name, then a later word, starting with `query`."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        found = []
+        for keys, ids in ((self.names, self.name_ids), (self.words, self.word_ids)):
+            at = bisect_left(keys, prefix)
+            while at < len(keys) and len(found) < limit and keys[at].startswith(prefix):
+                if ids[at] not in found:
+                    found.append(ids[at])
+                at += 1
+        return found
+
+index = PrefixIndex([])
+index_version = None
+_rebuilding = asyncio.Lock()
+
+def load_names(db: Session) -> list:
+    return db.execute(select(Medicine.id, Medicine.name)).all()
+
+def load_medicines(db: Session, ids: List[int]) -> List[Medicine]:
+    by_id = {medicine.id: medicine for medicine in db.query(Medicine).filter(Medicine.id.in_(ids))}
+    return [by_id[medicine_id] for medicine_id in ids if medicine_id in by_id]
+
+async def current_index(database: Database) -> PrefixIndex:
+    global index, index_version
+    async with _rebuilding:
+        # The version is read before loading, so a concurrent edit triggers another rebuild
+        version = (database.url, table_versions["medicines"])
+        if index_version != version:
+            rows = await database.run(load_names)
+            index = await run_in_threadpool(PrefixIndex, rows)
+            index_version = version
+    return index
+
+async def search(query: str, limit: int, database: Database) -> List[Medicine]:
+    ids = (await current_index(database)).search(query, limit)
+    return await database.run(load_medicines, ids) if ids else []
+
+def check_medicines(db: Session, medicine_ids: Iterable[Optional[int]]) -> set:
+    """The ids among `medicine_ids` that aren't in the catalog."""
+    wanted = {medicine_id for medicine_id in medicine_ids if medicine_id is not None}
+    if not wanted:
+        return set()
+    return wanted - set(db.scalars(select(Medicine.id).where(Medicine.id.in_(wanted))))
+
+def dispense_stock(db: Session, prescription_id: int) -> float:
+    """Take a prescription's catalog medicines out of stock and return their price.
+
+    Quantities are summed per medicine and subtracted in one UPDATE ... FROM
+    that only touches rows with enough stock left, so concurrent dispenses
+    can't oversell. If any medicine falls short, raises 409 naming it, and
+    the caller's transaction (which must not commit) discards the rest.
+    """
+    needed = (
+        select(PrescriptionItem.medicine_id, func.sum(PrescriptionItem.quantity).label("quantity"))
+        .where(PrescriptionItem.prescription_id == prescription_id, PrescriptionItem.medicine_id.isnot(None))
+        .group_by(PrescriptionItem.medicine_id)
+    )
+    quantities = dict(db.execute(needed).all())
+    if not quantities:
+        return 0.0
+
+    needed = needed.subquery()
+    prices = dict(db.execute(
+        update(Medicine)
+        .where(Medicine.id == needed.c.medicine_id, Medicine.stock >= needed.c.quantity)
+        .values(stock=Medicine.stock - needed.c.quantity)
+        .returning(Medicine.id, Medicine.unit_price)
+        .execution_options(synchronize_session=False)
+    ).all())
+    if len(prices) < len(quantities):
+        short = db.scalars(
+            select(Medicine.name).where(Medicine.id.in_(set(quantities) - set(prices))).order_by(Medicine.name)
+        ).all()
+        raise HTTPException(
+            status_code=409,
+            detail=f"Not enough stock: {', '.join(short) or 'medicine no longer in the catalog'}"
+        )
+    return round(sum(prices[medicine_id] * quantity for medicine_id, quantity in quantities.items()), 2)
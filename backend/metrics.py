@@ -0,0 +1,267 @@
+"""Request, database and password-hashing metrics.
+
+MetricsMiddleware times every HTTP request and tallies what the request spent
+on SQL (statements and time, reported by the engine hooks in db.py), waiting
+for a pooled connection and hashing passwords. The totals feed histograms and
+counters served at /metrics in the Prometheus text format, and every response
+carries its own breakdown in a Server-Timing header, which browser dev tools
+display next to the request.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+# Statements slower than this are logged with the route that ran them
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PASSWORD_HASH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+slow_query_log = logging.getLogger("hospify.slow_queries")
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """A named family of samples keyed by label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in sorted(values):
+            lines.extend(self._samples(label_values, value))
+        return lines
+
+    def _samples(self, label_values: tuple, value) -> list:
+        return [f"{self.name}{_format_labels(self.labels, label_values)} {value}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+class Gauge(Metric):
+    """Read at scrape time from `collect`, which returns {label values: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), collect: Optional[Callable] = None):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def render(self) -> list:
+        if self.collect is not None:
+            with self._lock:
+                self._values = dict(self.collect())
+        return super().render()
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def _samples(self, label_values: tuple, series: list) -> list:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), series):
+            cumulative += count
+            labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels, label_values)
+        lines.append(f"{self.name}_sum{labels} {series[-1]}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+REGISTRY = []
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ==================== METRICS ====================
+
+http_requests = Counter(
+    "hospify_http_requests_total", "HTTP requests served.", ("method", "route", "status")
+)
+http_request_seconds = Histogram(
+    "hospify_http_request_duration_seconds", "Time from receiving a request to sending the last byte.",
+    ("method", "route")
+)
+http_request_queries = Histogram(
+    "hospify_http_request_queries", "SQL statements executed per request.", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS
+)
+http_request_db_seconds = Histogram(
+    "hospify_http_request_db_seconds", "Time a request spent executing SQL.", ("method", "route")
+)
+db_query_seconds = Histogram(
+    "hospify_db_query_duration_seconds", "Time to execute one SQL statement, including background work."
+)
+db_slow_queries = Counter(
+    "hospify_db_slow_queries_total", "SQL statements slower than SLOW_QUERY_THRESHOLD_MS."
+)
+db_pool_wait_seconds = Histogram(
+    "hospify_db_pool_wait_seconds", "Time spent waiting for (or opening) a pooled connection.", ("pool",)
+)
+db_pool_connections = Gauge(
+    "hospify_db_pool_connections", "Pooled connections by state.", ("pool", "state")
+)
+password_hash_seconds = Histogram(
+    "hospify_password_hash_seconds", "bcrypt time per password, excluding time queued for a worker.",
+    ("operation",), buckets=PASSWORD_HASH_BUCKETS
+)
+
+# ==================== PER-REQUEST TIMINGS ====================
+
+class RequestTimings:
+    """What the current request has spent so far; shared with worker threads via the context."""
+    __slots__ = ("scope", "queries", "db_seconds", "pool_wait_seconds", "password_hash_seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.password_hash_seconds = 0.0
+
+    def route(self) -> str:
+        # The router stores the matched route in the scope; unmatched paths stay out of the labels
+        route = self.scope.get("route")
+        return route.path if route is not None else "unmatched"
+
+    def server_timing(self, total_seconds: float) -> str:
+        entries = [f"app;dur={total_seconds * 1000:.2f}",
+                   f'db;desc="{self.queries} queries";dur={self.db_seconds * 1000:.2f}']
+        if self.pool_wait_seconds:
+            entries.append(f"pool;dur={self.pool_wait_seconds * 1000:.2f}")
+        if self.password_hash_seconds:
+            entries.append(f"bcrypt;dur={self.password_hash_seconds * 1000:.2f}")
+        return ", ".join(entries)
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+def record_query(statement: str, seconds: float):
+    db_query_seconds.observe(seconds)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.queries += 1
+        timings.db_seconds += seconds
+    if seconds * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+        db_slow_queries.inc()
+        slow_query_log.warning(
+            "slow query (%.1fms) in %s: %s", seconds * 1000,
+            timings.route() if timings is not None else "background", " ".join(statement.split())
+        )
+
+def record_pool_wait(pool_name: str, seconds: float):
+    db_pool_wait_seconds.observe(seconds, pool_name)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.pool_wait_seconds += seconds
+
+def record_password_hash(operation: str, seconds: float):
+    password_hash_seconds.observe(seconds, operation)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.password_hash_seconds += seconds
+
+_engines = {}
+
+def watch_pool(name: str, engine):
+    """Report the connection counts of `engine`'s pool (which dispose() replaces) on the pool gauge."""
+    _engines[name] = engine
+
+def _pool_connections() -> dict:
+    values = {}
+    for name, engine in list(_engines.items()):
+        pool = engine.pool
+        # Only queue pools keep counts; SQLite's in-memory pools don't
+        if hasattr(pool, "checkedout"):
+            values[(name, "in_use")] = pool.checkedout()
+            values[(name, "idle")] = pool.checkedin()
+            values[(name, "overflow")] = max(0, pool.overflow())
+    return values
+
+db_pool_connections.collect = _pool_connections
+
+# ==================== MIDDLEWARE ====================
+
+class MetricsMiddleware:
+    """Records request metrics and adds the Server-Timing header.
+
+    A pure ASGI middleware, so streamed responses pass through untouched. The
+    header is sent before a streamed body, so it covers the time to the first
+    byte. Requests to `untimed_routes` (long-lived streams) are counted but
+    kept out of the histograms.
+    """
+
+    def __init__(self, app, untimed_routes: tuple = ()):
+        self.app = app
+        self.untimed_routes = set(untimed_routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(scope)
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING:
+                    header = timings.server_timing(time.perf_counter() - started)
+                    message = {**message, "headers": [*message.get("headers", ()), (b"server-timing", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_timings.reset(token)
+            elapsed = time.perf_counter() - started
+            route, method = timings.route(), scope["method"]
+            http_requests.inc(method, route, status_code)
+            if route not in self.untimed_routes:
+                http_request_seconds.observe(elapsed, method, route)
+                http_request_queries.observe(timings.queries, method, route)
+                http_request_db_seconds.observe(timings.db_seconds, method, route)
@@ -0,0 +1,220 @@
+"""Minimal schema migration runner.
+
+Migrations run in version order and each one is recorded in the
+`schema_migrations` table once it has committed. `0001` builds any missing
+tables straight from the models, so a fresh database already has the latest
+schema when later migrations run; every migration must therefore be
+idempotent (use the helpers below, which check before changing anything).
+
+Run with `python migrations.py`, or let the API apply them on startup.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+from db import Base, get_engine
+
+MIGRATIONS = []
+
+def migration(version: str, description: str):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+def create_index(conn, name: str, table: str, columns: list, unique: bool = False):
+    unique_sql = "UNIQUE " if unique else ""
+    conn.execute(text(
+        f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    ))
+
+def add_column(conn, table: str, name: str, ddl: str):
+    if name not in {column["name"] for column in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def create_table(conn, name: str):
+    import models  # noqa: F401 - registers the tables on Base.metadata
+    Base.metadata.tables[name].create(bind=conn, checkfirst=True)
+
+# Keep user_search (migration 0007) in step with users and doctors
+USER_SEARCH_TRIGGERS = [
+    "user_search_user_insert AFTER INSERT ON users BEGIN "
+    "INSERT INTO user_search (rowid, name, email, phone, specialization, role) "
+    "VALUES (new.id, new.name, new.email, new.phone, '', new.role); END",
+    "user_search_user_update AFTER UPDATE OF name, email, phone, role ON users BEGIN "
+    "UPDATE user_search SET name = new.name, email = new.email, phone = new.phone, role = new.role "
+    "WHERE rowid = old.id; END",
+    "user_search_user_delete AFTER DELETE ON users BEGIN "
+    "DELETE FROM user_search WHERE rowid = old.id; END",
+    "user_search_doctor_insert AFTER INSERT ON doctors BEGIN "
+    "UPDATE user_search SET specialization = new.specialization WHERE rowid = new.user_id; END",
+    "user_search_doctor_update AFTER UPDATE OF specialization, user_id ON doctors BEGIN "
+    "UPDATE user_search SET specialization = '' WHERE rowid = old.user_id; "
+    "UPDATE user_search SET specialization = new.specialization WHERE rowid = new.user_id; END",
+    "user_search_doctor_delete AFTER DELETE ON doctors BEGIN "
+    "UPDATE user_search SET specialization = '' WHERE rowid = old.user_id; END",
+]
+
+# ==================== MIGRATIONS ====================
+
+@migration("0001", "initial schema")
+def initial_schema(conn):
+    import models  # noqa: F401 - registers the tables on Base.metadata
+    Base.metadata.create_all(bind=conn)
+
+@migration("0002", "composite indexes for hot query shapes")
+def hot_query_indexes(conn):
+    # Tokens handed out by the old count(*) + 1 allocator may collide;
+    # renumber those days so the unique index can be built.
+    duplicated_days = conn.execute(text(
+        "SELECT DISTINCT doctor_id, date FROM appointments "
+        "GROUP BY doctor_id, date, token_number HAVING COUNT(*) > 1"
+    )).all()
+    for doctor_id, day in duplicated_days:
+        params = {"doctor_id": doctor_id, "date": day}
+        ids = conn.execute(text(
+            "SELECT id FROM appointments WHERE doctor_id = :doctor_id AND date = :date "
+            "ORDER BY token_number, id"
+        ), params).scalars().all()
+        for token_number, appointment_id in enumerate(ids, start=1):
+            conn.execute(text(
+                "UPDATE appointments SET token_number = :token_number WHERE id = :id"
+            ), {"token_number": token_number, "id": appointment_id})
+        # Let the allocator reseed the counter from the renumbered day
+        conn.execute(text(
+            "DELETE FROM appointment_counters WHERE doctor_id = :doctor_id AND date = :date"
+        ), params)
+
+    # Doctor queue: doctor_id = ? AND status = ? AND date BETWEEN ? ORDER BY date, token_number
+    create_index(conn, "uq_appointments_token", "appointments", ["doctor_id", "date", "token_number"], unique=True)
+    create_index(conn, "ix_appointments_doctor_status_date", "appointments", ["doctor_id", "status", "date", "token_number"])
+    # Patient history: patient_id = ? ORDER BY date, id
+    create_index(conn, "ix_appointments_patient_date", "appointments", ["patient_id", "date"])
+    # Admin stats: date = today, status = 'completed'
+    create_index(conn, "ix_appointments_date", "appointments", ["date"])
+    create_index(conn, "ix_appointments_status", "appointments", ["status"])
+    # Doctor directory filters
+    create_index(conn, "ix_doctors_specialization", "doctors", ["specialization"])
+    create_index(conn, "ix_doctors_department", "doctors", ["department"])
+    # Prescriptions by patient/doctor and their items (selectinload)
+    create_index(conn, "ix_prescriptions_patient_id", "prescriptions", ["patient_id"])
+    create_index(conn, "ix_prescriptions_doctor_id", "prescriptions", ["doctor_id"])
+    create_index(conn, "ix_prescription_items_prescription_id", "prescription_items", ["prescription_id"])
+    create_index(conn, "ix_dispensary_records_pharmacist_id", "dispensary_records", ["pharmacist_id"])
+
+@migration("0003", "materialized statistics counters")
+def stat_counters(conn):
+    # Filled in by the API's startup reconciliation (or `python stats.py`)
+    create_table(conn, "stat_counters")
+
+@migration("0004", "prescription dispense queue")
+def prescription_dispense_queue(conn):
+    add_column(conn, "prescriptions", "dispense_status", "VARCHAR NOT NULL DEFAULT 'pending'")
+    add_column(conn, "prescriptions", "claimed_by", "INTEGER REFERENCES pharmacists (id)")
+    add_column(conn, "prescriptions", "claim_expires_at", "TIMESTAMP")
+    conn.execute(text(
+        "UPDATE prescriptions SET dispense_status = 'dispensed' "
+        "WHERE id IN (SELECT prescription_id FROM dispensary_records)"
+    ))
+    create_index(conn, "ix_prescriptions_dispense_status_id", "prescriptions", ["dispense_status", "id"])
+
+@migration("0005", "doctor schedules and booked slots")
+def doctor_slots(conn):
+    create_table(conn, "doctor_schedules")
+    create_table(conn, "booked_slots")
+    # Existing double bookings collapse into one taken slot
+    conn.execute(text(
+        "INSERT INTO booked_slots (doctor_id, date, time) "
+        "SELECT DISTINCT a.doctor_id, a.date, a.time FROM appointments a "
+        "WHERE a.status != 'cancelled' AND NOT EXISTS ("
+        "SELECT 1 FROM booked_slots b WHERE b.doctor_id = a.doctor_id AND b.date = a.date AND b.time = a.time)"
+    ))
+
+@migration("0006", "medicine catalog and stock")
+def medicine_catalog(conn):
+    create_table(conn, "medicines")
+    add_column(conn, "prescription_items", "medicine_id", "INTEGER REFERENCES medicines (id)")
+    add_column(conn, "prescription_items", "quantity", "INTEGER NOT NULL DEFAULT 1")
+
+@migration("0007", "full-text user search")
+def user_search(conn):
+    # FTS5 is SQLite's; search.py falls back to LIKE elsewhere
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+        "name, email, phone, specialization, role UNINDEXED, "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+    ))
+    # ORDER BY rank: matches in the name count most
+    conn.execute(text("INSERT INTO user_search (user_search, rank) VALUES ('rank', 'bm25(10.0, 4.0, 4.0, 2.0)')"))
+    for trigger in USER_SEARCH_TRIGGERS:
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {trigger}"))
+
+    conn.execute(text("DELETE FROM user_search"))
+    conn.execute(text(
+        "INSERT INTO user_search (rowid, name, email, phone, specialization, role) "
+        "SELECT u.id, u.name, u.email, u.phone, COALESCE(d.specialization, ''), u.role "
+        "FROM users u LEFT JOIN doctors d ON d.user_id = u.id"
+    ))
+
+@migration("0008", "non-reusable user ids and token versions")
+def user_token_versions(conn):
+    add_column(conn, "users", "token_version", "INTEGER NOT NULL DEFAULT 0")
+    # PostgreSQL's SERIAL never hands an id out twice; SQLite reuses the
+    # highest rowid once it's deleted unless the table is AUTOINCREMENT,
+    # which only CREATE TABLE can set. So rebuild it under the same name.
+    if conn.dialect.name != "sqlite":
+        return
+    table_sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users'")).scalar()
+    if "AUTOINCREMENT" in table_sql.upper():
+        return
+
+    import models  # noqa: F401 - registers the tables on Base.metadata
+    users = Base.metadata.tables["users"]
+    columns = ", ".join(column.name for column in users.columns)
+    create_sql = str(CreateTable(users).compile(dialect=conn.dialect))
+    conn.execute(text(create_sql.replace("CREATE TABLE users ", "CREATE TABLE users_rebuilt ", 1)))
+    conn.execute(text(f"INSERT INTO users_rebuilt ({columns}) SELECT {columns} FROM users"))
+    # Takes the table's indexes and search triggers with it
+    conn.execute(text("DROP TABLE users"))
+    conn.execute(text("ALTER TABLE users_rebuilt RENAME TO users"))
+    for index in users.indexes:
+        index.create(bind=conn, checkfirst=True)
+    for trigger in USER_SEARCH_TRIGGERS:
+        if " ON users " in trigger:
+            conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {trigger}"))
+
+@migration("0009", "single-use refresh tokens")
+def refresh_tokens(conn):
+    # Refresh tokens issued before this carry no id and are no longer accepted
+    create_table(conn, "refresh_tokens")
+
+# ==================== RUNNER ====================
+
+def migrate(bind=None) -> list:
+    """Apply pending migrations (to the configured engine by default) and return the versions that were applied."""
+    bind = bind if bind is not None else get_engine()
+    with bind.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations "
+            "(version VARCHAR PRIMARY KEY, description VARCHAR NOT NULL)"
+        ))
+        applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+    newly_applied = []
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        with bind.begin() as conn:
+            fn(conn)
+            conn.execute(text(
+                "INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"
+            ), {"version": version, "description": description})
+        newly_applied.append(version)
+    return newly_applied
+
+if __name__ == "__main__":
+    applied = migrate()
+    if applied:
+        print(f"✅ Applied migrations: {', '.join(applied)}")
+    else:
+        print("✅ Database is up to date")
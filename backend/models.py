@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Time, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, Time, DateTime, Float, Index, CheckConstraint
 from sqlalchemy.orm import relationship
 from db import Base
 
 class User(Base):
     __tablename__ = "users"
+    # Tokens name the user by id, so a deleted user's id must never be handed out again
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -11,19 +13,29 @@ class User(Base):
     phone = Column(String, nullable=False)
     password_hash = Column(String, nullable=False)
     role = Column(String, nullable=False)  # admin, doctor, patient, pharmacist
+    # Carried in every token; bumping it revokes all of the user's tokens
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationships
     doctor = relationship("Doctor", back_populates="user", uselist=False)
     patient = relationship("Patient", back_populates="user", uselist=False)
     pharmacist = relationship("Pharmacist", back_populates="user", uselist=False)
 
+class RefreshToken(Base):
+    """An unused refresh token; exchanging it deletes the row, so each one works once."""
+    __tablename__ = "refresh_tokens"
+    
+    jti = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+
 class Doctor(Base):
     __tablename__ = "doctors"
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True)
-    specialization = Column(String, nullable=False)
-    department = Column(String, nullable=False)
+    specialization = Column(String, nullable=False, index=True)
+    department = Column(String, nullable=False, index=True)
     
     # Relationships
     user = relationship("User", back_populates="doctor")
@@ -55,28 +67,66 @@ class Pharmacist(Base):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        Index("uq_appointments_token", "doctor_id", "date", "token_number", unique=True),
+        Index("ix_appointments_doctor_status_date", "doctor_id", "status", "date", "token_number"),
+        Index("ix_appointments_patient_date", "patient_id", "date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
     doctor_id = Column(Integer, ForeignKey("doctors.id"))
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     time = Column(Time, nullable=False)
     token_number = Column(Integer, nullable=False)
-    status = Column(String, default="scheduled")  # scheduled, completed, cancelled
+    status = Column(String, default="scheduled", index=True)  # scheduled, completed, cancelled
     
     # Relationships
     patient = relationship("Patient", back_populates="appointments")
     doctor = relationship("Doctor", back_populates="appointments")
     prescription = relationship("Prescription", back_populates="appointment", uselist=False)
 
+class AppointmentCounter(Base):
+    """Last token number handed out per doctor per day."""
+    __tablename__ = "appointment_counters"
+    
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    last_token = Column(Integer, nullable=False)
+
+class DoctorSchedule(Base):
+    """A weekly working-hours block, split into fixed-length appointment slots."""
+    __tablename__ = "doctor_schedules"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)  # 0 = Monday
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    slot_minutes = Column(Integer, nullable=False, default=15)
+
+class BookedSlot(Base):
+    """A doctor's time taken by a scheduled or completed appointment; the key makes each slot bookable once."""
+    __tablename__ = "booked_slots"
+    
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    time = Column(Time, primary_key=True)
+
 class Prescription(Base):
     __tablename__ = "prescriptions"
+    __table_args__ = (
+        Index("ix_prescriptions_dispense_status_id", "dispense_status", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     appointment_id = Column(Integer, ForeignKey("appointments.id"), unique=True)
-    doctor_id = Column(Integer, ForeignKey("doctors.id"))
-    patient_id = Column(Integer, ForeignKey("patients.id"))
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
     notes = Column(String)
+    dispense_status = Column(String, nullable=False, default="pending", server_default="pending")  # pending, claimed, dispensed
+    claimed_by = Column(Integer, ForeignKey("pharmacists.id"))
+    claim_expires_at = Column(DateTime)
     
     # Relationships
     appointment = relationship("Appointment", back_populates="prescription")
@@ -89,24 +139,46 @@ class PrescriptionItem(Base):
     __tablename__ = "prescription_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    prescription_id = Column(Integer, ForeignKey("prescriptions.id"))
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id"), index=True)
     medicine_name = Column(String, nullable=False)
     dosage = Column(String, nullable=False)
     frequency = Column(String, nullable=False)
     duration = Column(String, nullable=False)
+    # Catalog entry dispensed and billed for this item; free-text medicines have none
+    medicine_id = Column(Integer, ForeignKey("medicines.id"))
+    quantity = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     prescription = relationship("Prescription", back_populates="items")
 
+class Medicine(Base):
+    __tablename__ = "medicines"
+    __table_args__ = (
+        CheckConstraint("stock >= 0", name="ck_medicines_stock"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String, unique=True, nullable=False)
+    name = Column(String, nullable=False, index=True)
+    unit_price = Column(Float, nullable=False)
+    stock = Column(Integer, nullable=False, default=0)
+
 class DispensaryRecord(Base):
     __tablename__ = "dispensary_records"
     
     id = Column(Integer, primary_key=True, index=True)
     prescription_id = Column(Integer, ForeignKey("prescriptions.id"), unique=True)
-    pharmacist_id = Column(Integer, ForeignKey("pharmacists.id"))
+    pharmacist_id = Column(Integer, ForeignKey("pharmacists.id"), index=True)
     total_amount = Column(Float, nullable=False)
     payment_status = Column(String, default="pending")  # pending, paid
     
     # Relationships
     prescription = relationship("Prescription", back_populates="dispensary_record")
     pharmacist = relationship("Pharmacist", back_populates="dispensary_records")
+
+class StatCounter(Base):
+    """Incrementally maintained statistic, e.g. `doctors` or `appointments.date.2024-05-01`."""
+    __tablename__ = "stat_counters"
+    
+    key = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
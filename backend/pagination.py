@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import date, time, datetime
+from typing import Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class PageParams:
+    """Common `limit`/`cursor` query parameters for list endpoints."""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None)
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+def _encode_value(value):
+    if isinstance(value, (date, time, datetime)):
+        return value.isoformat()
+    return value
+
+def _decode_value(column, value):
+    python_type = column.type.python_type
+    if value is not None and python_type in (date, time, datetime):
+        return python_type.fromisoformat(value)
+    return value
+
+def encode_cursor(row, order_by) -> str:
+    values = [_encode_value(getattr(row, column.key)) for column in order_by]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, order_by) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(order_by):
+            raise ValueError("cursor does not match ordering")
+        return [_decode_value(column, value) for column, value in zip(order_by, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate(query, order_by, page: PageParams) -> dict:
+    """Keyset-paginate `query` ordered ascending by `order_by`.
+
+    `order_by` must end with a unique column (normally the primary key) so the
+    ordering is total. Rows are fetched with a `(cols) > (cursor)` seek, so the
+    cost of any page is independent of how deep into the result it is.
+    """
+    if page.cursor:
+        values = decode_cursor(page.cursor, order_by)
+        query = query.filter(tuple_(*order_by) > tuple_(*values))
+
+    rows = query.order_by(*order_by).limit(page.limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor(rows[-1], order_by)
+
+    return {"items": rows, "next_cursor": next_cursor}
@@ -0,0 +1,85 @@
+import os
+from datetime import datetime, timedelta
+from typing import List
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+from models import Prescription
+
+# How long a pharmacist holds a claimed prescription before others may take it
+PRESCRIPTION_CLAIM_TTL_SECONDS = int(os.getenv("PRESCRIPTION_CLAIM_TTL_SECONDS", "300"))
+
+UNDISPENSED = ("pending", "claimed")
+
+def available_to(pharmacist_id: int, now: datetime):
+    """Prescriptions `pharmacist_id` may work on: unclaimed, claimed by them, or with a lapsed claim."""
+    return or_(
+        Prescription.dispense_status == "pending",
+        and_(
+            Prescription.dispense_status == "claimed",
+            or_(Prescription.claimed_by == pharmacist_id, Prescription.claim_expires_at < now)
+        )
+    )
+
+def claim_prescriptions(db: Session, pharmacist_id: int, limit: int) -> List[int]:
+    """Lease up to `limit` of the oldest available prescriptions to a pharmacist.
+
+    Selection and update are a single statement: PostgreSQL locks the chosen
+    rows with FOR UPDATE SKIP LOCKED so concurrent claimers take disjoint
+    batches, and SQLite runs the statement under its write lock (it ignores
+    the locking clause). Returns the claimed ids, oldest first.
+    """
+    now = datetime.utcnow()
+    candidates = select(Prescription.id).where(
+        Prescription.dispense_status.in_(UNDISPENSED),
+        available_to(pharmacist_id, now)
+    ).order_by(Prescription.id).limit(limit).with_for_update(skip_locked=True)
+
+    claimed = db.execute(
+        update(Prescription)
+        .where(Prescription.id.in_(candidates.scalar_subquery()))
+        .values(
+            dispense_status="claimed",
+            claimed_by=pharmacist_id,
+            claim_expires_at=now + timedelta(seconds=PRESCRIPTION_CLAIM_TTL_SECONDS)
+        )
+        .returning(Prescription.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    return sorted(claimed)
+
+def release_claim(db: Session, prescription_id: int, pharmacist_id: int) -> bool:
+    released = db.execute(
+        update(Prescription)
+        .where(
+            Prescription.id == prescription_id,
+            Prescription.dispense_status == "claimed",
+            Prescription.claimed_by == pharmacist_id
+        )
+        .values(dispense_status="pending", claimed_by=None, claim_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return released == 1
+
+def mark_dispensed(db: Session, prescription_id: int, pharmacist_id: int):
+    """Flip a prescription to dispensed with a conditional update, so two
+    pharmacists can never both dispense it. Raises if it is not available.
+    Does not commit; the caller records the dispense in the same transaction."""
+    now = datetime.utcnow()
+    updated = db.execute(
+        update(Prescription)
+        .where(Prescription.id == prescription_id, available_to(pharmacist_id, now))
+        .values(dispense_status="dispensed", claimed_by=pharmacist_id, claim_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if updated == 1:
+        return
+
+    status = db.query(Prescription.dispense_status).filter(Prescription.id == prescription_id).scalar()
+    if status is None:
+        raise HTTPException(status_code=404, detail="Prescription not found")
+    if status == "dispensed":
+        raise HTTPException(status_code=400, detail="Prescription already dispensed")
+    raise HTTPException(status_code=409, detail="Prescription is claimed by another pharmacist")
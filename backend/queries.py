@@ -0,0 +1,71 @@
+from sqlalchemy.orm import Session, joinedload, selectinload
+from models import User, Doctor, Pharmacist, Appointment, Prescription, DispensaryRecord
+
+# Loading strategies per response schema.
+# Each tuple eagerly loads every relationship the matching schema serializes,
+# so a list endpoint costs a fixed number of SELECTs regardless of row count.
+DOCTOR_RESPONSE_LOAD = (
+    joinedload(Doctor.user),
+)
+
+PHARMACIST_RESPONSE_LOAD = (
+    joinedload(Pharmacist.user),
+)
+
+APPOINTMENT_RESPONSE_LOAD = (
+    joinedload(Appointment.doctor).joinedload(Doctor.user),
+)
+
+PRESCRIPTION_RESPONSE_LOAD = (
+    selectinload(Prescription.items),
+)
+
+DISPENSARY_RECORD_RESPONSE_LOAD = (
+    joinedload(DispensaryRecord.prescription).selectinload(Prescription.items),
+)
+
+def doctors_query(db: Session):
+    return db.query(Doctor).options(*DOCTOR_RESPONSE_LOAD)
+
+def pharmacists_query(db: Session):
+    return db.query(Pharmacist).options(*PHARMACIST_RESPONSE_LOAD)
+
+def appointments_query(db: Session):
+    return db.query(Appointment).options(*APPOINTMENT_RESPONSE_LOAD)
+
+def prescriptions_query(db: Session):
+    return db.query(Prescription).options(*PRESCRIPTION_RESPONSE_LOAD)
+
+def dispensary_records_query(db: Session):
+    return db.query(DispensaryRecord).options(*DISPENSARY_RECORD_RESPONSE_LOAD)
+
+# Column selections per response schema, for list endpoints that render plain
+# rows (serialization.render_rows) instead of building ORM objects. Columns of
+# the main table keep their names, so pagination cursors work on the rows.
+APPOINTMENT_RESPONSE_COLUMNS = (
+    Appointment.id, Appointment.patient_id, Appointment.doctor_id, Appointment.date, Appointment.time,
+    Appointment.token_number, Appointment.status,
+    Doctor.user_id.label("doctor_user_id"), Doctor.specialization, Doctor.department,
+    User.name, User.email, User.phone, User.role,
+)
+
+def appointment_rows(db: Session):
+    return db.query(*APPOINTMENT_RESPONSE_COLUMNS).join(
+        Doctor, Appointment.doctor_id == Doctor.id
+    ).join(User, Doctor.user_id == User.id)
+
+def appointment_from_row(row) -> dict:
+    """An `appointment_rows` row as AppointmentResponse data."""
+    # Unpacked by position: a Row's attribute lookups cost more than building the dict
+    (
+        appointment_id, patient_id, doctor_id, date, time, token_number, status,
+        doctor_user_id, specialization, department, name, email, phone, role
+    ) = row
+    return {
+        "id": appointment_id, "patient_id": patient_id, "doctor_id": doctor_id, "date": date,
+        "time": time, "token_number": token_number, "status": status,
+        "doctor": {
+            "specialization": specialization, "department": department, "id": doctor_id, "user_id": doctor_user_id,
+            "user": {"name": name, "email": email, "phone": phone, "role": role, "id": doctor_user_id}
+        }
+    }
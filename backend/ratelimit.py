@@ -0,0 +1,225 @@
+"""Per-client rate limiting and per-route concurrency caps.
+
+Every HTTP request is charged, on its route, to the client's IP address and,
+with a valid bearer token, to its user id as well, so neither switching
+tokens nor switching addresses buys a fresh budget. Everyone behind one
+address (a NAT, an office proxy) shares that address's buckets. Behind
+reverse proxies listed in TRUSTED_PROXIES the address is taken from
+X-Forwarded-For: the last one in it that isn't a trusted proxy.
+
+Each client has a token bucket per route that holds up to RATE_LIMIT_BURST
+tokens and refills at RATE_LIMIT_PER_SECOND, so flooding one route doesn't
+lock the client out of the others; a request takes its route's cost from
+ROUTE_COSTS (1 unless listed, so logins, which run bcrypt, are let through a
+tenth as often) from each of its buckets. A request the buckets can't pay
+for gets 429 with a Retry-After saying when they could, without reaching
+the endpoint.
+
+Routes in ROUTE_CONCURRENCY also have a cap on how many requests a worker
+serves at once; beyond it, requests are shed with 503 and Retry-After: 1,
+like the password-hashing queue does (hashing.py).
+
+RATE_LIMIT_ROUTE_COSTS and RATE_LIMIT_ROUTE_CONCURRENCY take a JSON object
+of route path -> number, e.g. '{"/search": 4}', applied over the defaults
+below; null drops a route's entry.
+
+By default each worker keeps its own buckets, so with N workers a client
+gets up to N times the rate. With RATE_LIMIT_BACKEND=shared the workers
+draw from one budget in the shared-state counters instead (shared_state.py):
+each client may spend RATE_LIMIT_BURST tokens on a route per window of
+RATE_LIMIT_BURST / RATE_LIMIT_PER_SECOND seconds. That costs a counter
+update per request, and rejected requests count against the window too.
+"""
+import ipaddress
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+from fastapi.responses import JSONResponse
+from starlette.routing import BaseRoute, Match
+from auth import verify_access_token
+from shared_state import state as shared_state
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "100"))
+# memory (per worker) or shared (SHARED_STATE_URL's counters)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Buckets kept in memory; beyond that the least recently used are dropped
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+# Comma-separated addresses or CIDR ranges of reverse proxies whose X-Forwarded-For is believed
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.getenv("TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+
+def _route_settings(name: str, defaults: dict) -> dict:
+    """`defaults` updated from the JSON object in the environment variable `name`."""
+    settings = {**defaults, **json.loads(os.getenv(name) or "{}")}
+    return {route: int(value) for route, value in settings.items() if value is not None}
+
+# Tokens a request costs, by route; anything else costs 1
+ROUTE_COSTS = _route_settings("RATE_LIMIT_ROUTE_COSTS", {
+    "/auth/login": 10,
+    "/auth/signup": 10,
+    "/admin/import/{kind}": 20,
+    "/admin/export/{kind}": 20,
+    "/pharmacy/prescriptions": 5,
+    "/search": 2,
+})
+
+# Requests a worker serves at once, by route
+ROUTE_CONCURRENCY = _route_settings("RATE_LIMIT_ROUTE_CONCURRENCY", {
+    "/admin/import/{kind}": 2,
+    "/admin/export/{kind}": 4,
+    "/pharmacy/prescriptions": 16,
+    "/search": 32,
+})
+
+class TokenBuckets:
+    """Token buckets in this process, keyed by client and route."""
+
+    def __init__(self, rate: float = RATE_LIMIT_PER_SECOND, burst: float = RATE_LIMIT_BURST,
+                 max_clients: int = RATE_LIMIT_MAX_CLIENTS, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, time they were counted), least recently used first
+
+    def take(self, keys: Iterable[str], cost: float) -> float:
+        """Take `cost` tokens from the bucket of every one of `keys`. Returns 0
+        if they were all there, otherwise the seconds until they will be
+        (nothing is taken from any of them)."""
+        now = self.clock()
+        cost = min(cost, self.burst)
+        levels = {}
+        for key in keys:
+            tokens, counted_at = self._buckets.get(key, (self.burst, now))
+            levels[key] = min(self.burst, tokens + (now - counted_at) * self.rate)
+        retry_after = max(0.0, max(cost - tokens for tokens in levels.values())) / self.rate
+        for key, tokens in levels.items():
+            self._buckets[key] = (tokens if retry_after else tokens - cost, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+class SharedBuckets:
+    """Fixed-window budgets in the shared-state counters, for all workers at once."""
+
+    def __init__(self, rate: float = RATE_LIMIT_PER_SECOND, burst: float = RATE_LIMIT_BURST,
+                 clock: Callable[[], float] = time.time):
+        self.burst = burst
+        self.window = burst / rate
+        self.clock = clock
+
+    def take(self, keys: Iterable[str], cost: float) -> float:
+        now = self.clock()
+        window = int(now // self.window)
+        spent = max(shared_state.incr(f"rate:{key}:{window}", math.ceil(cost), ttl=self.window) for key in keys)
+        if spent > self.burst:
+            return (window + 1) * self.window - now
+        return 0.0
+
+def build_buckets(backend: str = RATE_LIMIT_BACKEND):
+    if backend == "memory":
+        return TokenBuckets()
+    if backend == "shared":
+        return SharedBuckets()
+    raise ValueError(f"Unsupported RATE_LIMIT_BACKEND: {backend}")
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def _client_address(scope: dict, forwarded_for: str) -> str:
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    # Each trusted proxy appends who it heard from; the first untrusted hop from the right is the client
+    if forwarded_for and _trusted(address):
+        for hop in reversed(forwarded_for.split(",")):
+            address = hop.strip()
+            if not _trusted(address):
+                break
+    return address
+
+def _clients(scope: dict) -> list:
+    """What a request is charged to: its IP address, and its user with a valid bearer token."""
+    user, forwarded_for = None, []
+    for name, value in scope["headers"]:
+        if name == b"authorization" and user is None:
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                try:
+                    # Verified tokens are cached (auth.token_cache), so this is usually a lookup
+                    user = verify_access_token(token)[0]
+                except (KeyError, TypeError, ValueError):
+                    pass
+        elif name == b"x-forwarded-for":
+            forwarded_for.append(value.decode("latin-1"))
+    clients = [f"ip:{_client_address(scope, ','.join(forwarded_for))}"]
+    if user is not None:
+        clients.append(f"user:{user}")
+    return clients
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code, content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+class RateLimitMiddleware:
+    """Admission control for `routes` (see the module docstring). A pure ASGI
+    middleware; WebSocket connections and unmatched paths pass through."""
+
+    def __init__(self, app, routes: Iterable[BaseRoute], buckets=None):
+        self.app = app
+        self.buckets = buckets if buckets is not None else build_buckets()
+        self.in_flight = dict.fromkeys(ROUTE_CONCURRENCY, 0)
+        # Routes without path parameters are found by a dict lookup; only the rest are matched in turn
+        self.static_routes, self.dynamic_routes = {}, []
+        for route in routes:
+            if "{" in route.path:
+                self.dynamic_routes.append(route)
+            else:
+                for method in getattr(route, "methods", None) or ():
+                    self.static_routes[(method, route.path)] = route
+
+    def match(self, scope: dict) -> Optional[BaseRoute]:
+        route = self.static_routes.get((scope["method"], scope["path"]))
+        if route is None:
+            route = next((route for route in self.dynamic_routes if route.matches(scope)[0] == Match.FULL), None)
+        return route
+
+    async def __call__(self, scope, receive, send):
+        route = self.match(scope) if scope["type"] == "http" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+        # The router sets this too; setting it now labels rejected requests' metrics with their route
+        scope["route"] = route
+
+        keys = [f"{client} {route.path}" for client in _clients(scope)]
+        retry_after = self.buckets.take(keys, ROUTE_COSTS.get(route.path, 1))
+        if retry_after:
+            await _reject(429, "Too many requests", retry_after)(scope, receive, send)
+            return
+
+        cap = ROUTE_CONCURRENCY.get(route.path)
+        if cap is None:
+            await self.app(scope, receive, send)
+            return
+        if self.in_flight[route.path] >= cap:
+            await _reject(503, "Server is busy, please retry shortly", 1)(scope, receive, send)
+            return
+        self.in_flight[route.path] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight[route.path] -= 1
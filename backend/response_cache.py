@@ -0,0 +1,74 @@
+"""Serialized-response cache with ETags for rarely changing list endpoints.
+
+Each cached body is stored with the versions of the tables it was built
+from. Writes to those tables call `invalidate_tables`, which bumps the
+version so the next request rebuilds the body; until then repeated requests
+are answered from memory without touching the database or re-serializing.
+The ETag is a hash of the body, so it stays valid across restarts, and a
+matching `If-None-Match` gets a bodiless 304.
+
+With several workers the versions come from a shared counter and are
+broadcast, so a write in one worker invalidates the others' entries within a
+poll interval (see shared_state.py).
+"""
+import hashlib
+import os
+from collections import defaultdict
+from typing import Awaitable, Callable, Iterable
+from fastapi import Request, Response
+from cache import TTLCache
+from db import get_database
+from serialization import dump_json
+from shared_state import state as shared_state
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+# Browsers and proxies may store the response but must revalidate each use
+PUBLIC_CACHE_CONTROL = "public, no-cache"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS)
+table_versions = defaultdict(int)
+
+def invalidate_tables(*tables: str):
+    for table in tables:
+        table_versions[table] = max(table_versions[table], shared_state.incr(f"table-version:{table}"))
+    shared_state.broadcast("tables", {table: table_versions[table] for table in tables})
+
+def _apply_table_versions(versions: dict):
+    for table, version in versions.items():
+        table_versions[table] = max(table_versions[table], version)
+
+shared_state.on("tables", _apply_table_versions)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+async def cached_response(
+    request: Request,
+    tables: Iterable[str],
+    schema,
+    load: Callable[[], Awaitable],
+    cache_control: str = PUBLIC_CACHE_CONTROL
+) -> Response:
+    """Serve `load()` rendered through `schema`, from the cache while `tables` are unchanged."""
+    # Keyed by database too, so apps in one process on different databases don't share bodies
+    key = (get_database(request).url, request.url.path, str(request.query_params))
+    version = tuple(table_versions[table] for table in tables)
+
+    entry = response_cache.get(key)
+    if entry is None or entry[0] != version:
+        # The version is read before loading, so a concurrent write makes this entry stale at once
+        body = dump_json(schema, await load())
+        entry = (version, '"' + hashlib.sha256(body).hexdigest()[:32] + '"', body)
+        response_cache.set(key, entry)
+
+    _, etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
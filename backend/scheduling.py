@@ -0,0 +1,268 @@
+"""Doctor availability: weekly slot templates and free-slot search.
+
+A doctor's `DoctorSchedule` rows are expanded once into a `WeeklyTemplate`:
+for each weekday, the sorted slot start times and a bit per slot. The
+templates are cached, so a day's free slots are the template mask with the
+bits of that day's `BookedSlot` rows cleared, and the earliest free slot is
+the lowest set bit. "First available" searches never load whole calendars:
+a grouped count per (doctor, day) over growing date windows finds the first
+day each doctor has fewer bookings than slots, and only those days' booked
+times are fetched to pick the slot.
+
+Doctors without a schedule accept bookings at any time, any number of them,
+and see patients in token order. For doctors with one, the `booked_slots`
+primary key makes each (doctor, date, time) bookable once.
+"""
+import os
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from cache import TTLCache
+from db import dialect_insert
+from models import DoctorSchedule, BookedSlot
+from shared_state import state as shared_state
+
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", "10000"))
+SCHEDULE_CACHE_TTL_SECONDS = float(os.getenv("SCHEDULE_CACHE_TTL_SECONDS", "300"))
+# How far ahead "first available" searches look
+SLOT_SEARCH_HORIZON_DAYS = int(os.getenv("SLOT_SEARCH_HORIZON_DAYS", "90"))
+MAX_SLOT_WINDOW_DAYS = 366
+
+class WeeklyTemplate:
+    def __init__(self, entries: Iterable = ()):
+        by_weekday = defaultdict(set)
+        for entry in entries:
+            start = datetime.combine(date.min, entry.start_time)
+            end = datetime.combine(date.min, entry.end_time)
+            step = timedelta(minutes=entry.slot_minutes)
+            while start + step <= end:
+                by_weekday[entry.weekday].add(start.time())
+                start += step
+
+        self.slots: Dict[int, Tuple[time, ...]] = {
+            weekday: tuple(sorted(times)) for weekday, times in by_weekday.items()
+        }
+        self.bits: Dict[int, Dict[time, int]] = {
+            weekday: {slot: 1 << index for index, slot in enumerate(times)}
+            for weekday, times in self.slots.items()
+        }
+
+    @property
+    def scheduled(self) -> bool:
+        return bool(self.slots)
+
+    def has_slot(self, day: date, at: time) -> bool:
+        return at in self.bits.get(day.weekday(), {})
+
+    def free_mask(self, day: date, booked: Iterable[time], after: Optional[time] = None) -> int:
+        """Bitmask of the day's free slots, optionally only those starting after `after`."""
+        times = self.slots.get(day.weekday(), ())
+        mask = (1 << len(times)) - 1
+        bits = self.bits.get(day.weekday(), {})
+        for taken in booked:
+            mask &= ~bits.get(taken, 0)
+        if after is not None:
+            mask &= ~((1 << bisect_right(times, after)) - 1)
+        return mask
+
+    def capacity(self, day: date, after: Optional[time] = None) -> int:
+        times = self.slots.get(day.weekday(), ())
+        return len(times) - (bisect_right(times, after) if after is not None else 0)
+
+    def times(self, day: date, mask: int) -> List[time]:
+        times = self.slots.get(day.weekday(), ())
+        return [slot for index, slot in enumerate(times) if mask >> index & 1]
+
+    def first(self, day: date, mask: int) -> time:
+        return self.slots[day.weekday()][(mask & -mask).bit_length() - 1]
+
+class ScheduleRow(NamedTuple):
+    weekday: int
+    start_time: time
+    end_time: time
+    slot_minutes: int
+
+@lru_cache(maxsize=1024)
+def _template(entries: Tuple[ScheduleRow, ...]) -> WeeklyTemplate:
+    # Doctors keeping the same hours share one template
+    return WeeklyTemplate(entries)
+
+schedule_cache = TTLCache(maxsize=SCHEDULE_CACHE_SIZE, ttl=SCHEDULE_CACHE_TTL_SECONDS)
+
+def invalidate_schedule(doctor_id: int):
+    schedule_cache.delete(doctor_id)
+    shared_state.broadcast("schedules", doctor_id)
+
+shared_state.on("schedules", schedule_cache.delete)
+
+def load_templates(db: Session, doctor_ids: Iterable[int]) -> Dict[int, WeeklyTemplate]:
+    templates, missing = {}, []
+    # Entries are tagged with their database, for processes running apps on several
+    url = db.get_bind().url
+    for doctor_id in doctor_ids:
+        cached_url, template = schedule_cache.get(doctor_id, (None, None))
+        if cached_url != url:
+            missing.append(doctor_id)
+        else:
+            templates[doctor_id] = template
+
+    if missing:
+        entries = defaultdict(list)
+        rows = db.query(
+            DoctorSchedule.doctor_id, DoctorSchedule.weekday, DoctorSchedule.start_time,
+            DoctorSchedule.end_time, DoctorSchedule.slot_minutes
+        ).filter(DoctorSchedule.doctor_id.in_(missing))
+        for doctor_id, *entry in rows:
+            entries[doctor_id].append(ScheduleRow(*entry))
+        for doctor_id in missing:
+            templates[doctor_id] = _template(tuple(sorted(entries[doctor_id])))
+            schedule_cache.set(doctor_id, (url, templates[doctor_id]))
+    return templates
+
+def booked_slots(db: Session, doctor_ids: List[int], date_from: date, date_to: date) -> Dict[tuple, set]:
+    booked = defaultdict(set)
+    rows = db.query(BookedSlot.doctor_id, BookedSlot.date, BookedSlot.time).filter(
+        BookedSlot.doctor_id.in_(doctor_ids),
+        BookedSlot.date >= date_from,
+        BookedSlot.date <= date_to
+    )
+    for doctor_id, day, at in rows:
+        booked[(doctor_id, day)].add(at)
+    return booked
+
+def booked_on(db: Session, openings: Dict[int, date]) -> Dict[tuple, set]:
+    """Booked times for one day per doctor."""
+    by_day = defaultdict(list)
+    for doctor_id, day in openings.items():
+        by_day[day].append(doctor_id)
+
+    booked = defaultdict(set)
+    rows = db.query(BookedSlot.doctor_id, BookedSlot.date, BookedSlot.time).filter(or_(*(
+        and_(BookedSlot.date == day, BookedSlot.doctor_id.in_(ids)) for day, ids in by_day.items()
+    )))
+    for doctor_id, day, at in rows:
+        booked[(doctor_id, day)].add(at)
+    return booked
+
+def _earliest_start(day: date, now: datetime) -> Optional[time]:
+    # Today's slots that have already started are not offered
+    if day < now.date():
+        return time.max
+    return now.time() if day == now.date() else None
+
+def free_slots(db: Session, doctor_id: int, date_from: date, date_to: date, now: datetime) -> dict:
+    template = load_templates(db, [doctor_id])[doctor_id]
+    days = []
+    if template.scheduled:
+        booked = booked_slots(db, [doctor_id], date_from, date_to)
+        day = date_from
+        while day <= date_to:
+            mask = template.free_mask(day, booked.get((doctor_id, day), ()), _earliest_start(day, now))
+            if mask:
+                days.append({"date": day, "slots": template.times(day, mask)})
+            day += timedelta(days=1)
+    return {"doctor_id": doctor_id, "scheduled": template.scheduled, "days": days}
+
+def booked_counts(db: Session, doctor_ids: List[int], date_from: date, date_to: date,
+                  now: datetime) -> Dict[tuple, int]:
+    # Today's slots that have already started don't count against what is left of it
+    rows = db.query(BookedSlot.doctor_id, BookedSlot.date, func.count()).filter(
+        BookedSlot.doctor_id.in_(doctor_ids),
+        BookedSlot.date >= date_from,
+        BookedSlot.date <= date_to,
+        or_(BookedSlot.date != now.date(), BookedSlot.time > now.time())
+    ).group_by(BookedSlot.doctor_id, BookedSlot.date)
+    return {(doctor_id, day): count for doctor_id, day, count in rows}
+
+def first_available(db: Session, doctor_ids: List[int], date_from: date, now: datetime,
+                    limit: int, horizon_days: int = SLOT_SEARCH_HORIZON_DAYS) -> List[Tuple[date, time, int]]:
+    """The `limit` earliest (date, time, doctor_id) openings, at most one per doctor.
+
+    A day with more slots left than bookings certainly has a free slot. A
+    booking off the doctor's current template still counts against the day,
+    so such a day may be skipped here even though `free_slots` lists it.
+    """
+    templates = load_templates(db, doctor_ids)
+    pending = [doctor_id for doctor_id in doctor_ids if templates[doctor_id].scheduled]
+    found = []
+    window_start, window_days = date_from, 1
+    last_day = date_from + timedelta(days=horizon_days)
+
+    while pending and window_start <= last_day:
+        window_end = min(window_start + timedelta(days=window_days - 1), last_day)
+        counts = booked_counts(db, pending, window_start, window_end, now)
+        openings = {}
+        for doctor_id in pending:
+            template = templates[doctor_id]
+            day = window_start
+            while day <= window_end:
+                if template.capacity(day, _earliest_start(day, now)) > counts.get((doctor_id, day), 0):
+                    openings[doctor_id] = day
+                    break
+                day += timedelta(days=1)
+
+        if openings:
+            # Only doctors free on the earliest days can make the cut
+            needed = min(limit - len(found), len(openings))
+            cutoff = sorted(openings.values())[needed - 1]
+            chosen = {doctor_id: day for doctor_id, day in openings.items() if day <= cutoff}
+            booked = booked_on(db, chosen)
+            for doctor_id, day in chosen.items():
+                template = templates[doctor_id]
+                mask = template.free_mask(day, booked.get((doctor_id, day), ()), _earliest_start(day, now))
+                found.append((day, template.first(day, mask), doctor_id))
+            if len(found) >= limit:
+                break
+            pending = [doctor_id for doctor_id in pending if doctor_id not in openings]
+
+        window_start = window_end + timedelta(days=1)
+        window_days *= 2
+    return sorted(found)[:limit]
+
+# ==================== BOOKING ====================
+
+def reserve_slot(db: Session, doctor_id: int, day: date, at: time, now: datetime):
+    """Take the slot in the caller's transaction; 400 if the doctor doesn't
+    work then, 409 if someone already holds it. Doctors without a schedule
+    have no slots to take."""
+    template = load_templates(db, [doctor_id])[doctor_id]
+    if not template.scheduled:
+        return
+    if not template.has_slot(day, at) or datetime.combine(day, at) <= now:
+        raise HTTPException(status_code=400, detail="Doctor is not available at this time")
+
+    reserved = db.execute(
+        dialect_insert(db)(BookedSlot).values(doctor_id=doctor_id, date=day, time=at).on_conflict_do_nothing()
+    ).rowcount
+    if not reserved:
+        raise HTTPException(status_code=409, detail="This slot is already booked")
+
+def release_slot(db: Session, doctor_id: int, day: date, at: time):
+    db.query(BookedSlot).filter(
+        BookedSlot.doctor_id == doctor_id,
+        BookedSlot.date == day,
+        BookedSlot.time == at
+    ).delete(synchronize_session=False)
+
+def replace_schedule(db: Session, doctor_id: int, entries: list):
+    """Replace a doctor's weekly schedule; 400 if blocks overlap or are empty."""
+    by_weekday = defaultdict(list)
+    for entry in entries:
+        if entry.start_time >= entry.end_time:
+            raise HTTPException(status_code=400, detail="Schedule blocks must end after they start")
+        by_weekday[entry.weekday].append(entry)
+    for blocks in by_weekday.values():
+        blocks.sort(key=lambda entry: entry.start_time)
+        for previous, block in zip(blocks, blocks[1:]):
+            if block.start_time < previous.end_time:
+                raise HTTPException(status_code=400, detail="Schedule blocks on the same day overlap")
+
+    db.query(DoctorSchedule).filter(DoctorSchedule.doctor_id == doctor_id).delete(synchronize_session=False)
+    db.add_all([DoctorSchedule(doctor_id=doctor_id, **entry.model_dump()) for entry in entries])
+    db.commit()
+    invalidate_schedule(doctor_id)
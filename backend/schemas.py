@@ -1,7 +1,15 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+import json
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import Optional, List, Generic, Literal, TypeVar
 from datetime import date, time
 
+T = TypeVar("T")
+
+# Pagination envelope
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
 # User Schemas
 class UserBase(BaseModel):
     name: str
@@ -22,11 +30,24 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class SearchResult(BaseModel):
+    id: int
+    name: str
+    email: str
+    phone: str
+    role: str
+    specialization: Optional[str] = None
+
 class Token(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str
+    expires_in: int
     user: UserResponse
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 # Doctor Schemas
 class DoctorBase(BaseModel):
     specialization: str
@@ -43,6 +64,15 @@ class DoctorResponse(DoctorBase):
     class Config:
         from_attributes = True
 
+# Pharmacist Schemas
+class PharmacistResponse(BaseModel):
+    id: int
+    user_id: int
+    user: UserResponse
+    
+    class Config:
+        from_attributes = True
+
 # Patient Schemas
 class PatientBase(BaseModel):
     age: Optional[int] = None
@@ -77,12 +107,39 @@ class AppointmentResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Scheduling Schemas
+class ScheduleEntry(BaseModel):
+    weekday: int = Field(ge=0, le=6)  # 0 = Monday
+    start_time: time
+    end_time: time
+    slot_minutes: int = Field(15, ge=5, le=240)
+    
+    class Config:
+        from_attributes = True
+
+class DaySlots(BaseModel):
+    date: date
+    slots: List[time]
+
+class DoctorSlots(BaseModel):
+    doctor_id: int
+    scheduled: bool
+    days: List[DaySlots]
+
+class AvailableSlot(BaseModel):
+    date: date
+    time: time
+    doctor: DoctorResponse
+
 # Prescription Schemas
 class PrescriptionItemCreate(BaseModel):
     medicine_name: str
     dosage: str
     frequency: str
     duration: str
+    # Catalog entry the pharmacy dispenses and bills; free-text medicines have none
+    medicine_id: Optional[int] = None
+    quantity: int = Field(1, ge=1)
 
 class PrescriptionItemResponse(PrescriptionItemCreate):
     id: int
@@ -102,6 +159,8 @@ class PrescriptionResponse(BaseModel):
     doctor_id: int
     patient_id: int
     notes: Optional[str]
+    dispense_status: str
+    claimed_by: Optional[int] = None
     items: List[PrescriptionItemResponse]
     
     class Config:
@@ -110,7 +169,8 @@ class PrescriptionResponse(BaseModel):
 # Dispensary Schemas
 class DispensaryRecordCreate(BaseModel):
     prescription_id: int
-    total_amount: float
+    # Catalog medicines are priced by the server; this covers free-text ones
+    uncatalogued_amount: float = Field(0, ge=0)
     payment_status: str = "pending"
 
 class DispensaryRecordResponse(BaseModel):
@@ -123,3 +183,60 @@ class DispensaryRecordResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+# Medicine Catalog Schemas
+class MedicineCreate(BaseModel):
+    sku: str
+    name: str
+    unit_price: float = Field(ge=0)
+    stock: int = Field(0, ge=0)
+
+class MedicineUpdate(BaseModel):
+    name: Optional[str] = None
+    unit_price: Optional[float] = Field(None, ge=0)
+    # Added to the current stock; negative writes stock off
+    restock: int = 0
+
+class MedicineResponse(MedicineCreate):
+    id: int
+    
+    class Config:
+        from_attributes = True
+
+# Chatbot Schemas
+class ChatbotMessage(BaseModel):
+    message: str = ""
+
+class ChatbotBatch(BaseModel):
+    messages: List[str] = Field(max_length=100)  # per request
+
+# Bulk Import Schemas
+class PatientImport(BaseModel):
+    name: str
+    email: EmailStr
+    phone: str
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    # Either a plain password to hash, or a bcrypt hash carried over from another system
+    password: Optional[str] = None
+    password_hash: Optional[str] = None
+
+class AppointmentImport(BaseModel):
+    # Only used to look up existing users; unknown emails are reported per row
+    patient_email: str
+    doctor_email: str
+    date: date
+    time: time
+    status: Literal["scheduled", "completed", "cancelled"] = "scheduled"
+
+class PrescriptionImport(BaseModel):
+    appointment_id: int
+    notes: Optional[str] = None
+    dispense_status: Literal["pending", "dispensed"] = "pending"
+    items: List[PrescriptionItemCreate]
+    
+    @field_validator("items", mode="before")
+    @classmethod
+    def parse_items(cls, value):
+        # CSV rows carry the items as a JSON array in one column
+        return json.loads(value) if isinstance(value, str) else value
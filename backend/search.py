@@ -0,0 +1,102 @@
+"""Ranked full-text search over users and doctors' specializations.
+
+On SQLite the `user_search` FTS5 table (migration 0007) holds each user's
+name, email, phone, role and, for doctors, specialization, keyed by user id.
+Triggers on users and doctors keep it in step with every write, including
+bulk imports and raw SQL. Every word of the query must match the start of a
+word in some field ("jo 9876" finds John Doe by name and phone); words typed
+without spaces must also be adjacent, so "john.doe@ex" only finds that
+address and not every John at every "ex" domain. Results
+are ordered by bm25 with the name weighted highest, and each page continues
+from a (rank, id) cursor. Scoring costs a few microseconds per match, so
+only the first SEARCH_RANK_CANDIDATES matches (oldest accounts first) are
+ranked: a two-letter query that matches a hundred thousand users stays fast,
+and narrowing the query brings the rest into reach.
+
+Other databases have no index; there the words are matched with LIKE
+anywhere in the fields, in id order, which scans the users table.
+"""
+import os
+import re
+from typing import Iterable
+from sqlalchemy import Float, Integer, and_, column, literal_column, or_, select, table
+from sqlalchemy.orm import Session
+from models import Doctor, User
+from pagination import PageParams, paginate
+
+SEARCH_RANK_CANDIDATES = int(os.getenv("SEARCH_RANK_CANDIDATES", "2000"))
+# Words of a query used; the rest are ignored
+MAX_SEARCH_TERMS = 8
+
+# Roles each role may find
+SEARCHABLE_ROLES = {
+    "admin": ("admin", "doctor", "patient", "pharmacist"),
+    "doctor": ("doctor", "patient"),
+    "pharmacist": ("doctor", "patient"),
+    "patient": ("doctor",),
+}
+
+TERM = re.compile(r"[^\W_]+")
+
+user_search = table(
+    "user_search",
+    column("rowid", Integer), column("name"), column("email"), column("phone"), column("specialization"),
+    column("role"), column("rank", Float)
+)
+
+def search_terms(query: str) -> list:
+    """The query's whitespace-separated chunks, as lists of words."""
+    terms, count = [], 0
+    for chunk in query.lower().split():
+        words = TERM.findall(chunk)[:MAX_SEARCH_TERMS - count]
+        if words:
+            terms.append(words)
+            count += len(words)
+    return terms
+
+def match_expression(terms: Iterable[list]) -> str:
+    # One quoted phrase per chunk, so words like AND/NOT aren't operators; * makes its last word a prefix
+    return " ".join(f'"{" ".join(words)}"*' for words in terms)
+
+def search_users(db: Session, query: str, roles: Iterable[str], page: PageParams) -> dict:
+    terms = search_terms(query)
+    if not terms:
+        return {"items": [], "next_cursor": None}
+    if db.get_bind().dialect.name != "sqlite":
+        return _scan_users(db, terms, roles, page)
+
+    # FTS5 returns matches in rowid order, so the LIMIT stops the scan early
+    candidates = select(
+        user_search.c.rowid, user_search.c.name, user_search.c.email, user_search.c.phone,
+        user_search.c.role, user_search.c.specialization, user_search.c.rank
+    ).where(
+        literal_column("user_search").op("MATCH")(match_expression(terms)),
+        user_search.c.role.in_(roles)
+    ).order_by(user_search.c.rowid).limit(SEARCH_RANK_CANDIDATES).subquery()
+    page_rows = paginate(db.query(candidates), (candidates.c.rank, candidates.c.rowid), page)
+    return {
+        "items": [_result(row, row.rowid) for row in page_rows["items"]],
+        "next_cursor": page_rows["next_cursor"]
+    }
+
+def _scan_users(db: Session, terms: list, roles: Iterable[str], page: PageParams) -> dict:
+    rows = db.query(
+        User.id, User.name, User.email, User.phone, User.role, Doctor.specialization
+    ).outerjoin(Doctor, Doctor.user_id == User.id).filter(
+        User.role.in_(roles),
+        and_(*(
+            or_(*(field.ilike(f"%{word}%") for field in (User.name, User.email, User.phone, Doctor.specialization)))
+            for words in terms for word in words
+        ))
+    )
+    page_rows = paginate(rows, (User.id,), page)
+    return {
+        "items": [_result(row, row.id) for row in page_rows["items"]],
+        "next_cursor": page_rows["next_cursor"]
+    }
+
+def _result(row, user_id: int) -> dict:
+    return {
+        "id": user_id, "name": row.name, "email": row.email, "phone": row.phone, "role": row.role,
+        "specialization": row.specialization or None
+    }
@@ -1,18 +1,31 @@
+import argparse
 from sqlalchemy.orm import Session
-from db import SessionLocal, engine, Base
-from models import User, Doctor, Patient, Pharmacist, Appointment
+from db import SessionLocal
+from migrations import migrate
+from stats import reconcile
+from models import (
+    User, Doctor, Patient, Pharmacist, Appointment, AppointmentCounter, DoctorSchedule, BookedSlot,
+    Prescription, PrescriptionItem, DispensaryRecord, Medicine
+)
 from auth import get_password_hash
 from datetime import date, time, timedelta
 
 def seed_database():
-    # Create tables
-    Base.metadata.create_all(bind=engine)
+    # Create or upgrade tables
+    migrate()
     
     db = SessionLocal()
     
     try:
         # Clear existing data
+        db.query(DispensaryRecord).delete()
+        db.query(PrescriptionItem).delete()
+        db.query(Prescription).delete()
+        db.query(Medicine).delete()
         db.query(Appointment).delete()
+        db.query(AppointmentCounter).delete()
+        db.query(BookedSlot).delete()
+        db.query(DoctorSchedule).delete()
         db.query(Doctor).delete()
         db.query(Patient).delete()
         db.query(Pharmacist).delete()
@@ -93,6 +106,13 @@ def seed_database():
         db.add_all([doctor1, doctor2, doctor3])
         db.commit()
         
+        # Weekday clinics: 9:00-13:00 and 14:00-17:00 in 15-minute slots
+        for doctor in (doctor1, doctor2, doctor3):
+            for weekday in range(5):
+                db.add(DoctorSchedule(doctor_id=doctor.id, weekday=weekday, start_time=time(9, 0), end_time=time(13, 0)))
+                db.add(DoctorSchedule(doctor_id=doctor.id, weekday=weekday, start_time=time(14, 0), end_time=time(17, 0)))
+        db.commit()
+        
         # Create patient
         patient = Patient(
             user_id=patient_user.id,
@@ -130,8 +150,28 @@ def seed_database():
         )
         
         db.add_all([appointment1, appointment2])
+        db.add_all([
+            BookedSlot(doctor_id=appointment.doctor_id, date=appointment.date, time=appointment.time)
+            for appointment in (appointment1, appointment2)
+        ])
         db.commit()
         
+        # Medicine catalog
+        db.add_all([
+            Medicine(sku=sku, name=name, unit_price=unit_price, stock=500)
+            for sku, name, unit_price in [
+                ("MED-0001", "Paracetamol 500mg Tablet", 1.5), ("MED-0002", "Amoxicillin 250mg Capsule", 6.0),
+                ("MED-0003", "Ibuprofen 400mg Tablet", 2.0), ("MED-0004", "Cetirizine 10mg Tablet", 1.2),
+                ("MED-0005", "Metformin 500mg Tablet", 1.8), ("MED-0006", "Atorvastatin 20mg Tablet", 5.5),
+                ("MED-0007", "Omeprazole 20mg Capsule", 3.0), ("MED-0008", "Azithromycin 500mg Tablet", 12.0),
+                ("MED-0009", "Amlodipine 5mg Tablet", 2.2), ("MED-0010", "Vitamin D3 1000IU Capsule", 4.0)
+            ]
+        ])
+        db.commit()
+        
+        # Rebuild statistics counters for the new data
+        reconcile(db)
+        
         print("✅ Database seeded successfully!")
         print("\n📋 Test Credentials:")
         print("Admin: admin@hospify.com / admin123")
@@ -145,5 +185,29 @@ def seed_database():
     finally:
         db.close()
 
+def seed_synthetic(**sizes):
+    from synthetic import SYNTHETIC_PASSWORD, EMAIL_DOMAIN, generate
+    
+    with SessionLocal() as db:
+        counts = generate(db, **sizes)
+    
+    print("\n📦 Synthetic data:")
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"Synthetic accounts: <role><n>@{EMAIL_DOMAIN} / {SYNTHETIC_PASSWORD}")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the database, optionally with synthetic load-test data")
+    parser.add_argument("--doctors", type=int, default=0)
+    parser.add_argument("--patients", type=int, default=0)
+    parser.add_argument("--pharmacists", type=int, default=0)
+    parser.add_argument("--appointments", type=int, default=0)
+    parser.add_argument("--prescriptions", type=int, default=0)
+    parser.add_argument("--medicines", type=int, default=0, help="generated catalog SKUs")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic data")
+    args = parser.parse_args()
+    
     seed_database()
+    sizes = vars(args)
+    if any(count for name, count in sizes.items() if name != "seed"):
+        seed_synthetic(**sizes)
@@ -0,0 +1,48 @@
+"""JSON rendering for responses.
+
+FastAPI serializes a `response_model` endpoint's return value in three steps:
+it validates the value into the model, dumps that back to Python
+primitives, and encodes them with the `json` module. The app's default
+response class encodes with orjson instead (when installed), which takes
+care of the last step for every endpoint.
+
+Large lists can skip the rest. `render` validates and encodes in one pass
+through pydantic-core, with a TypeAdapter built once per schema. Endpoints
+that select plain columns instead of loading ORM objects (see
+queries.appointment_rows) already hold the exact JSON structure, so
+`render_rows` hands it straight to orjson. Either way the endpoint keeps its
+`response_model`, which still documents the response.
+"""
+from functools import lru_cache
+from typing import Any
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson  # optional; the stdlib encoder is used without it
+except ImportError:
+    orjson = None
+
+DefaultResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+@lru_cache(maxsize=None)
+def adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+def dump_json(schema, value: Any) -> bytes:
+    """`value` (ORM objects, dicts or a mix) validated against `schema` and encoded."""
+    schema_adapter = adapter(schema)
+    return schema_adapter.dump_json(schema_adapter.validate_python(value, from_attributes=True))
+
+def render(schema, value: Any) -> Response:
+    return Response(content=dump_json(schema, value), media_type="application/json")
+
+def render_rows(schema, value: Any) -> Response:
+    """Render `value`, built from database rows already in the shape of `schema`.
+
+    It's encoded as is with orjson; without orjson it goes through `render`.
+    Dates and times come out in the same ISO format either way.
+    """
+    if orjson is None:
+        return render(schema, value)
+    return Response(content=orjson.dumps(value), media_type="application/json")
@@ -0,0 +1,57 @@
+"""Run the API as several uvicorn worker processes.
+
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 8000]
+
+Workers default to WEB_CONCURRENCY, or one per CPU core. Before starting
+them this applies pending migrations once, so the workers don't race to
+apply them. It also sizes each worker's password-hashing pool to its share
+of the cores, and points the workers at a shared-state backend
+(shared_state.py), so caches and live events stay consistent between them.
+Unless SHARED_STATE_URL is set, that backend is a SQLite file, recreated on
+every launch.
+
+Under gunicorn, do the same by hand: run `python migrations.py`, set
+DB_MIGRATE_ON_STARTUP=false, SHARED_STATE_URL and PASSWORD_HASH_WORKERS, then start
+`gunicorn main:app -k uvicorn.workers.UvicornWorker -w N`.
+"""
+import argparse
+import os
+import uvicorn
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+SHARED_STATE_FILE = os.getenv("SHARED_STATE_FILE", "hospify-shared.db")
+
+def prepare_environment(workers: int):
+    """Settings the workers inherit; must run before anything imports db or shared_state."""
+    cores = os.cpu_count() or 1
+    # main() applies the migrations before the workers start
+    os.environ["DB_MIGRATE_ON_STARTUP"] = "false"
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, cores // workers)))
+    if workers > 1 and "SHARED_STATE_URL" not in os.environ:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(SHARED_STATE_FILE + suffix):
+                os.remove(SHARED_STATE_FILE + suffix)
+        os.environ["SHARED_STATE_URL"] = f"sqlite:///{SHARED_STATE_FILE}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    prepare_environment(args.workers)
+    from db import get_engine
+    from migrations import migrate
+
+    engine = get_engine()
+    if args.workers > 1 and engine.url.get_backend_name() == "sqlite" and engine.url.database in (None, "", ":memory:"):
+        raise SystemExit("An in-memory SQLite database can't be shared between workers; set DATABASE_URL to a file")
+    migrate()
+    engine.dispose()
+
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, log_level=args.log_level)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""State shared between API worker processes.
+
+Caches, the event bus and their invalidations live in each process. When
+the API runs as several workers (see serve.py), the process that makes a
+change broadcasts it and every other worker applies it to its own copy.
+Counters give the workers numbers they agree on, such as table versions and
+leases on periodic jobs.
+
+SHARED_STATE_URL picks the backend:
+
+- `memory://` (default): a single process; broadcasts go nowhere.
+- `sqlite:///path/to/file.db`: workers on one machine share a SQLite file.
+  Broadcasts are rows that every worker polls for, so nothing else needs to
+  run. serve.py sets this up on its own.
+- `redis://host:6379/0`: Redis pub/sub and INCRBY for workers on several
+  machines. Needs the `redis` package.
+
+Handlers registered with `on()` run on the event loop thread, in the order
+the messages were broadcast.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "memory://")
+# How often SQLite-backed workers look for broadcasts, and how long those are kept
+SHARED_STATE_POLL_INTERVAL_MS = int(os.getenv("SHARED_STATE_POLL_INTERVAL_MS", "50"))
+SHARED_STATE_RETENTION_SECONDS = int(os.getenv("SHARED_STATE_RETENTION_SECONDS", "60"))
+REDIS_KEY_PREFIX = "hospify:"
+
+class SharedState(ABC):
+    """Broadcasts to the other workers plus shared counters."""
+    shared = True
+
+    def __init__(self):
+        # Lets a worker recognise (and skip) its own broadcasts
+        self.sender = uuid.uuid4().hex
+        self._handlers = defaultdict(list)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def on(self, channel: str, handler: Callable):
+        """Call `handler(payload)` for every broadcast on `channel` from another worker."""
+        self._handlers[channel].append(handler)
+
+    @abstractmethod
+    def broadcast(self, channel: str, payload):
+        """Send a JSON-serializable payload to every other worker."""
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add to a counter and return its new value. A counter created with
+        `ttl` starts over from zero once that many seconds have passed."""
+
+    @abstractmethod
+    def get(self, key: str) -> int:
+        """A counter's value; 0 if it doesn't exist or has expired."""
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def stop(self):
+        self._loop = None
+
+    def _dispatch(self, channel: str, sender: str, payload):
+        # Called from the listener thread
+        if sender == self.sender or self._loop is None:
+            return
+        for handler in self._handlers.get(channel, ()):
+            self._loop.call_soon_threadsafe(handler, payload)
+
+class MemoryState(SharedState):
+    """A single process: no one to broadcast to, counters in a dict. Counters
+    with a ttl are dropped once they expire: when next read, or by a sweep
+    every `sweep_interval` seconds, since windowed keys such as the rate
+    limiter's are never read again once their window has passed."""
+    shared = False
+
+    def __init__(self, sweep_interval: float = SHARED_STATE_RETENTION_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._swept_at = clock()
+
+    def broadcast(self, channel: str, payload):
+        pass
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = self.clock()
+        with self._lock:
+            if now - self._swept_at >= self.sweep_interval:
+                self._counters = {
+                    key: entry for key, entry in self._counters.items() if entry[1] is None or entry[1] > now
+                }
+                self._swept_at = now
+            value, expires_at = self._counters.get(key, (0, None))
+            if value == 0 or (expires_at is not None and expires_at <= now):
+                value, expires_at = 0, now + ttl if ttl is not None else None
+            self._counters[key] = (value + amount, expires_at)
+            return value + amount
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            value, expires_at = self._counters.get(key, (0, None))
+            if expires_at is not None and expires_at <= self.clock():
+                del self._counters[key]
+                return 0
+            return value
+
+class SQLiteState(SharedState):
+    """Workers on one machine sharing a SQLite file in WAL mode. A listener
+    thread per worker polls the messages table for rows it hasn't seen."""
+
+    def __init__(self, path: str, poll_interval: float = SHARED_STATE_POLL_INTERVAL_MS / 1000,
+                 retention: float = SHARED_STATE_RETENTION_SECONDS):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._connections = threading.local()
+        self._stopping = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "channel TEXT NOT NULL, sender TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._connections, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._connections.conn = conn
+        return conn
+
+    def broadcast(self, channel: str, payload):
+        self._connection().execute(
+            "INSERT INTO messages (channel, sender, payload, created_at) VALUES (?, ?, ?, ?)",
+            (channel, self.sender, json.dumps(payload), time.time())
+        )
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        # An expired counter is replaced as if it had never existed
+        return self._connection().execute(
+            "INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING value",
+            (key, amount, expires_at, now, now)
+        ).fetchone()[0]
+
+    def get(self, key: str) -> int:
+        row = self._connection().execute(
+            "SELECT value FROM counters WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        super().start(loop)
+        self._stopping.clear()
+        self._listener = threading.Thread(target=self._listen, name="shared-state-listener", daemon=True)
+        self._listener.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+        super().stop()
+
+    def _listen(self):
+        conn = self._connection()
+        # Broadcasts from before this worker started are already reflected in the database
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+        pruned_at = time.monotonic()
+        while not self._stopping.wait(self.poll_interval):
+            rows = conn.execute(
+                "SELECT id, channel, sender, payload FROM messages WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+            for message_id, channel, sender, payload in rows:
+                last_id = message_id
+                self._dispatch(channel, sender, json.loads(payload))
+            if time.monotonic() - pruned_at > self.retention:
+                conn.execute("DELETE FROM messages WHERE created_at < ?", (time.time() - self.retention,))
+                conn.execute("DELETE FROM counters WHERE expires_at <= ?", (time.time(),))
+                pruned_at = time.monotonic()
+
+class RedisState(SharedState):
+    """Redis (or a protocol-compatible server such as Valkey or KeyDB) pub/sub and counters."""
+
+    def __init__(self, url: str, prefix: str = REDIS_KEY_PREFIX):
+        super().__init__()
+        import redis  # optional dependency, only needed for this backend
+
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._listener = None
+
+    def broadcast(self, channel: str, payload):
+        self.client.publish(self.prefix + channel, json.dumps({"sender": self.sender, "payload": payload}))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = self.client.incrby(self.prefix + key, amount)
+        # Whoever creates the counter starts its window
+        if ttl is not None and value == amount:
+            self.client.pexpire(self.prefix + key, int(ttl * 1000))
+        return value
+
+    def get(self, key: str) -> int:
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        super().start(loop)
+
+        def on_message(message):
+            channel = message["channel"].decode()[len(self.prefix):]
+            envelope = json.loads(message["data"])
+            self._dispatch(channel, envelope["sender"], envelope["payload"])
+
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(**{self.prefix + "*": on_message})
+        self._listener = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+            self._pubsub.close()
+        super().stop()
+
+def build_state(url: str = SHARED_STATE_URL) -> SharedState:
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryState()
+    if parsed.scheme == "sqlite":
+        # sqlite:///relative.db or sqlite:////absolute/path.db, as in DATABASE_URL
+        return SQLiteState(parsed.path[1:])
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisState(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+state = build_state()
@@ -0,0 +1,182 @@
+import os
+from datetime import date, timedelta
+from typing import Optional
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from db import dialect_insert
+from models import StatCounter, Doctor, Patient, Pharmacist, Appointment, Prescription
+
+# How often the background job rebuilds every counter from the base tables
+STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv("STATS_RECONCILE_INTERVAL_SECONDS", "3600"))
+
+ROLE_COUNTERS = {"doctor": "doctors", "patient": "patients", "pharmacist": "pharmacists"}
+
+def stat_key(*parts) -> str:
+    return ".".join(str(part) for part in parts)
+
+def bump(db: Session, key: str, delta: int = 1):
+    """Add `delta` to a counter inside the caller's transaction."""
+    insert_stmt = dialect_insert(db)(StatCounter).values(key=key, value=delta)
+    db.execute(insert_stmt.on_conflict_do_update(
+        index_elements=[StatCounter.key],
+        set_={"value": StatCounter.value + delta}
+    ))
+
+def bump_many(db: Session, deltas: dict):
+    """Apply several counter deltas with one executemany upsert, for bulk writes."""
+    if not deltas:
+        return
+    insert_stmt = dialect_insert(db)(StatCounter)
+    db.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=[StatCounter.key],
+            set_={"value": StatCounter.value + insert_stmt.excluded.value}
+        ),
+        [{"key": key, "value": delta} for key, delta in deltas.items()]
+    )
+
+# ==================== WRITE HOOKS ====================
+
+def record_signup(db: Session, role: str, department: Optional[str] = None):
+    if role in ROLE_COUNTERS:
+        bump(db, ROLE_COUNTERS[role])
+    if role == "doctor":
+        bump(db, stat_key("doctors", "department", department))
+
+def record_doctor_deleted(db: Session, department: str):
+    bump(db, "doctors", -1)
+    bump(db, stat_key("doctors", "department", department), -1)
+
+def record_appointment_booked(db: Session, day: date, department: str):
+    bump(db, stat_key("appointments", "date", day.isoformat()))
+    bump(db, stat_key("appointments", "date", day.isoformat(), "department", department))
+
+def record_appointment_completed(db: Session, department: str):
+    bump(db, "appointments.completed")
+    bump(db, stat_key("appointments", "completed", "department", department))
+
+def record_prescription_created(db: Session):
+    bump(db, "prescriptions.pending")
+
+def record_prescription_dispensed(db: Session):
+    bump(db, "prescriptions.pending", -1)
+
+# ==================== READS ====================
+
+def read_summary(db: Session, today: date) -> dict:
+    today_key = stat_key("appointments", "date", today.isoformat())
+    keys = {
+        "total_doctors": "doctors",
+        "total_patients": "patients",
+        "total_pharmacists": "pharmacists",
+        "today_appointments": today_key,
+        "completed_appointments": "appointments.completed",
+        "pending_prescriptions": "prescriptions.pending",
+    }
+    values = dict(db.query(StatCounter.key, StatCounter.value).filter(StatCounter.key.in_(keys.values())).all())
+    return {name: values.get(key, 0) for name, key in keys.items()}
+
+def _by_prefix(db: Session, prefix: str) -> dict:
+    rows = db.query(StatCounter.key, StatCounter.value).filter(
+        StatCounter.key > prefix, StatCounter.key < prefix + "\uffff"
+    ).all()
+    return {key[len(prefix):]: value for key, value in rows if value}
+
+def read_breakdown(db: Session, date_from: date, date_to: date) -> dict:
+    appointments_by_day = {}
+    day = date_from
+    while day <= date_to:
+        appointments_by_day[day.isoformat()] = {"total": 0, "by_department": {}}
+        day += timedelta(days=1)
+
+    # Keys look like appointments.date.<day> and appointments.date.<day>.department.<name>
+    prefix = "appointments.date."
+    rows = db.query(StatCounter.key, StatCounter.value).filter(
+        StatCounter.key >= prefix + date_from.isoformat(),
+        StatCounter.key < prefix + date_to.isoformat() + "\uffff"
+    ).all()
+    for key, value in rows:
+        day_key, _, department = key[len(prefix):].partition(".department.")
+        if day_key not in appointments_by_day:
+            continue
+        if department:
+            appointments_by_day[day_key]["by_department"][department] = value
+        else:
+            appointments_by_day[day_key]["total"] = value
+
+    return {
+        "doctors_by_department": _by_prefix(db, "doctors.department."),
+        "completed_by_department": _by_prefix(db, "appointments.completed.department."),
+        "appointments_by_day": appointments_by_day,
+    }
+
+# ==================== RECONCILIATION ====================
+
+def compute_counters(db: Session) -> dict:
+    """Recount every statistic from the base tables."""
+    counters = {
+        "doctors": db.query(func.count(Doctor.id)).scalar(),
+        "patients": db.query(func.count(Patient.id)).scalar(),
+        "pharmacists": db.query(func.count(Pharmacist.id)).scalar(),
+        "appointments.completed": db.query(func.count(Appointment.id)).filter(
+            Appointment.status == "completed"
+        ).scalar(),
+        "prescriptions.pending": db.query(func.count(Prescription.id)).filter(
+            Prescription.dispense_status != "dispensed"
+        ).scalar(),
+    }
+
+    for department, count in db.query(Doctor.department, func.count(Doctor.id)).group_by(Doctor.department):
+        counters[stat_key("doctors", "department", department)] = count
+
+    for day, count in db.query(Appointment.date, func.count(Appointment.id)).group_by(Appointment.date):
+        counters[stat_key("appointments", "date", day.isoformat())] = count
+
+    by_department = db.query(
+        Appointment.date, Appointment.status, Doctor.department, func.count(Appointment.id)
+    ).join(Doctor, Appointment.doctor_id == Doctor.id).group_by(
+        Appointment.date, Appointment.status, Doctor.department
+    )
+    for day, status, department, count in by_department:
+        day_key = stat_key("appointments", "date", day.isoformat(), "department", department)
+        counters[day_key] = counters.get(day_key, 0) + count
+        if status == "completed":
+            completed_key = stat_key("appointments", "completed", "department", department)
+            counters[completed_key] = counters.get(completed_key, 0) + count
+
+    return counters
+
+def begin_snapshot(db: Session):
+    """Start a read transaction that sees one point in time throughout,
+    without holding up writers."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        # The driver would only begin at the first write; in WAL mode a read transaction keeps its snapshot
+        db.execute(text("BEGIN"))
+    elif dialect == "postgresql":
+        db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+
+def reconcile(db: Session) -> dict:
+    """Correct any drift in the counters and return the recounted values.
+
+    The recount and the counters it's compared with come from one snapshot,
+    read without locking, so bookings and dispenses carry on during the
+    GROUP BY scans. Only the differences are written back, as deltas, so
+    bumps committed in the meantime survive."""
+    begin_snapshot(db)
+    counters = compute_counters(db)
+    stored = dict(db.query(StatCounter.key, StatCounter.value).all())
+    db.rollback()
+
+    drift = {key: counters.get(key, 0) - stored.get(key, 0) for key in counters.keys() | stored.keys()}
+    bump_many(db, {key: delta for key, delta in drift.items() if delta})
+    db.query(StatCounter).filter(StatCounter.value == 0).delete(synchronize_session=False)
+    db.commit()
+    return counters
+
+if __name__ == "__main__":
+    from db import SessionLocal
+
+    with SessionLocal() as session:
+        reconciled = reconcile(session)
+    print(f"✅ Reconciled {len(reconciled)} statistics counters")
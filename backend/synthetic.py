@@ -0,0 +1,283 @@
+"""Synthetic hospital data at load-test scale.
+
+`python seed.py --doctors 1000 --patients 100000 --appointments 1000000
+--prescriptions 500000` runs the regular seed and then `generate`. Rows are
+built in Python and written with executemany inserts in batches; ids are
+assigned up front so appointments, prescriptions and their items can point
+at each other without reading anything back. Every generated account uses
+SYNTHETIC_PASSWORD, hashed once.
+
+`--medicines N` adds a catalog of N generated SKUs (made-up drug names in
+several strengths and forms) for the typeahead; the items of generated
+prescriptions stay free text.
+
+Appointments fill the doctors' calendars with 15-minute slots over a window
+that is mostly in the past (completed or cancelled) and partly ahead
+(scheduled). Prescriptions are drawn from completed appointments; most are
+dispensed. Token counters, booked slots and statistics are kept consistent
+with the generated rows.
+"""
+import os
+import random
+from array import array
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+from auth import get_password_hash
+from models import (
+    User, Doctor, Patient, Pharmacist, Appointment, AppointmentCounter, DoctorSchedule, BookedSlot,
+    Prescription, PrescriptionItem, DispensaryRecord, Medicine
+)
+from stats import reconcile
+
+SYNTHETIC_BATCH_SIZE = int(os.getenv("SYNTHETIC_BATCH_SIZE", "5000"))
+SYNTHETIC_PASSWORD = "password123"
+EMAIL_DOMAIN = "load.hospify.com"
+
+SPECIALIZATIONS = [
+    "Cardiology", "Dermatology", "Orthopedics", "Neurology", "Pediatrics", "Gynecology",
+    "ENT", "Ophthalmology", "Psychiatry", "Oncology", "Gastroenterology", "General"
+]
+FIRST_NAMES = [
+    "Aarav", "Aditi", "Akash", "Ananya", "Arjun", "Deepa", "Divya", "Farhan", "Gaurav", "Ishaan", "Kavya", "Kiran",
+    "Meera", "Mohan", "Neha", "Nikhil", "Pooja", "Priya", "Rahul", "Ravi", "Riya", "Rohan", "Sameer", "Sana",
+    "Sanjay", "Shreya", "Sneha", "Suresh", "Tanvi", "Varun", "Vikram", "Zara", "John", "Mary", "David", "Sarah"
+]
+LAST_NAMES = [
+    "Agarwal", "Bose", "Chopra", "Das", "Desai", "Gupta", "Iyer", "Jain", "Joshi", "Kapoor", "Khan", "Kulkarni",
+    "Kumar", "Malhotra", "Mehta", "Menon", "Mishra", "Nair", "Pandey", "Patel", "Pillai", "Rao", "Reddy", "Saxena",
+    "Shah", "Sharma", "Singh", "Sinha", "Tiwari", "Verma", "Yadav", "Fernandes", "Smith", "Brown", "Wilson", "Thomas"
+]
+MEDICINES = [
+    ("Paracetamol", "500mg"), ("Amoxicillin", "250mg"), ("Ibuprofen", "400mg"), ("Cetirizine", "10mg"),
+    ("Metformin", "500mg"), ("Atorvastatin", "20mg"), ("Omeprazole", "20mg"), ("Azithromycin", "500mg"),
+    ("Amlodipine", "5mg"), ("Vitamin D3", "1000IU")
+]
+# Parts of generated catalog names, e.g. "Dravifenazole 250mg Tablet"
+NAME_SYLLABLES = ["a", "be", "ci", "dra", "fe", "ga", "lo", "mi", "no", "pra", "ri", "sta", "to", "vi", "xa", "zo"]
+NAME_SUFFIXES = ["mab", "pril", "olol", "statin", "cillin", "azole", "tine", "pam", "done", "mycin", "sartan", "fen"]
+STRENGTHS = ["5mg", "10mg", "20mg", "50mg", "100mg", "250mg", "500mg", "1g"]
+FORMS = ["Tablet", "Capsule", "Syrup", "Injection", "Cream", "Drops"]
+FREQUENCIES = ["Once daily", "Twice daily", "Three times daily", "At bedtime"]
+DURATIONS = ["3 days", "5 days", "7 days", "14 days", "30 days"]
+
+# Clinic blocks and slot length shared by every synthetic doctor
+CLINIC_BLOCKS = [(time(9, 0), time(13, 0)), (time(14, 0), time(17, 0))]
+SLOT_MINUTES = 15
+# Share of a working day's slots that get booked
+BOOKING_FILL = 0.5
+# Share of the appointments that lie before today
+PAST_FRACTION = 0.8
+
+def synthetic_email(role: str, n: int) -> str:
+    return f"{role}{n}@{EMAIL_DOMAIN}"
+
+def clinic_slots() -> list:
+    slots = []
+    for start, end in CLINIC_BLOCKS:
+        at = datetime.combine(date.min, start)
+        while at + timedelta(minutes=SLOT_MINUTES) <= datetime.combine(date.min, end):
+            slots.append(at.time())
+            at += timedelta(minutes=SLOT_MINUTES)
+    return slots
+
+def working_days(doctor_index: int) -> set:
+    # Five days a week with the two days off rotating, so every day has clinics
+    off = doctor_index % 7
+    return set(range(7)) - {off, (off + 1) % 7}
+
+def medicine_name(rng: random.Random) -> str:
+    stem = "".join(rng.choice(NAME_SYLLABLES) for _ in range(rng.randint(2, 3))) + rng.choice(NAME_SUFFIXES)
+    return f"{stem.capitalize()} {rng.choice(STRENGTHS)} {rng.choice(FORMS)}"
+
+def _next_id(db: Session, model) -> int:
+    return (db.query(func.max(model.id)).scalar() or 0) + 1
+
+def _insert(db: Session, model, rows: Iterable[dict], batch_size: int) -> int:
+    written, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.execute(insert(model), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db.execute(insert(model), batch)
+        written += len(batch)
+    return written
+
+def _reset_sequences(db: Session, models: list):
+    # Explicit ids leave PostgreSQL's serial sequences behind
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for model in models:
+        table = model.__tablename__
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+def generate(
+    db: Session,
+    doctors: int = 0,
+    patients: int = 0,
+    pharmacists: int = 0,
+    appointments: int = 0,
+    prescriptions: int = 0,
+    medicines: int = 0,
+    seed: int = 0,
+    batch_size: int = SYNTHETIC_BATCH_SIZE
+) -> dict:
+    """Add synthetic rows to a freshly seeded database; returns the row counts written."""
+    if appointments and not (doctors and patients):
+        raise ValueError("Appointments need at least one doctor and one patient")
+    if prescriptions and not pharmacists:
+        raise ValueError("Prescriptions need at least one pharmacist")
+
+    rng = random.Random(seed)
+    password_hash = get_password_hash(SYNTHETIC_PASSWORD)
+    counts = {}
+
+    # ---- Accounts ----
+    first_user = _next_id(db, User)
+    first_doctor, first_patient, first_pharmacist = (
+        _next_id(db, Doctor), _next_id(db, Patient), _next_id(db, Pharmacist)
+    )
+    accounts = [("doctor", doctors), ("patient", patients), ("pharmacist", pharmacists)]
+
+    def users() -> Iterator[dict]:
+        user_id = first_user
+        for role, count in accounts:
+            for n in range(count):
+                yield {
+                    "id": user_id, "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", "email": synthetic_email(role, n),
+                    "phone": f"9{user_id:09d}", "password_hash": password_hash, "role": role
+                }
+                user_id += 1
+
+    counts["users"] = _insert(db, User, users(), batch_size)
+    counts["doctors"] = _insert(db, Doctor, (
+        {"id": first_doctor + n, "user_id": first_user + n,
+         "specialization": SPECIALIZATIONS[n % len(SPECIALIZATIONS)],
+         "department": SPECIALIZATIONS[n % len(SPECIALIZATIONS)]}
+        for n in range(doctors)
+    ), batch_size)
+    counts["patients"] = _insert(db, Patient, (
+        {"id": first_patient + n, "user_id": first_user + doctors + n,
+         "age": rng.randint(1, 90), "gender": rng.choice(("male", "female"))}
+        for n in range(patients)
+    ), batch_size)
+    counts["pharmacists"] = _insert(db, Pharmacist, (
+        {"id": first_pharmacist + n, "user_id": first_user + doctors + patients + n}
+        for n in range(pharmacists)
+    ), batch_size)
+    counts["doctor_schedules"] = _insert(db, DoctorSchedule, (
+        {"doctor_id": first_doctor + n, "weekday": weekday, "start_time": start, "end_time": end,
+         "slot_minutes": SLOT_MINUTES}
+        for n in range(doctors) for weekday in sorted(working_days(n)) for start, end in CLINIC_BLOCKS
+    ), batch_size)
+
+    counts["medicines"] = _insert(db, Medicine, (
+        {"sku": f"SYN-{n:07d}", "name": medicine_name(rng), "unit_price": round(rng.uniform(2, 500), 2),
+         "stock": rng.randint(0, 1000)}
+        for n in range(medicines)
+    ), batch_size)
+
+    # ---- Appointments ----
+    today = date.today()
+    slots = clinic_slots()
+    per_day = doctors * len(slots) * BOOKING_FILL * 5 / 7 if doctors else 1
+    window_days = max(1, int(appointments / per_day) + 1)
+    first_day = today - timedelta(days=int(window_days * PAST_FRACTION))
+    first_appointment = _next_id(db, Appointment)
+    # Completed appointments as parallel arrays; prescriptions are sampled from them
+    completed_ids, completed_doctors, completed_patients = array("q"), array("q"), array("q")
+    booked, counters = [], []
+    counts["booked_slots"] = 0
+
+    def flush_booked():
+        if booked:
+            db.execute(insert(BookedSlot), booked)
+            counts["booked_slots"] += len(booked)
+            booked.clear()
+
+    def appointment_rows() -> Iterator[dict]:
+        appointment_id, remaining, day = first_appointment, appointments, first_day
+        while remaining > 0:
+            for n in range(doctors):
+                if day.weekday() not in working_days(n):
+                    continue
+                doctor_id, token = first_doctor + n, 0
+                for at in slots:
+                    if remaining == 0 or rng.random() >= BOOKING_FILL:
+                        continue
+                    if day < today:
+                        status = "completed" if rng.random() < 0.85 else "cancelled"
+                    elif day == today:
+                        status = "scheduled"
+                    else:
+                        status = "scheduled" if rng.random() < 0.93 else "cancelled"
+
+                    patient_id = first_patient + rng.randrange(patients)
+                    token += 1
+                    remaining -= 1
+                    yield {
+                        "id": appointment_id, "patient_id": patient_id, "doctor_id": doctor_id, "date": day,
+                        "time": at, "token_number": token, "status": status
+                    }
+                    if status != "cancelled":
+                        booked.append({"doctor_id": doctor_id, "date": day, "time": at})
+                    if status == "completed":
+                        completed_ids.append(appointment_id)
+                        completed_doctors.append(doctor_id)
+                        completed_patients.append(patient_id)
+                    appointment_id += 1
+                if token:
+                    counters.append({"doctor_id": doctor_id, "date": day, "last_token": token})
+                if len(booked) >= batch_size:
+                    flush_booked()
+            day += timedelta(days=1)
+
+    counts["appointments"] = _insert(db, Appointment, appointment_rows(), batch_size) if appointments else 0
+    flush_booked()
+    counts["appointment_counters"] = _insert(db, AppointmentCounter, counters, batch_size)
+
+    # ---- Prescriptions ----
+    prescriptions = min(prescriptions, len(completed_ids))
+    chosen = sorted(rng.sample(range(len(completed_ids)), prescriptions))
+    first_prescription = _next_id(db, Prescription)
+    dispensed = []
+
+    def prescription_rows() -> Iterator[dict]:
+        for offset, index in enumerate(chosen):
+            prescription_id = first_prescription + offset
+            # The newest tenth is still waiting at the pharmacy
+            status = "dispensed" if offset < prescriptions * 0.9 else "pending"
+            if status == "dispensed":
+                dispensed.append(prescription_id)
+            yield {
+                "id": prescription_id, "appointment_id": completed_ids[index],
+                "doctor_id": completed_doctors[index], "patient_id": completed_patients[index],
+                "notes": "Follow up if symptoms persist", "dispense_status": status
+            }
+
+    def item_rows() -> Iterator[dict]:
+        for offset in range(prescriptions):
+            for medicine, dosage in rng.sample(MEDICINES, rng.randint(1, 3)):
+                yield {
+                    "prescription_id": first_prescription + offset, "medicine_name": medicine,
+                    "dosage": dosage, "frequency": rng.choice(FREQUENCIES), "duration": rng.choice(DURATIONS)
+                }
+
+    counts["prescriptions"] = _insert(db, Prescription, prescription_rows(), batch_size)
+    counts["prescription_items"] = _insert(db, PrescriptionItem, item_rows(), batch_size)
+    counts["dispensary_records"] = _insert(db, DispensaryRecord, (
+        {"prescription_id": prescription_id, "pharmacist_id": first_pharmacist + rng.randrange(pharmacists),
+         "total_amount": round(rng.uniform(50, 2000), 2), "payment_status": "paid"}
+        for prescription_id in dispensed
+    ), batch_size)
+
+    _reset_sequences(db, [User, Doctor, Patient, Pharmacist, Appointment, Prescription])
+    db.commit()
+    reconcile(db)
+    return counts
@@ -0,0 +1,75 @@
+"""Fixtures for the API tests: apps built by create_app on throwaway SQLite databases.
+
+Run from backend/ with `python -m pytest`.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from auth import create_access_token
+from db import Database
+from main import Settings, create_app
+from migrations import migrate
+from models import User
+from stats import reconcile
+from synthetic import generate
+
+# The busiest account of each role, so the list endpoints have rows to return
+BUSIEST_USERS = {
+    "admin": "SELECT id FROM users WHERE role = 'admin'",
+    "doctor": "SELECT d.user_id FROM appointments a JOIN doctors d ON d.id = a.doctor_id "
+              "GROUP BY d.user_id ORDER BY COUNT(*) DESC LIMIT 1",
+    "patient": "SELECT p.user_id FROM appointments a JOIN patients p ON p.id = a.patient_id "
+               "GROUP BY p.user_id ORDER BY COUNT(*) DESC LIMIT 1",
+    "pharmacist": "SELECT id FROM users WHERE role = 'pharmacist' ORDER BY id LIMIT 1",
+}
+
+def seed(url: str, **sizes) -> dict:
+    """Migrate the database at `url` and fill it with synthetic rows (see
+    synthetic.py) and an admin. Returns a user id for each role."""
+    database = Database(url, use_async=False)
+    migrate(database.engine)
+    with database.session() as db:
+        generate(db, **sizes)
+        db.add(User(name="Admin", email="admin@hospify.com", phone="0", password_hash="x", role="admin"))
+        db.commit()
+        reconcile(db)
+        users = {role: db.execute(text(query)).scalar() for role, query in BUSIEST_USERS.items()}
+    database.engine.dispose()
+    return users
+
+def bearer(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id), 'ver': 0})}"}
+
+@pytest.fixture
+def database_url(tmp_path) -> str:
+    return f"sqlite:///{tmp_path / 'test.db'}"
+
+def client_factory():
+    clients = []
+
+    def make(url: str, **settings) -> TestClient:
+        client = TestClient(create_app(Settings(database_url=url, **{"rate_limit": False, **settings})))
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.__exit__(None, None, None)
+
+@pytest.fixture
+def make_client():
+    """Starts an app on a database, with rate limiting off unless asked for; stopped after the test."""
+    yield from client_factory()
+
+@pytest.fixture(scope="module")
+def make_module_client():
+    """make_client for module-scoped fixtures; its apps are stopped after the module."""
+    yield from client_factory()
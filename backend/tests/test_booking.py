@@ -0,0 +1,122 @@
+"""Token numbers stay dense and unique when patients book in parallel (tokens.py),
+and slots are held only where the doctor keeps a schedule (scheduling.py)."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+from sqlalchemy import event, insert
+import metrics
+from models import Appointment, AppointmentCounter, Doctor, Patient, User
+from conftest import bearer, seed
+
+BOOKINGS = 300
+THREADS = 32
+CROWD = 3000
+
+def queue_doctor(client) -> int:
+    """Signs up a doctor without a weekly schedule, who can be booked at any
+    time by any number of patients. Returns the doctor id."""
+    response = client.post("/auth/signup", json={
+        "name": "Dr. Queue", "email": "queue@hospify.com", "phone": "1", "password": "queue123", "role": "doctor"
+    })
+    assert response.status_code == 200, response.text
+    with client.app.state.database.session() as db:
+        return db.query(Doctor.id).join(User).filter(User.email == "queue@hospify.com").scalar()
+
+def test_parallel_bookings_get_dense_unique_tokens(database_url, make_client):
+    seed(database_url, patients=20)
+    client = make_client(database_url)
+    doctor_id = queue_doctor(client)
+    with client.app.state.database.session() as db:
+        patients = [bearer(user_id) for user_id, in db.query(User.id).filter(User.role == "patient")]
+
+    day = (date.today() + timedelta(days=7)).isoformat()
+
+    def book(n: int):
+        response = client.post("/patient/appointments", headers=patients[n % len(patients)], json={
+            "doctor_id": doctor_id, "date": day, "time": ("09:00", "09:30")[n % 2]
+        })
+        assert response.status_code == 200, response.text
+        return response.json()["token_number"]
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        tokens = list(pool.map(book, range(BOOKINGS)))
+
+    assert sorted(tokens) == list(range(1, BOOKINGS + 1))
+    with client.app.state.database.session() as db:
+        assert db.query(AppointmentCounter.last_token).filter(
+            AppointmentCounter.doctor_id == doctor_id
+        ).scalar() == BOOKINGS
+
+def test_scheduled_slots_are_held_until_cancelled(database_url, make_client):
+    users = seed(database_url, doctors=2, patients=5, appointments=10)
+    client = make_client(database_url)
+    slot = client.get("/doctors/first-available", params={"limit": 1}).json()[0]
+    booking = {"doctor_id": slot["doctor"]["id"], "date": slot["date"], "time": slot["time"]}
+    patient = bearer(users["patient"])
+    with client.app.state.database.session() as db:
+        other = bearer(db.query(User.id).filter(User.role == "patient", User.id != users["patient"]).first()[0])
+
+    def book(headers: dict):
+        return client.post("/patient/appointments", headers=headers, json=booking)
+
+    first = book(patient)
+    assert first.status_code == 200, first.text
+    assert book(other).status_code == 409
+    assert client.delete(f"/patient/appointments/{first.json()['id']}", headers=patient).status_code == 200
+    second = book(other)
+    assert second.status_code == 200, second.text
+
+    # Cancelling a visit that already happened leaves its slot alone
+    doctor = bearer(slot["doctor"]["user_id"])
+    path = f"/doctor/appointments/{second.json()['id']}/complete"
+    assert client.put(path, headers=doctor).status_code == 200
+    assert client.delete(f"/patient/appointments/{second.json()['id']}", headers=other).status_code == 200
+    assert book(patient).status_code == 409
+
+def test_a_crowded_day_books_through_the_counter(database_url, make_client):
+    seed(database_url, patients=5)
+    client = make_client(database_url)
+    doctor_id = queue_doctor(client)
+    crowded, quiet, warmup = (date.today() + timedelta(days=days) for days in (7, 8, 9))
+    engine = client.app.state.database.engine
+    with client.app.state.database.session() as db:
+        patient_id, user_id = db.query(Patient.id, Patient.user_id).first()
+        db.execute(insert(Appointment), [
+            {"patient_id": patient_id, "doctor_id": doctor_id, "date": crowded, "time": time(9),
+             "token_number": token, "status": "scheduled"}
+            for token in range(1, CROWD + 1)
+        ])
+        db.add(AppointmentCounter(doctor_id=doctor_id, date=crowded, last_token=CROWD))
+        db.commit()
+
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # Only the booking request's statements
+        if metrics.current_timings.get() is not None:
+            recorded.append((statement, parameters))
+
+    patient = bearer(user_id)
+    event.listen(engine, "before_cursor_execute", record)
+    booked = {}
+    # The first booking also loads the patient's principal and the doctor's schedule, which are cached
+    for day in (warmup, crowded, quiet):
+        recorded.clear()
+        response = client.post("/patient/appointments", headers=patient, json={
+            "doctor_id": doctor_id, "date": day.isoformat(), "time": "09:00"
+        })
+        assert response.status_code == 200, response.text
+        booked[day] = response.json()["token_number"], list(recorded)
+    event.remove(engine, "before_cursor_execute", record)
+
+    assert booked[crowded][0] == CROWD + 1
+    assert len(booked[crowded][1]) == len(booked[quiet][1])
+    statements = booked[crowded][1]
+    assert any("INSERT INTO appointment_counters" in statement and "ON CONFLICT" in statement
+               for statement, _ in statements)
+    assert not [statement for statement, _ in statements if "count(" in statement.lower()]
+    # The counter is seeded by max(token_number) over the unique index, never by reading the day's rows
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            if statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE")):
+                plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+                assert not [step for step in plan if step.startswith("SCAN appointments")], statement
@@ -0,0 +1,66 @@
+"""Imports split CSV into records the way csv.reader does, however the bytes arrive (bulk.py)."""
+import asyncio
+from bulk import PendingLines, RecordParser, iter_records
+
+CSV = (
+    'name,email,notes\n'
+    'Ann,ann@hospify.com,"says ""hi""\n'
+    'over two lines"\n'
+    'Bob,bob@hospify.com,6" tall\n'
+    '\n'
+    'Cy,cy@hospify.com,plain\n'
+    'Di,di@hospify.com\n'
+    'Ed,ed@hospify.com,"never closed\n'
+    'Fay,fay@hospify.com,lost\n'
+)
+
+def parse(data: bytes, chunk_size: int, fmt: str = "csv") -> tuple:
+    errors = []
+
+    async def chunks():
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    async def collect():
+        return [record async for record in iter_records(chunks(), RecordParser(fmt, lambda *error: errors.append(error)))]
+
+    return asyncio.run(collect()), errors
+
+def test_csv_records_follow_the_csv_reader():
+    records, errors = parse(CSV.encode(), 1 << 16)
+    assert records == [
+        (2, {"name": "Ann", "email": "ann@hospify.com", "notes": 'says "hi"\nover two lines'}),
+        # A quote inside an unquoted field is just a character, and doesn't swallow the lines after it
+        (4, {"name": "Bob", "email": "bob@hospify.com", "notes": '6" tall'}),
+        (6, {"name": "Cy", "email": "cy@hospify.com", "notes": "plain"}),
+        # A quote that is never closed runs to the end of the data, as csv.reader reads it
+        (8, {"name": "Ed", "email": "ed@hospify.com", "notes": "never closed\nFay,fay@hospify.com,lost\n"}),
+    ]
+    assert errors == [(7, "Expected 3 columns, got 2")]
+
+def test_csv_records_dont_depend_on_chunk_boundaries():
+    expected = parse(CSV.encode(), 1 << 16)
+    for chunk_size in (1, 2, 7, 50):
+        assert parse(CSV.encode(), chunk_size) == expected
+
+def test_a_long_unclosed_quote_is_not_reread_per_line(monkeypatch):
+    lines = 5000
+    handed = []
+    next_line = PendingLines.__next__
+
+    def counted(pending):
+        handed.append(1)
+        return next_line(pending)
+
+    monkeypatch.setattr(PendingLines, "__next__", counted)
+    records, errors = parse(('a,b\n1,"open\n' + "more\n" * lines).encode(), 64)
+    assert len(records) == 1 and not errors
+    assert records[0][1]["b"].count("more") == lines
+    # Each retry waits for the record's lines to double, so they are read a few times over, not once per chunk
+    assert len(handed) < 5 * lines
+
+def test_ndjson_has_a_record_per_line():
+    data = b'{"name": "Ann"}\n\n[1]\n{"name": "Bob"}'
+    records, errors = parse(data, 5, fmt="ndjson")
+    assert records == [(1, {"name": "Ann"}), (4, {"name": "Bob"})]
+    assert errors == [(3, "Expected a JSON object")]
@@ -0,0 +1,18 @@
+"""Event streams hold a subscription only while their body is being sent (events.py)."""
+import asyncio
+import events
+
+def test_a_stream_subscribes_when_its_body_starts():
+    async def scenario():
+        stream = events.sse_stream(["doctor.1"])
+        # A response whose client left before the body started never iterates its stream
+        assert "doctor.1" not in events.bus._subscribers
+        first = asyncio.ensure_future(stream.__anext__())
+        while "doctor.1" not in events.bus._subscribers:
+            await asyncio.sleep(0)
+        events.bus.publish("doctor.1", "appointment.booked", {"id": 1})
+        assert (await first).startswith("data: ")
+        await stream.aclose()
+        assert "doctor.1" not in events.bus._subscribers
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+"""Bulk hashing leaves room in the hashing pool for logins (hashing.py)."""
+import asyncio
+import pytest
+from fastapi import HTTPException
+import hashing
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    """Stands in for the process pool: each job takes a few ticks, and the
+    most jobs ever running at once is recorded."""
+    state = {"running": 0, "most": 0}
+
+    async def run(operation, fn, *args):
+        state["running"] += 1
+        state["most"] = max(state["most"], state["running"])
+        try:
+            await asyncio.sleep(0.001)
+            return f"hashed:{args[0]}"
+        finally:
+            state["running"] -= 1
+
+    monkeypatch.setattr(hashing, "_run", run)
+    monkeypatch.setattr(hashing, "PASSWORD_HASH_BULK_CONCURRENCY", 2)
+    monkeypatch.setattr(hashing, "PASSWORD_HASH_MAX_PENDING", 4)
+    monkeypatch.setattr(hashing, "_bulk_slots", None)
+    yield state
+    hashing._bulk_slots = None
+
+def test_bulk_hashing_is_capped_and_logins_still_get_in(fake_pool):
+    async def scenario():
+        bulk = asyncio.ensure_future(hashing.hash_passwords_async([f"pw{n}" for n in range(50)]))
+        while fake_pool["running"] < 2:
+            await asyncio.sleep(0)
+        # The import holds two of the four admission slots, so a login is admitted, not shed
+        assert hashing._pending == 2
+        login = await hashing.hash_password_async("login")
+        return await bulk, login
+
+    hashes, login = asyncio.run(scenario())
+    assert hashes == [f"hashed:pw{n}" for n in range(50)]
+    assert login == "hashed:login"
+    assert fake_pool["most"] <= 3
+    assert hashing._pending == 0
+
+def test_full_queue_still_sheds_logins(fake_pool):
+    async def scenario():
+        hashing._pending = hashing.PASSWORD_HASH_MAX_PENDING
+        try:
+            with pytest.raises(HTTPException) as exc:
+                await hashing.hash_password_async("login")
+        finally:
+            hashing._pending = 0
+        return exc.value
+
+    assert asyncio.run(scenario()).status_code == 503
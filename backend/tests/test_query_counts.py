@@ -0,0 +1,48 @@
+"""Each list endpoint runs the same few statements however many rows it returns,
+so nested responses are loaded up front (queries.py) instead of row by row."""
+import re
+import pytest
+from conftest import bearer, seed
+
+SMALL = {"doctors": 3, "patients": 4, "pharmacists": 2, "appointments": 40, "prescriptions": 20, "medicines": 20}
+LARGE = {name: count * 5 for name, count in SMALL.items()}
+MAX_STATEMENTS = 5
+
+# (caller's role, path, query); None calls anonymously
+LIST_ENDPOINTS = [
+    ("patient", "/patient/appointments", {}),
+    ("doctor", "/doctor/appointments", {"date_from": "2000-01-01", "date_to": "2100-01-01", "status": ""}),
+    ("pharmacist", "/pharmacy/prescriptions", {}),
+    ("admin", "/admin/doctors", {}),
+    ("admin", "/admin/pharmacists", {}),
+    ("admin", "/search", {"q": "a"}),
+    (None, "/doctors", {}),
+]
+
+@pytest.fixture(scope="module")
+def apps(tmp_path_factory, make_module_client):
+    apps = {}
+    for label, sizes in (("small", SMALL), ("large", LARGE)):
+        url = f"sqlite:///{tmp_path_factory.mktemp(label) / 'test.db'}"
+        users = seed(url, **sizes)
+        apps[label] = (make_module_client(url), users)
+    return apps
+
+def statements(response) -> int:
+    # MetricsMiddleware counts the request's statements into Server-Timing
+    return int(re.search(r'db;desc="(\d+) queries"', response.headers["server-timing"]).group(1))
+
+@pytest.mark.parametrize("role, path, params", LIST_ENDPOINTS, ids=[path for _, path, _ in LIST_ENDPOINTS])
+def test_statement_count_is_fixed(apps, role, path, params):
+    counts, rows = {}, {}
+    for label, (client, users) in apps.items():
+        headers = bearer(users[role]) if role else {}
+        if role:
+            # Load the caller's principal first; it's cached from then on
+            assert client.get("/auth/me", headers=headers).status_code == 200
+        response = client.get(path, params={**params, "limit": 200}, headers=headers)
+        assert response.status_code == 200, response.text
+        counts[label], rows[label] = statements(response), len(response.json()["items"])
+
+    assert rows["large"] > rows["small"] > 0
+    assert counts["large"] == counts["small"] <= MAX_STATEMENTS
@@ -0,0 +1,166 @@
+"""No endpoint's queries fall back to a full table scan.
+
+Drives every endpoint against a seeded database, records the statements each
+request runs, and checks their EXPLAIN QUERY PLAN for `SCAN <table>`. The
+few endpoints that read a whole table on purpose are listed in ALLOWED_SCANS.
+"""
+import re
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, inspect
+import metrics
+from synthetic import SYNTHETIC_PASSWORD
+from conftest import bearer, seed
+
+SIZES = {"doctors": 6, "patients": 30, "pharmacists": 2, "appointments": 400, "prescriptions": 150, "medicines": 50}
+
+# (endpoint, table) -> why reading all of it is fine
+ALLOWED_SCANS = {
+    ("GET /doctors", "doctors"): "unfiltered, it pages through every doctor in id order",
+    ("GET /admin/doctors", "doctors"): "unfiltered, it pages through every doctor in id order",
+    ("GET /admin/pharmacists", "pharmacists"): "pages through every pharmacist in id order",
+    ("POST /chatbot/message", "doctors"): "matches against every doctor, cached until the table changes (chatbot.py)",
+    ("GET /medicines/search", "medicines"): "builds the in-process typeahead index once (medicines.py)",
+    ("GET /doctors/first-available", "doctors"): "looks at every doctor when no specialization is given",
+}
+
+SCAN = re.compile(r"^SCAN (\w+)")
+EXPLAINED = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+class Recorder:
+    """Calls endpoints and keeps the statements each one ran."""
+
+    def __init__(self, client: TestClient, users: dict):
+        self.client = client
+        self.headers = {role: bearer(user_id) for role, user_id in users.items()}
+        self.statements = []  # (endpoint, statement, parameters)
+        self.endpoint = None
+        event.listen(client.app.state.database.engine, "before_cursor_execute", self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        # Only statements run for a request; the stats reconciler runs outside one
+        if metrics.current_timings.get() is not None and statement.lstrip().upper().startswith(EXPLAINED):
+            # An executemany's statement has the same plan for every row
+            self.statements.append((self.endpoint, statement, parameters[0] if executemany else parameters))
+
+    def call(self, method: str, route: str, path: str = None, role: str = None, headers: dict = None, **kw):
+        self.endpoint = f"{method} {route}"
+        response = self.client.request(method, path or route, headers=headers or self.headers.get(role, {}), **kw)
+        assert response.status_code == 200, f"{self.endpoint}: {response.text}"
+        if response.headers.get("content-type", "").startswith("application/json"):
+            return response.json()
+        return response.text
+
+def exercise(api: Recorder):
+    """Every endpoint that reads or writes the database, in an order that gives each one data."""
+    me = api.call("GET", "/auth/me", role="patient")
+    tokens = api.call("POST", "/auth/login", json={"email": me["email"], "password": SYNTHETIC_PASSWORD})
+    tokens = api.call("POST", "/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    api.call("POST", "/auth/logout", json={"refresh_token": tokens["refresh_token"]})
+    api.call("POST", "/auth/signup", json={
+        "name": "Plan Test", "email": "plans@hospify.com", "phone": "1", "password": "plans123", "role": "patient"
+    })
+
+    doctors = api.call("GET", "/doctors", params={"limit": 10})["items"]
+    api.call("GET", "/doctors", params={"specialization": doctors[0]["specialization"]})
+    api.call("GET", "/doctors", params={"department": doctors[0]["department"]})
+    api.call("GET", "/doctors/{doctor_id}/slots", f"/doctors/{doctors[0]['id']}/slots")
+    api.call("GET", "/doctors/first-available", params={"specialization": doctors[0]["specialization"]})
+    slots = api.call("GET", "/doctors/first-available", params={"limit": 2})
+    api.call("POST", "/chatbot/message", json={"message": "I have chest pain"})
+
+    api.call("GET", "/patient/appointments", role="patient")
+    booked = [
+        api.call("POST", "/patient/appointments", role="patient", json={
+            "doctor_id": slot["doctor"]["id"], "date": slot["date"], "time": slot["time"]
+        })
+        for slot in slots
+    ]
+    api.call("DELETE", "/patient/appointments/{appointment_id}", f"/patient/appointments/{booked[1]['id']}",
+             role="patient")
+
+    doctor = {"headers": bearer(slots[0]["doctor"]["user_id"])}
+    api.call("GET", "/doctor/appointments", **doctor)
+    api.call("GET", "/doctor/appointments", params={"date_from": "2000-01-01", "date_to": "2100-01-01"}, **doctor)
+    api.call("GET", "/doctor/schedule", **doctor)
+    api.call("PUT", "/doctor/appointments/{appointment_id}/complete",
+             f"/doctor/appointments/{booked[0]['id']}/complete", **doctor)
+    medicine = api.call("GET", "/medicines/search", params={"q": "a"}, role="doctor")[0]
+    api.call("POST", "/doctor/prescriptions", json={"appointment_id": booked[0]["id"], "items": [{
+        "medicine_name": medicine["name"], "medicine_id": medicine["id"],
+        "dosage": "1 tablet", "frequency": "twice daily", "duration": "5 days"
+    }]}, **doctor)
+
+    api.call("GET", "/pharmacy/prescriptions", role="pharmacist")
+    api.call("GET", "/pharmacy/prescriptions", params={"doctor_id": doctors[0]["id"]}, role="pharmacist")
+    claimed = api.call("POST", "/pharmacy/prescriptions/claim", role="pharmacist")
+    api.call("POST", "/pharmacy/prescriptions/{prescription_id}/release",
+             f"/pharmacy/prescriptions/{claimed[0]['id']}/release", role="pharmacist")
+    api.call("POST", "/pharmacy/dispense", json={"prescription_id": claimed[0]["id"]}, role="pharmacist")
+    api.call("GET", "/search", params={"q": "pri"}, role="pharmacist")
+
+    api.call("GET", "/admin/stats", role="admin")
+    api.call("GET", "/admin/stats/breakdown", role="admin")
+    api.call("GET", "/admin/doctors", role="admin")
+    api.call("GET", "/admin/doctors", params={"specialization": doctors[0]["specialization"]}, role="admin")
+    api.call("GET", "/admin/pharmacists", role="admin")
+    api.call("GET", "/search", params={"q": "pri", "role": "doctor"}, role="admin")
+    created = api.call("POST", "/admin/medicines", role="admin", json={
+        "sku": "PLAN-1", "name": "Plan Test 10mg Tablet", "unit_price": 1.5, "stock": 10
+    })
+    api.call("PATCH", "/admin/medicines/{medicine_id}", f"/admin/medicines/{created['id']}", role="admin",
+             json={"restock": 5})
+    for kind in ("patients", "appointments", "prescriptions"):
+        api.call("GET", "/admin/export/{kind}", f"/admin/export/{kind}", role="admin")
+    api.call("POST", "/admin/import/{kind}", "/admin/import/patients", role="admin", content=(
+        '{"name": "Imported", "email": "imported@hospify.com", "phone": "2", "password": "imported1"}\n'
+    ))
+    api.call("DELETE", "/admin/doctors/{doctor_id}", f"/admin/doctors/{doctors[-1]['id']}", role="admin")
+
+@pytest.fixture(scope="module")
+def recorded(tmp_path_factory, make_module_client):
+    url = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'test.db'}"
+    users = seed(url, **SIZES)
+    client = make_module_client(url)
+    api = Recorder(client, users)
+    exercise(api)
+    return client.app.state.database.engine, api.statements
+
+def scanned_tables(conn, statement: str, parameters, tables: set) -> set:
+    scanned = set()
+    for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+        detail = row[-1]
+        match = SCAN.match(detail)
+        if match is None or "VIRTUAL TABLE" in detail:
+            continue
+        # Aliased tables show up as users_1 and the like; subqueries as anon_1
+        name = match.group(1)
+        table = name if name in tables else re.sub(r"_\d+$", "", name)
+        if table in tables:
+            scanned.add(table)
+    return scanned
+
+def scans(engine, statements: list) -> dict:
+    """(endpoint, table) -> a statement of the endpoint's that scans the table."""
+    tables = set(inspect(engine).get_table_names())
+    found = {}
+    with engine.connect() as conn:
+        for endpoint, statement, parameters in statements:
+            for table in scanned_tables(conn, statement, parameters, tables):
+                found.setdefault((endpoint, table), " ".join(statement.split()))
+    return found
+
+def test_endpoint_queries_use_indexes(recorded):
+    engine, statements = recorded
+    assert statements
+    unexpected = [
+        f"{endpoint} scans {table}: {statement}"
+        for (endpoint, table), statement in scans(engine, statements).items()
+        if (endpoint, table) not in ALLOWED_SCANS
+    ]
+    assert not unexpected, "\n".join(unexpected)
+
+def test_allowed_scans_are_still_needed(recorded):
+    # An allow-list entry nothing needs any more would hide the next regression
+    unused = set(ALLOWED_SCANS) - set(scans(*recorded))
+    assert not unused, unused
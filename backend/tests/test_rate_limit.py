@@ -0,0 +1,151 @@
+"""Rate limiting charges each client's own buckets and answers the rest with 429 (ratelimit.py).
+
+Most tests drive the middleware directly, over the app's real routes but in
+front of a stub endpoint, with a clock they move by hand.
+"""
+import asyncio
+import ipaddress
+from collections import Counter
+from main import router
+import ratelimit
+from ratelimit import RateLimitMiddleware, TokenBuckets
+from conftest import bearer, seed
+
+RATE, BURST = 20, 100
+FLOOD_IP, PATIENT_IP = "10.0.0.99", "10.0.0.1"
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class Limited:
+    """The middleware in front of an endpoint that answers 200 and counts what reaches it."""
+
+    def __init__(self, clock: Clock):
+        self.served = Counter()
+        self.middleware = RateLimitMiddleware(self.endpoint, router.routes,
+                                              buckets=TokenBuckets(rate=RATE, burst=BURST, clock=clock))
+
+    async def endpoint(self, scope, receive, send):
+        self.served[scope["path"]] += 1
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    def call(self, method: str, path: str, ip: str, headers: dict = None) -> tuple:
+        """(status, Retry-After or None) of a request from `ip`."""
+        scope = {
+            "type": "http", "method": method, "path": path, "root_path": "", "query_string": b"",
+            "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+            "client": (ip, 4000),
+        }
+        started = {}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                started.update(message)
+
+        asyncio.run(self.middleware(scope, receive, send))
+        headers = dict(started["headers"])
+        retry_after = headers.get(b"retry-after")
+        return started["status"], retry_after and int(retry_after)
+
+def test_bucket_refills_at_the_rate():
+    clock = Clock()
+    buckets = TokenBuckets(rate=RATE, burst=BURST, clock=clock)
+    assert [buckets.take(["a"], 10) for _ in range(10)] == [0.0] * 10
+    # Empty: ten tokens come back in half a second, and nothing is taken meanwhile
+    assert buckets.take(["a"], 10) == 0.5
+    clock.now += 0.25
+    assert buckets.take(["a"], 10) == 0.25
+    clock.now += 0.25
+    assert buckets.take(["a"], 10) == 0.0
+    # Other keys have full buckets of their own, and a refill stops at the burst
+    assert buckets.take(["b"], BURST) == 0.0
+    clock.now += 60
+    assert buckets.take(["a"], BURST) == 0.0
+    assert buckets.take(["a"], 1) == 1 / RATE
+
+def test_a_request_is_charged_to_all_its_buckets_or_none():
+    clock = Clock()
+    buckets = TokenBuckets(rate=RATE, burst=BURST, clock=clock)
+    assert buckets.take(["ip", "user"], 60) == 0.0
+    assert buckets.take(["ip"], 30) == 0.0
+    # The IP bucket is 20 short; the user's bucket, with 40 left, isn't charged for the rejection
+    assert buckets.take(["ip", "user"], 30) == 1.0
+    assert buckets.take(["user"], 40) == 0.0
+
+def test_a_flood_is_rejected_while_others_get_through():
+    clock = Clock()
+    api = Limited(clock)
+    pharmacist, patient = bearer(1), bearer(2)
+    flood, browsing = Counter(), Counter()
+    for n in range(50):
+        # The pending prescriptions cost 5 tokens, so 20 fit in the burst
+        status, retry_after = api.call("GET", "/pharmacy/prescriptions", FLOOD_IP, pharmacist)
+        flood[status, retry_after] += 1
+        status, _ = api.call("GET", ("/patient/appointments", "/doctors")[n % 2], PATIENT_IP, patient)
+        browsing[status] += 1
+
+    assert flood == {(200, None): 20, (429, 1): 30}
+    assert browsing == {200: 50}
+    assert api.served["/pharmacy/prescriptions"] == 20
+
+    # Half a second refills 10 tokens: two more requests' worth
+    clock.now += 0.5
+    statuses = [api.call("GET", "/pharmacy/prescriptions", FLOOD_IP, pharmacist)[0] for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    assert api.served["/pharmacy/prescriptions"] == 22
+
+def test_retry_after_says_when_the_request_fits():
+    clock = Clock()
+    api = Limited(clock)
+    # A login costs 10 tokens: the burst pays for 10 of them, then one every half second
+    statuses = Counter(api.call("POST", "/auth/login", FLOOD_IP)[0] for _ in range(10))
+    assert statuses == {200: 10}
+    assert api.call("POST", "/auth/login", FLOOD_IP) == (429, 1)
+    clock.now += 0.4
+    assert api.call("POST", "/auth/login", FLOOD_IP) == (429, 1)
+    clock.now += 0.1
+    assert api.call("POST", "/auth/login", FLOOD_IP) == (200, None)
+
+def test_rotating_tokens_from_one_address_shares_its_budget():
+    api = Limited(Clock())
+    # Every request brings a different user's token, but they all come from the flooding address
+    statuses = Counter(api.call("GET", "/pharmacy/prescriptions", FLOOD_IP, bearer(n))[0] for n in range(50))
+    assert statuses == {200: 20, 429: 30}
+    # And one user's budget follows them to another address
+    statuses = Counter(api.call("GET", "/doctors", f"10.0.1.{n}", bearer(1))[0] for n in range(BURST + 10))
+    assert statuses == {200: BURST, 429: 10}
+
+def test_forwarded_for_is_believed_only_from_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXIES", [ipaddress.ip_network("10.1.0.0/16")])
+    api = Limited(Clock())
+
+    def logins(proxy: str, forwarded_for: str) -> Counter:
+        headers = {"X-Forwarded-For": forwarded_for}
+        return Counter(api.call("POST", "/auth/login", proxy, headers)[0] for _ in range(12))
+
+    # Through two trusted proxies, each client gets its own 10 logins, whatever it claims further left
+    assert logins("10.1.0.1", f"1.2.3.4, {FLOOD_IP}, 10.1.0.2") == {200: 10, 429: 2}
+    assert logins("10.1.0.2", f"5.6.7.8, {PATIENT_IP}") == {200: 10, 429: 2}
+    # An untrusted peer's header is ignored: it gets its own 10, not the patient's spent budget
+    assert logins("192.0.2.7", PATIENT_IP) == {200: 10, 429: 2}
+
+def test_buckets_are_per_route(database_url, make_client):
+    seed(database_url)
+    client = make_client(database_url, rate_limit=True)
+    credentials = {"email": "nobody@hospify.com", "password": "wrong"}
+    statuses = Counter(client.post("/auth/login", json=credentials).status_code for _ in range(15))
+    assert statuses[429] > 0
+
+    response = client.post("/auth/login", json=credentials)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    # Spending the login budget leaves the client's other routes alone
+    assert client.get("/doctors").status_code == 200
@@ -0,0 +1,30 @@
+"""Expired counters don't pile up in the in-process shared state (shared_state.py)."""
+from shared_state import MemoryState
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_expired_counters_are_swept():
+    clock = Clock()
+    state = MemoryState(sweep_interval=60, clock=clock)
+    # Like the shared rate limiter, a new key for every five-second window
+    for window in range(100):
+        assert state.incr(f"rate:ip:10.0.0.1 /doctors:{window}", ttl=5) == 1
+        clock.now += 5
+    state.incr("stats-reconcile:1")
+    assert len(state._counters) < 20
+    assert state.get("stats-reconcile:1") == 1
+
+def test_an_expired_counter_is_dropped_when_read():
+    clock = Clock()
+    state = MemoryState(clock=clock)
+    assert state.incr("lease", ttl=10) == 1
+    assert state.incr("lease", ttl=10) == 2
+    clock.now += 10
+    assert state.get("lease") == 0
+    assert "lease" not in state._counters
+    assert state.incr("lease", ttl=10) == 1
@@ -0,0 +1,46 @@
+"""Reconciliation corrects drifted counters without holding up writers (stats.py)."""
+import sqlite3
+from db import Database
+from models import StatCounter
+import stats
+from conftest import seed
+
+def counter_values(database: Database) -> dict:
+    with database.session() as db:
+        return dict(db.query(StatCounter.key, StatCounter.value).all())
+
+def test_reconcile_corrects_drift(database_url):
+    seed(database_url, doctors=3, patients=5, appointments=20)
+    database = Database(database_url, use_async=False)
+    expected = counter_values(database)
+    with database.session() as db:
+        db.query(StatCounter).filter(StatCounter.key == "patients").update({"value": 999})
+        db.add(StatCounter(key="doctors.department.Gone", value=4))
+        db.commit()
+        stats.reconcile(db)
+    assert counter_values(database) == expected
+    database.engine.dispose()
+
+def test_writes_during_the_recount_go_through_and_survive(database_url, monkeypatch):
+    seed(database_url, doctors=3, patients=5, appointments=20)
+    database = Database(database_url, use_async=False)
+    patients = counter_values(database)["patients"]
+    recount = stats.compute_counters
+
+    def recount_during_a_signup(db):
+        counters = recount(db)
+        # timeout=0: fails at once with "database is locked" if the recount held a write lock
+        writer = sqlite3.connect(database_url.removeprefix("sqlite:///"), timeout=0)
+        writer.execute("INSERT INTO users (name, email, phone, password_hash, role) "
+                       "VALUES ('Late', 'late@hospify.com', '1', 'x', 'patient')")
+        writer.execute("INSERT INTO patients (user_id) SELECT id FROM users WHERE email = 'late@hospify.com'")
+        writer.execute("UPDATE stat_counters SET value = value + 1 WHERE key = 'patients'")
+        writer.commit()
+        writer.close()
+        return counters
+
+    monkeypatch.setattr(stats, "compute_counters", recount_during_a_signup)
+    with database.session() as db:
+        stats.reconcile(db)
+    assert counter_values(database)["patients"] == patients + 1
+    database.engine.dispose()
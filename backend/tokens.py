@@ -0,0 +1,34 @@
+from datetime import date
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from db import dialect_insert
+from models import Appointment, AppointmentCounter
+
+def allocate_token_numbers(db: Session, doctor_id: int, day: date, count: int) -> range:
+    """Atomically reserve `count` consecutive token numbers for a doctor's day.
+
+    A single upsert on the (doctor_id, date) counter row both increments and
+    returns the value, so concurrent bookings serialize on that one row and
+    never read the same count. The counter is seeded from the existing
+    appointments the first time a day is touched. Runs in the caller's
+    transaction, so a rolled-back booking also gives its tokens back.
+    """
+    insert = dialect_insert(db)
+    initial = select(func.coalesce(func.max(Appointment.token_number), 0) + count).where(
+        Appointment.doctor_id == doctor_id,
+        Appointment.date == day
+    ).scalar_subquery()
+    
+    stmt = insert(AppointmentCounter).values(
+        doctor_id=doctor_id, date=day, last_token=initial
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AppointmentCounter.doctor_id, AppointmentCounter.date],
+        set_={"last_token": AppointmentCounter.last_token + count}
+    ).returning(AppointmentCounter.last_token)
+    
+    last_token = db.execute(stmt).scalar_one()
+    return range(last_token - count + 1, last_token + 1)
+
+def allocate_token_number(db: Session, doctor_id: int, day: date) -> int:
+    return allocate_token_numbers(db, doctor_id, day, 1)[0]
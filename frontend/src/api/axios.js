@@ -21,12 +21,40 @@ instance.interceptors.request.use(
     }
 );
 
+// Access tokens are short-lived; renew them with the refresh token. Concurrent
+// 401s share one refresh, which goes through plain axios to skip these interceptors.
+let refreshing = null;
+
+const refreshTokens = () => {
+    if (!refreshing) {
+        const refreshToken = localStorage.getItem('refresh_token');
+        refreshing = axios.post(`${instance.defaults.baseURL}/auth/refresh`, { refresh_token: refreshToken })
+            .then((response) => {
+                localStorage.setItem('token', response.data.access_token);
+                localStorage.setItem('refresh_token', response.data.refresh_token);
+            })
+            .finally(() => {
+                refreshing = null;
+            });
+    }
+    return refreshing;
+};
+
 // Handle 401 responses
 instance.interceptors.response.use(
     (response) => response,
-    (error) => {
+    async (error) => {
+        const config = error.config;
         if (error.response?.status === 401) {
+            // Retry once with a renewed token (the request interceptor picks it up)
+            if (!config.retried && !config.url.startsWith('/auth/') && localStorage.getItem('refresh_token')) {
+                const renewed = await refreshTokens().then(() => true, () => false);
+                if (renewed) {
+                    return instance({ ...config, retried: true });
+                }
+            }
             localStorage.removeItem('token');
+            localStorage.removeItem('refresh_token');
             localStorage.removeItem('user');
             window.location.href = '/login';
         }
@@ -0,0 +1,43 @@
+import axios from './axios';
+
+// Live updates for the doctor and pharmacy dashboards over Server-Sent Events.
+// `onSync` runs whenever the stream (re)connects, so the caller reloads its
+// list after the subscription is in place and no event falls in between.
+// Returns a function that closes the stream.
+const RECONNECT_DELAY_MS = 1000;
+
+export function subscribeToEvents(onEvent, onSync) {
+    let source;
+    let closed = false;
+
+    const connect = () => {
+        const token = localStorage.getItem('token');
+        source = new EventSource(`${axios.defaults.baseURL}/events/stream?token=${encodeURIComponent(token)}`);
+
+        source.onopen = () => onSync();
+        source.onmessage = (message) => {
+            const event = JSON.parse(message.data);
+            // On resync the server ends the stream; the browser reconnects and onopen reloads
+            if (event.type !== 'resync') {
+                onEvent(event);
+            }
+        };
+        source.onerror = () => {
+            // Rejected outright (e.g. expired token): load once so axios refreshes the
+            // token (or handles the 401), then reconnect with the new token
+            if (source.readyState === EventSource.CLOSED) {
+                Promise.resolve(onSync()).finally(() => {
+                    if (!closed) {
+                        setTimeout(connect, RECONNECT_DELAY_MS);
+                    }
+                });
+            }
+        };
+    };
+
+    connect();
+    return () => {
+        closed = true;
+        source.close();
+    };
+}
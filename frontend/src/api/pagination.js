@@ -0,0 +1,64 @@
+import { useCallback, useRef, useState } from 'react';
+import axios from './axios';
+
+// List endpoints return a page at a time ({ items, next_cursor }). The
+// dashboards show the first page and fetch the next one when asked ("Load
+// more"), so opening a dashboard never downloads a whole table; narrow a
+// list with the endpoint's own filters (dates, status) instead.
+const PAGE_SIZE = 50;
+
+async function fetchPage(url, params, cursor) {
+    const response = await axios.get(url, { params: { ...params, limit: PAGE_SIZE, ...(cursor && { cursor }) } });
+    return response.data;
+}
+
+// `update(change)` edits the loaded items, e.g. from a live event:
+// `change(items, hasMore)` returns the new list. With more pages to come, an
+// item that sorts after the loaded ones is better left to `loadMore`.
+export function usePagedList(url, params = {}) {
+    const [list, setList] = useState({ items: [], cursor: null });
+    const [loading, setLoading] = useState(false);
+    const query = JSON.stringify(params);
+    // Results of a reload that a newer reload replaced are dropped
+    const generation = useRef(0);
+
+    const reload = useCallback(async () => {
+        const current = ++generation.current;
+        setLoading(true);
+        try {
+            const page = await fetchPage(url, JSON.parse(query));
+            if (current === generation.current) {
+                setList({ items: page.items, cursor: page.next_cursor });
+            }
+        } catch (error) {
+            console.error(`Error fetching ${url}:`, error);
+        } finally {
+            setLoading(false);
+        }
+    }, [url, query]);
+
+    const loadMore = async () => {
+        const current = generation.current;
+        setLoading(true);
+        try {
+            const page = await fetchPage(url, JSON.parse(query), list.cursor);
+            if (current === generation.current) {
+                // Live events may already have added some of the page
+                setList(({ items }) => ({
+                    items: [...items, ...page.items.filter((item) => !items.some((loaded) => loaded.id === item.id))],
+                    cursor: page.next_cursor
+                }));
+            }
+        } catch (error) {
+            console.error(`Error fetching ${url}:`, error);
+        } finally {
+            setLoading(false);
+        }
+    };
+
+    const update = useCallback((change) => {
+        setList(({ items, cursor }) => ({ items: change(items, Boolean(cursor)), cursor }));
+    }, []);
+
+    return { items: list.items, hasMore: Boolean(list.cursor), loading, reload, loadMore, update };
+}
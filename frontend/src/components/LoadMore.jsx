@@ -0,0 +1,17 @@
+export default function LoadMore({ list }) {
+    if (!list.hasMore) {
+        return null;
+    }
+
+    return (
+        <div className="p-4 text-center border-t border-gray-200">
+            <button
+                onClick={list.loadMore}
+                disabled={list.loading}
+                className="text-blue-600 hover:text-blue-800 font-medium disabled:opacity-50"
+            >
+                {list.loading ? 'Loading...' : 'Load more'}
+            </button>
+        </div>
+    );
+}
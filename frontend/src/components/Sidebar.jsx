@@ -1,5 +1,6 @@
 import { Link, useLocation, useNavigate } from 'react-router-dom';
 import { Home, Calendar, Users, Pill, LogOut, Activity } from 'lucide-react';
+import axios from '../api/axios';
 
 export default function Sidebar() {
     const location = useLocation();
@@ -7,7 +8,13 @@ export default function Sidebar() {
     const user = JSON.parse(localStorage.getItem('user') || '{}');
 
     const handleLogout = () => {
+        // Revoke this session's refresh token; signing out locally doesn't wait for it
+        const refreshToken = localStorage.getItem('refresh_token');
+        if (refreshToken) {
+            axios.post('/auth/logout', { refresh_token: refreshToken }).catch(() => {});
+        }
         localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
         localStorage.removeItem('user');
         navigate('/login');
     };
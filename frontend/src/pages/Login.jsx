@@ -29,6 +29,7 @@ export default function Login() {
             const response = await axios.post(endpoint, payload);
 
             localStorage.setItem('token', response.data.access_token);
+            localStorage.setItem('refresh_token', response.data.refresh_token);
             localStorage.setItem('user', JSON.stringify(response.data.user));
 
             // Redirect based on role
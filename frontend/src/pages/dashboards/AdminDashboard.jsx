@@ -2,16 +2,18 @@ import { useState, useEffect } from 'react';
 import Sidebar from '../../components/Sidebar';
 import Topbar from '../../components/Topbar';
 import StatCard from '../../components/StatCard';
+import LoadMore from '../../components/LoadMore';
 import axios from '../../api/axios';
+import { usePagedList } from '../../api/pagination';
 import { Users, Calendar, Activity, Pill, Trash2 } from 'lucide-react';
 
 export default function AdminDashboard() {
     const [stats, setStats] = useState({});
-    const [doctors, setDoctors] = useState([]);
+    const doctors = usePagedList('/admin/doctors');
 
     useEffect(() => {
         fetchStats();
-        fetchDoctors();
+        doctors.reload();
     }, []);
 
     const fetchStats = async () => {
@@ -23,20 +25,11 @@ export default function AdminDashboard() {
         }
     };
 
-    const fetchDoctors = async () => {
-        try {
-            const response = await axios.get('/admin/doctors');
-            setDoctors(response.data);
-        } catch (error) {
-            console.error('Error fetching doctors:', error);
-        }
-    };
-
     const handleDeleteDoctor = async (id) => {
         if (confirm('Are you sure you want to delete this doctor?')) {
             try {
                 await axios.delete(`/admin/doctors/${id}`);
-                fetchDoctors();
+                doctors.update((items) => items.filter((doctor) => doctor.id !== id));
                 fetchStats();
                 alert('Doctor deleted successfully');
             } catch (error) {
@@ -98,7 +91,7 @@ export default function AdminDashboard() {
                                     </tr>
                                 </thead>
                                 <tbody className="divide-y divide-gray-200">
-                                    {doctors.map((doctor) => (
+                                    {doctors.items.map((doctor) => (
                                         <tr key={doctor.id} className="hover:bg-gray-50 transition-colors">
                                             <td className="px-6 py-4 font-medium text-gray-800">{doctor.id}</td>
                                             <td className="px-6 py-4 font-medium">{doctor.user.name}</td>
@@ -119,6 +112,7 @@ export default function AdminDashboard() {
                                 </tbody>
                             </table>
                         </div>
+                        <LoadMore list={doctors} />
                     </div>
                 </div>
             </div>
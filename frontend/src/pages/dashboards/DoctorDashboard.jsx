@@ -1,35 +1,51 @@
 import { useState, useEffect } from 'react';
 import Sidebar from '../../components/Sidebar';
 import Topbar from '../../components/Topbar';
+import LoadMore from '../../components/LoadMore';
 import axios from '../../api/axios';
+import { usePagedList } from '../../api/pagination';
+import { subscribeToEvents } from '../../api/events';
 import { X, Plus, Trash2 } from 'lucide-react';
 
+const emptyItem = () => ({ medicine_name: '', dosage: '', frequency: '', duration: '', medicine_id: null, quantity: 1 });
+
 export default function DoctorDashboard() {
-    const [appointments, setAppointments] = useState([]);
+    // Defaults to today's scheduled queue, in token order
+    const appointments = usePagedList('/doctor/appointments');
     const [showPrescriptionModal, setShowPrescriptionModal] = useState(false);
     const [selectedAppointment, setSelectedAppointment] = useState(null);
     const [prescriptionData, setPrescriptionData] = useState({
         notes: '',
-        items: [{ medicine_name: '', dosage: '', frequency: '', duration: '' }]
+        items: [emptyItem()]
     });
+    const [suggestions, setSuggestions] = useState({});
 
     useEffect(() => {
-        fetchAppointments();
+        return subscribeToEvents(applyEvent, appointments.reload);
     }, []);
 
-    const fetchAppointments = async () => {
-        try {
-            const response = await axios.get('/doctor/appointments');
-            setAppointments(response.data);
-        } catch (error) {
-            console.error('Error fetching appointments:', error);
+    const removeAppointment = (id) => {
+        appointments.update((items) => items.filter((apt) => apt.id !== id));
+    };
+
+    const applyEvent = ({ type, data }) => {
+        if (type === 'appointment.booked') {
+            // The queue only shows today's scheduled appointments, ordered by token
+            if (data.date !== new Date().toLocaleDateString('en-CA') || data.status !== 'scheduled') {
+                return;
+            }
+            // The newest token sorts last, so with more pages to load it arrives with them
+            appointments.update((items, hasMore) => (hasMore ? items : [...items.filter((apt) => apt.id !== data.id), data]
+                .sort((a, b) => a.token_number - b.token_number)));
+        } else if (type === 'appointment.cancelled' || type === 'appointment.completed') {
+            removeAppointment(data.id);
         }
     };
 
     const handleCompleteAppointment = async (id) => {
         try {
             await axios.put(`/doctor/appointments/${id}/complete`);
-            fetchAppointments();
+            removeAppointment(id);
             alert('Appointment marked as completed');
         } catch (error) {
             alert('Error completing appointment');
@@ -44,7 +60,7 @@ export default function DoctorDashboard() {
     const addMedicineRow = () => {
         setPrescriptionData({
             ...prescriptionData,
-            items: [...prescriptionData.items, { medicine_name: '', dosage: '', frequency: '', duration: '' }]
+            items: [...prescriptionData.items, emptyItem()]
         });
     };
 
@@ -59,6 +75,23 @@ export default function DoctorDashboard() {
         setPrescriptionData({ ...prescriptionData, items: newItems });
     };
 
+    const updateMedicineName = async (index, value) => {
+        // Picking a suggestion links the item to the catalog; typing anything else unlinks it
+        const match = (suggestions[index] || []).find((medicine) => medicine.name === value);
+        const newItems = [...prescriptionData.items];
+        newItems[index] = { ...newItems[index], medicine_name: value, medicine_id: match ? match.id : null };
+        setPrescriptionData({ ...prescriptionData, items: newItems });
+        if (match || value.trim().length < 2) {
+            return;
+        }
+        try {
+            const response = await axios.get('/medicines/search', { params: { q: value } });
+            setSuggestions((current) => ({ ...current, [index]: response.data }));
+        } catch (error) {
+            console.error('Error searching medicines:', error);
+        }
+    };
+
     const handleCreatePrescription = async (e) => {
         e.preventDefault();
         try {
@@ -68,8 +101,9 @@ export default function DoctorDashboard() {
                 items: prescriptionData.items
             });
             setShowPrescriptionModal(false);
-            setPrescriptionData({ notes: '', items: [{ medicine_name: '', dosage: '', frequency: '', duration: '' }] });
-            fetchAppointments();
+            setPrescriptionData({ notes: '', items: [emptyItem()] });
+            setSuggestions({});
+            removeAppointment(selectedAppointment.id);
             alert('Prescription created successfully!');
         } catch (error) {
             alert('Error creating prescription: ' + (error.response?.data?.detail || 'Unknown error'));
@@ -99,7 +133,7 @@ export default function DoctorDashboard() {
                                     </tr>
                                 </thead>
                                 <tbody className="divide-y divide-gray-200">
-                                    {appointments.map((apt) => (
+                                    {appointments.items.map((apt) => (
                                         <tr key={apt.id} className="hover:bg-gray-50 transition-colors">
                                             <td className="px-6 py-4">
                                                 <span className="inline-flex items-center justify-center w-12 h-12 rounded-full bg-gradient-to-r from-blue-600 to-indigo-600 text-white font-bold">
@@ -134,6 +168,7 @@ export default function DoctorDashboard() {
                                 </tbody>
                             </table>
                         </div>
+                        <LoadMore list={appointments} />
                     </div>
                 </div>
             </div>
@@ -180,10 +215,18 @@ export default function DoctorDashboard() {
                                             type="text"
                                             placeholder="Medicine Name"
                                             value={item.medicine_name}
-                                            onChange={(e) => updateMedicineItem(index, 'medicine_name', e.target.value)}
+                                            onChange={(e) => updateMedicineName(index, e.target.value)}
+                                            list={`medicines-${index}`}
                                             className="px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
                                             required
                                         />
+                                        <datalist id={`medicines-${index}`}>
+                                            {(suggestions[index] || []).map((medicine) => (
+                                                <option key={medicine.id} value={medicine.name}>
+                                                    ₹{medicine.unit_price} · {medicine.stock} in stock
+                                                </option>
+                                            ))}
+                                        </datalist>
                                         <input
                                             type="text"
                                             placeholder="Dosage"
@@ -209,6 +252,14 @@ export default function DoctorDashboard() {
                                                 className="flex-1 px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
                                                 required
                                             />
+                                            <input
+                                                type="number"
+                                                min="1"
+                                                title="Quantity"
+                                                value={item.quantity}
+                                                onChange={(e) => updateMedicineItem(index, 'quantity', parseInt(e.target.value, 10) || 1)}
+                                                className="w-16 px-2 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
+                                            />
                                             {prescriptionData.items.length > 1 && (
                                                 <button
                                                     type="button"
@@ -2,39 +2,47 @@ import { useState, useEffect } from 'react';
 import Sidebar from '../../components/Sidebar';
 import Topbar from '../../components/Topbar';
 import ChatbotWidget from '../../components/ChatbotWidget';
+import LoadMore from '../../components/LoadMore';
 import axios from '../../api/axios';
+import { usePagedList } from '../../api/pagination';
 import { Calendar, Clock, User, X } from 'lucide-react';
 
 export default function PatientDashboard() {
-    const [appointments, setAppointments] = useState([]);
-    const [doctors, setDoctors] = useState([]);
+    // Upcoming appointments unless asked for the past ones too
+    const [showPast, setShowPast] = useState(false);
+    const appointments = usePagedList('/patient/appointments',
+        showPast ? {} : { date_from: new Date().toLocaleDateString('en-CA') });
+    const doctors = usePagedList('/doctors');
     const [showBookingModal, setShowBookingModal] = useState(false);
     const [bookingData, setBookingData] = useState({
         doctor_id: '',
         date: '',
         time: ''
     });
+    const [slots, setSlots] = useState(null);
 
     useEffect(() => {
-        fetchAppointments();
-        fetchDoctors();
+        appointments.reload();
+    }, [appointments.reload]);
+
+    useEffect(() => {
+        doctors.reload();
     }, []);
 
-    const fetchAppointments = async () => {
-        try {
-            const response = await axios.get('/patient/appointments');
-            setAppointments(response.data);
-        } catch (error) {
-            console.error('Error fetching appointments:', error);
+    useEffect(() => {
+        setSlots(null);
+        setBookingData((data) => ({ ...data, time: '' }));
+        if (bookingData.doctor_id && bookingData.date) {
+            fetchSlots(bookingData.doctor_id, bookingData.date);
         }
-    };
+    }, [bookingData.doctor_id, bookingData.date]);
 
-    const fetchDoctors = async () => {
+    const fetchSlots = async (doctorId, date) => {
         try {
-            const response = await axios.get('/doctors');
-            setDoctors(response.data);
+            const response = await axios.get(`/doctors/${doctorId}/slots`, { params: { from: date, to: date } });
+            setSlots(response.data);
         } catch (error) {
-            console.error('Error fetching doctors:', error);
+            console.error('Error fetching slots:', error);
         }
     };
 
@@ -44,7 +52,7 @@ export default function PatientDashboard() {
             await axios.post('/patient/appointments', bookingData);
             setShowBookingModal(false);
             setBookingData({ doctor_id: '', date: '', time: '' });
-            fetchAppointments();
+            appointments.reload();
             alert('Appointment booked successfully!');
         } catch (error) {
             alert('Error booking appointment: ' + (error.response?.data?.detail || 'Unknown error'));
@@ -55,7 +63,7 @@ export default function PatientDashboard() {
         if (confirm('Are you sure you want to cancel this appointment?')) {
             try {
                 await axios.delete(`/patient/appointments/${id}`);
-                fetchAppointments();
+                appointments.update((items) => items.map((apt) => (apt.id === id ? { ...apt, status: 'cancelled' } : apt)));
                 alert('Appointment cancelled successfully');
             } catch (error) {
                 alert('Error cancelling appointment');
@@ -92,8 +100,16 @@ export default function PatientDashboard() {
 
                     {/* Appointments Table */}
                     <div className="bg-white rounded-2xl shadow-lg overflow-hidden">
-                        <div className="p-6 border-b border-gray-200">
+                        <div className="p-6 border-b border-gray-200 flex justify-between items-center">
                             <h3 className="text-xl font-bold text-gray-800">My Appointments</h3>
+                            <label className="flex items-center gap-2 text-sm text-gray-600">
+                                <input
+                                    type="checkbox"
+                                    checked={showPast}
+                                    onChange={(e) => setShowPast(e.target.checked)}
+                                />
+                                Show past appointments
+                            </label>
                         </div>
                         <div className="overflow-x-auto">
                             <table className="w-full">
@@ -109,7 +125,7 @@ export default function PatientDashboard() {
                                     </tr>
                                 </thead>
                                 <tbody className="divide-y divide-gray-200">
-                                    {appointments.map((apt) => (
+                                    {appointments.items.map((apt) => (
                                         <tr key={apt.id} className="hover:bg-gray-50 transition-colors">
                                             <td className="px-6 py-4">
                                                 <span className="font-bold text-blue-600">#{apt.token_number}</span>
@@ -138,6 +154,7 @@ export default function PatientDashboard() {
                                 </tbody>
                             </table>
                         </div>
+                        <LoadMore list={appointments} />
                     </div>
                 </div>
             </div>
@@ -163,12 +180,22 @@ export default function PatientDashboard() {
                                     required
                                 >
                                     <option value="">Choose a doctor...</option>
-                                    {doctors.map((doc) => (
+                                    {doctors.items.map((doc) => (
                                         <option key={doc.id} value={doc.id}>
                                             {doc.user.name} - {doc.specialization}
                                         </option>
                                     ))}
                                 </select>
+                                {doctors.hasMore && (
+                                    <button
+                                        type="button"
+                                        onClick={doctors.loadMore}
+                                        disabled={doctors.loading}
+                                        className="mt-2 text-sm text-blue-600 hover:text-blue-800 font-medium disabled:opacity-50"
+                                    >
+                                        Show more doctors
+                                    </button>
+                                )}
                             </div>
 
                             <div>
@@ -184,13 +211,29 @@ export default function PatientDashboard() {
 
                             <div>
                                 <label className="block text-sm font-semibold text-gray-700 mb-2">Time</label>
-                                <input
-                                    type="time"
-                                    value={bookingData.time}
-                                    onChange={(e) => setBookingData({ ...bookingData, time: e.target.value })}
-                                    className="w-full px-4 py-3 border border-gray-300 rounded-xl focus:outline-none focus:ring-2 focus:ring-blue-500"
-                                    required
-                                />
+                                {slots?.scheduled ? (
+                                    <select
+                                        value={bookingData.time}
+                                        onChange={(e) => setBookingData({ ...bookingData, time: e.target.value })}
+                                        className="w-full px-4 py-3 border border-gray-300 rounded-xl focus:outline-none focus:ring-2 focus:ring-blue-500"
+                                        required
+                                    >
+                                        <option value="">
+                                            {slots.days.length ? 'Choose a time...' : 'No free slots on this day'}
+                                        </option>
+                                        {(slots.days[0]?.slots || []).map((slot) => (
+                                            <option key={slot} value={slot}>{slot.slice(0, 5)}</option>
+                                        ))}
+                                    </select>
+                                ) : (
+                                    <input
+                                        type="time"
+                                        value={bookingData.time}
+                                        onChange={(e) => setBookingData({ ...bookingData, time: e.target.value })}
+                                        className="w-full px-4 py-3 border border-gray-300 rounded-xl focus:outline-none focus:ring-2 focus:ring-blue-500"
+                                        required
+                                    />
+                                )}
                             </div>
 
                             <button
@@ -1,25 +1,44 @@
 import { useState, useEffect } from 'react';
 import Sidebar from '../../components/Sidebar';
 import Topbar from '../../components/Topbar';
+import LoadMore from '../../components/LoadMore';
 import axios from '../../api/axios';
+import { usePagedList } from '../../api/pagination';
+import { subscribeToEvents } from '../../api/events';
 import { Pill, DollarSign, X } from 'lucide-react';
 
 export default function PharmacyDashboard() {
-    const [prescriptions, setPrescriptions] = useState([]);
+    // Oldest first
+    const prescriptions = usePagedList('/pharmacy/prescriptions');
     const [showDispenseModal, setShowDispenseModal] = useState(false);
     const [selectedPrescription, setSelectedPrescription] = useState(null);
-    const [totalAmount, setTotalAmount] = useState('');
+    const [uncataloguedAmount, setUncataloguedAmount] = useState('');
 
     useEffect(() => {
-        fetchPrescriptions();
+        return subscribeToEvents(applyEvent, prescriptions.reload);
     }, []);
 
-    const fetchPrescriptions = async () => {
-        try {
-            const response = await axios.get('/pharmacy/prescriptions');
-            setPrescriptions(response.data);
-        } catch (error) {
-            console.error('Error fetching prescriptions:', error);
+    const removePrescription = (id) => {
+        prescriptions.update((items) => items.filter((prescription) => prescription.id !== id));
+    };
+
+    const updatePrescriptions = (ids, changes) => {
+        prescriptions.update((items) => items.map((prescription) => (
+            ids.includes(prescription.id) ? { ...prescription, ...changes } : prescription
+        )));
+    };
+
+    const applyEvent = ({ type, data }) => {
+        if (type === 'prescription.created') {
+            // The newest sorts last, so with more pages to load it arrives with them
+            prescriptions.update((items, hasMore) => (hasMore ? items : [...items.filter((prescription) => prescription.id !== data.id), data]
+                .sort((a, b) => a.id - b.id)));
+        } else if (type === 'prescription.dispensed') {
+            removePrescription(data.id);
+        } else if (type === 'prescription.claimed') {
+            updatePrescriptions(data.ids, { dispense_status: 'claimed', claimed_by: data.claimed_by });
+        } else if (type === 'prescription.released') {
+            updatePrescriptions([data.id], { dispense_status: 'pending', claimed_by: null });
         }
     };
 
@@ -31,15 +50,15 @@ export default function PharmacyDashboard() {
     const handleDispense = async (e) => {
         e.preventDefault();
         try {
-            await axios.post('/pharmacy/dispense', {
+            const response = await axios.post('/pharmacy/dispense', {
                 prescription_id: selectedPrescription.id,
-                total_amount: parseFloat(totalAmount),
+                uncatalogued_amount: parseFloat(uncataloguedAmount) || 0,
                 payment_status: 'paid'
             });
             setShowDispenseModal(false);
-            setTotalAmount('');
-            fetchPrescriptions();
-            alert('Prescription dispensed successfully!');
+            setUncataloguedAmount('');
+            removePrescription(selectedPrescription.id);
+            alert(`Prescription dispensed successfully! Total: ₹${response.data.total_amount}`);
         } catch (error) {
             alert('Error dispensing prescription: ' + (error.response?.data?.detail || 'Unknown error'));
         }
@@ -57,7 +76,7 @@ export default function PharmacyDashboard() {
                             <h3 className="text-xl font-bold text-gray-800">Pending Prescriptions</h3>
                         </div>
                         <div className="p-6 space-y-6">
-                            {prescriptions.map((prescription) => (
+                            {prescriptions.items.map((prescription) => (
                                 <div key={prescription.id} className="border border-gray-200 rounded-2xl p-6 hover:shadow-lg transition-all">
                                     <div className="flex justify-between items-start mb-4">
                                         <div>
@@ -91,7 +110,7 @@ export default function PharmacyDashboard() {
                                                 <div className="flex-1 grid grid-cols-4 gap-4">
                                                     <div>
                                                         <p className="text-xs text-gray-500">Medicine</p>
-                                                        <p className="font-semibold text-gray-800">{item.medicine_name}</p>
+                                                        <p className="font-semibold text-gray-800">{item.medicine_name} × {item.quantity}</p>
                                                     </div>
                                                     <div>
                                                         <p className="text-xs text-gray-500">Dosage</p>
@@ -112,6 +131,7 @@ export default function PharmacyDashboard() {
                                 </div>
                             ))}
                         </div>
+                        <LoadMore list={prescriptions} />
                     </div>
                 </div>
             </div>
@@ -133,21 +153,25 @@ export default function PharmacyDashboard() {
                         </div>
 
                         <form onSubmit={handleDispense} className="space-y-4">
-                            <div>
-                                <label className="block text-sm font-semibold text-gray-700 mb-2">
-                                    <DollarSign className="inline" size={16} />
-                                    Total Amount (₹)
-                                </label>
-                                <input
-                                    type="number"
-                                    step="0.01"
-                                    value={totalAmount}
-                                    onChange={(e) => setTotalAmount(e.target.value)}
-                                    className="w-full px-4 py-3 border border-gray-300 rounded-xl focus:outline-none focus:ring-2 focus:ring-green-500"
-                                    placeholder="Enter total bill amount"
-                                    required
-                                />
-                            </div>
+                            {/* Catalog medicines are billed at catalog prices; only free-text ones need an amount */}
+                            {selectedPrescription?.items.some((item) => !item.medicine_id) && (
+                                <div>
+                                    <label className="block text-sm font-semibold text-gray-700 mb-2">
+                                        <DollarSign className="inline" size={16} />
+                                        Amount for medicines not in the catalog (₹)
+                                    </label>
+                                    <input
+                                        type="number"
+                                        step="0.01"
+                                        min="0"
+                                        value={uncataloguedAmount}
+                                        onChange={(e) => setUncataloguedAmount(e.target.value)}
+                                        className="w-full px-4 py-3 border border-gray-300 rounded-xl focus:outline-none focus:ring-2 focus:ring-green-500"
+                                        placeholder="Enter amount"
+                                        required
+                                    />
+                                </div>
+                            )}
 
                             <button
                                 type="submit"